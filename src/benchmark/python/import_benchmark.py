@@ -0,0 +1,48 @@
+"""Import-time benchmark of the uc3m_money package, measured with
+python -X importtime in fresh interpreters
+
+Run from the repository root:
+    PYTHONPATH=src/main/python python src/benchmark/python/import_benchmark.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 20
+
+STATEMENTS = [
+    ("import uc3m_money", "import uc3m_money"),
+    ("first class access", "import uc3m_money; uc3m_money.TransferRequest"),
+]
+
+
+def cumulative_import_us(statement: str) -> int:
+    """Returns the cumulative microseconds spent importing uc3m_money and the
+    modules it pulls in, as reported by -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, check=True,
+                            env=dict(os.environ))
+    total = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or not parts[1].strip().isdigit():
+            continue
+        # Nested imports are indented, so only top-level entries are summed
+        name = parts[2][1:]
+        if name == "uc3m_money" or name.startswith("uc3m_money."):
+            total += int(parts[1])
+    return total
+
+
+def main():
+    """Prints the median import cost of each statement"""
+    print(f"{'statement':<24}{'median (us)':>14}{'min (us)':>12}")
+    for name, statement in STATEMENTS:
+        samples = [cumulative_import_us(statement) for _ in range(RUNS)]
+        print(f"{name:<24}{statistics.median(samples):>14.0f}{min(samples):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark of the uc3m_money serialization backends on the package file formats:
+the Transactions.json ledger, transfers.json lines and the deposits.json document
+
+Run from the repository root:
+    PYTHONPATH=src/main/python python src/benchmark/python/serialization_benchmark.py
+"""
+import json
+import timeit
+from uc3m_money import serialization
+
+NUMBER = 20
+
+TRANSFER = {"from_iban": "ES9121000418450200051332", "to_iban": "ES7620770024003102575766",
+            "transfer_type": "ORDINARY", "transfer_amount": 400.34,
+            "transfer_concept": "Payment for services", "transfer_date": "01/01/2050",
+            "time_stamp": 1742838900.123456, "transfer_code": "0" * 32}
+DEPOSIT = {"alg": "SHA-256", "type": "DEPOSIT", "to_iban": "ES9121000418450200051332",
+           "deposit_amount": "EUR 1000.00", "deposit_date": 1742838900.0,
+           "deposit_signature": "0" * 64}
+
+
+def formats():
+    """Returns the encoded sample of every file format"""
+    with open("Transactions.json", "r", encoding="utf-8") as file:
+        ledger = file.read()
+    # Scales the ledger so the decode time dominates the call overhead
+    transactions = json.loads(ledger) * 500
+    return {"ledger (Transactions.json)": json.dumps(transactions, indent=4),
+            "transfer lines (transfers.json)": json.dumps(TRANSFER) + "\n",
+            "deposit (deposits.json)": json.dumps(DEPOSIT, indent=4)}
+
+
+def main():
+    """Prints the decode time of every backend and the encode time of the layer"""
+    samples = formats()
+    print(f"{'format':<34}{'backend':<10}{'decode (ms)':>12}")
+    for name, text in samples.items():
+        for backend in serialization.available_backends():
+            serialization.set_backend(backend)
+            # JSON lines are decoded one by one, as the stores read them
+            documents = [text] * 10000 if text.endswith("\n") else [text]
+            timer = timeit.Timer(lambda docs=documents: [serialization.loads(doc)
+                                                         for doc in docs])
+            elapsed = min(timer.repeat(repeat=3, number=NUMBER)) / NUMBER * 1000
+            print(f"{name:<34}{backend:<10}{elapsed:>12.3f}")
+    records = [TRANSFER] * 10000
+    for name, function in (("json.dumps per line", lambda: "".join(
+            json.dumps(record) + "\n" for record in records)),
+                           ("serialization.dumps_lines", lambda: serialization.dumps_lines(
+                               records))):
+        elapsed = min(timeit.repeat(function, repeat=3, number=NUMBER)) / NUMBER * 1000
+        print(f"{'encode 10000 transfer lines':<34}{name:<28}{elapsed:>8.3f} ms")
+    assert serialization.dumps_lines(records) == "".join(json.dumps(record) + "\n"
+                                                         for record in records)
+
+
+if __name__ == "__main__":
+    main()
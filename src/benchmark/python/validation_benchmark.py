@@ -0,0 +1,85 @@
+"""Microbenchmark of the validation layer: per-call cost of the original
+validators against the precompiled rules in uc3m_money.validation_rules
+
+Run from the repository root:
+    PYTHONPATH=src/main/python python src/benchmark/python/validation_benchmark.py
+"""
+import re
+import timeit
+from datetime import datetime, timezone
+from uc3m_money import AccountManager
+from uc3m_money import transfer_validator
+from uc3m_money.validation_rules import iban_checksum_ok
+
+IBAN = "ES9121000418450200051332"
+NUMBER = 100000
+
+
+def legacy_validate_iban(iban):
+    """validate_iban as it was before the shared rules"""
+    iban = iban.replace(" ", "").upper()
+    iban_format = re.compile(r"^ES\d{2}[A-Z0-9]+$")
+    if not iban_format.match(iban):
+        return False
+    mixed_iban = iban[4:] + iban[:4]
+    numeric_iban = "".join(str(ord(char) - 55) if char.isalpha()
+                           else char for char in mixed_iban)
+    return int(numeric_iban) % 97 == 1
+
+
+def legacy_validate_amount(amount):
+    """validate_amount as it was before the shared rules"""
+    amount = re.sub(r'[^\d.]', '', amount)
+    if not re.match(r'^\d+\.\d{2}$', amount):
+        return False
+    return 10 <= float(amount) <= 1000
+
+
+def legacy_validate_type(transfer_type):
+    """Transfer type membership as it was before the shared rules"""
+    return transfer_type.upper() in ["ORDINARY", "URGENT", "IMMEDIATE"]
+
+
+def legacy_validate_date(date):
+    """validate_date as it was before the shared rules"""
+    try:
+        datetime.strptime(date, "%d/%m/%Y")
+    except ValueError:
+        return False
+    day, month, year = map(int, date.split("/"))
+    if not 2025 <= year <= 2050 or not 1 <= month <= 12 or not 1 <= day <= 31:
+        return False
+    input_date = datetime.strptime(date, "%d/%m/%Y").replace(tzinfo=timezone.utc)
+    current_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0,
+                                                      microsecond=0)
+    return input_date >= current_date
+
+
+CASES = [
+    ("iban (uncached MOD-97)", lambda: legacy_validate_iban(IBAN),
+     lambda: iban_checksum_ok(IBAN)),
+    ("iban (validate_iban)", lambda: legacy_validate_iban(IBAN),
+     lambda: AccountManager.validate_iban(IBAN)),
+    ("deposit amount", lambda: legacy_validate_amount("EUR 1000.00"),
+     lambda: AccountManager.validate_amount("EUR 1000.00")),
+    ("transfer type", lambda: legacy_validate_type("urgent"),
+     lambda: transfer_validator.type_error("urgent")),
+    ("transfer date", lambda: legacy_validate_date("01/01/2050"),
+     lambda: transfer_validator.date_error("01/01/2050")),
+    ("invalid date", lambda: legacy_validate_date("32/01/2050"),
+     lambda: transfer_validator.date_error("32/01/2050")),
+]
+
+
+def main():
+    """Prints the per-call time of each validator before and after"""
+    print(f"{'validator':<24}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for name, before, after in CASES:
+        before_time = min(timeit.repeat(before, number=NUMBER, repeat=3)) / NUMBER * 1e6
+        after_time = min(timeit.repeat(after, number=NUMBER, repeat=3)) / NUMBER * 1e6
+        print(f"{name:<24}{before_time:>14.3f}{after_time:>14.3f}"
+              f"{before_time / after_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
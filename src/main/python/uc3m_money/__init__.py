@@ -1,6 +1,45 @@
-"""UC3M LOGISTICS MODULE WITH ALL THE FEATURES REQUIRED FOR ACCESS CONTROL"""
+"""UC3M LOGISTICS MODULE WITH ALL THE FEATURES REQUIRED FOR ACCESS CONTROL
 
-from .transfer_request import TransferRequest
-from .account_manager import AccountManager
-from .account_management_exception import AccountManagementException
-from .account_deposit import AccountDeposit
+The public classes are loaded lazily on first access, so importing the package
+does not pull in hashlib, json, re, typing, pathlib or datetime until they are needed.
+"""
+import importlib
+
+# Same as typing.TYPE_CHECKING, without importing typing (and re) at run time
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    # Only for type checkers and linters, at run time __getattr__ imports them
+    from .transfer_request import TransferRequest
+    from .account_manager import AccountManager
+    from .account_management_exception import AccountManagementException
+    from .account_deposit import AccountDeposit
+    from .iban_registry import IbanRegistry, IBAN_REGISTRY
+
+# Public name -> submodule that defines it
+_LAZY_ATTRIBUTES = {
+    "TransferRequest": ".transfer_request",
+    "AccountManager": ".account_manager",
+    "AccountManagementException": ".account_management_exception",
+    "AccountDeposit": ".account_deposit",
+    "IbanRegistry": ".iban_registry",
+    "IBAN_REGISTRY": ".iban_registry",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    """Imports the submodule defining the requested name on first access"""
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    # Cache it in the package so later accesses skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """Lists the lazy names along with the ones already loaded"""
+    return sorted(set(globals()) | set(__all__))
@@ -14,6 +14,8 @@ class AccountDeposit():
         self.__deposit_amount = deposit_amount
         justnow = datetime.now(timezone.utc)
         self.__deposit_date = datetime.timestamp(justnow)
+        # Lazily computed signature, reset by every setter
+        self.__signature = None
 
     def to_json(self):
         """returns the object data in json format"""
@@ -38,6 +40,7 @@ class AccountDeposit():
     @to_iban.setter
     def to_iban(self, value):
         self.__to_iban = value
+        self.__signature = None
 
     @property
     def deposit_amount(self):
@@ -46,6 +49,7 @@ class AccountDeposit():
     @deposit_amount.setter
     def deposit_amount(self, value):
         self.__deposit_amount = value
+        self.__signature = None
 
     @property
     def deposit_date(self):
@@ -54,9 +58,12 @@ class AccountDeposit():
     @deposit_date.setter
     def deposit_date( self, value ):
         self.__deposit_date = value
+        self.__signature = None
 
 
     @property
     def deposit_signature( self ):
         """Returns the sha256 signature of the date"""
-        return hashlib.sha256(self.__signature_string().encode()).hexdigest()
+        if self.__signature is None:
+            self.__signature = hashlib.sha256(self.__signature_string().encode()).hexdigest()
+        return self.__signature
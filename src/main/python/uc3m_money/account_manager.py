@@ -1,16 +1,29 @@
 """Module """
 import os
-import re
 from pathlib import Path
 from datetime import datetime, timezone
-import json
 from .account_deposit import AccountDeposit
 from .account_management_exception import AccountManagementException
+from .balance_cache import BALANCE_CACHE, BalanceCache
+from .iban_registry import IBAN_REGISTRY
+from .ledger_index import ledger_index
+from .memory_budget import memory_tracked, should_stream
+from .profiling import profiled
+from . import serialization
+from .validation_rules import deposit_amount_ok
+from .write_ahead_log import REPLACE
 
 class AccountManager:
     """Class for providing the methods for managing the orders"""
-    def __init__(self):
-        pass
+    def __init__(self, wal=None, balance_cache=BALANCE_CACHE, postings=None, balance_log=None):
+        # Optional WriteAheadLog protecting the deposits file
+        self.__wal = wal
+        # Cache of the balances computed from the ledger, None to always recompute
+        self.__balance_cache = balance_cache
+        # Optional PostingEngine that every accepted deposit is credited to
+        self.__postings = postings
+        # Optional SegmentedLog of test_balances.json, rolled over as it grows
+        self.__balance_log = balance_log
 
     @staticmethod
     def validate_iban(iban: str):
@@ -27,23 +40,9 @@ class AccountManager:
         if not isinstance(iban, str):
             raise AccountManagementException("IBAN must be a string")
 
-        iban = iban.replace(" ", "").upper()
-        iban_format = re.compile(r"^ES\d{2}[A-Z0-9]+$")
-
-        # Below makes sure parameter matches the IBAN format
-        if not iban_format.match(iban):
-            return False
-        # Moves the values at the indexes 0-3 to the back of the IBAN
-        mixed_iban = iban[4:] + iban[:4]
-        # Iterates over the IBAN changing the LETTERS to their numeric counterpart
-        # according to the ASCII relation
-        numeric_iban = "".join(str(ord(char) - 55) if char.isalpha()
-                               else char for char in mixed_iban)
-
-        # Converts the IBAN to an integer and performs the MOD 97 on it
-        iban_int = int(numeric_iban)
-
-        return iban_int % 97 == 1
+        # The registry normalizes the IBAN and caches the MOD-97 verdict, so
+        # repeated accounts are only checked once per process
+        return IBAN_REGISTRY.is_valid(iban)
 
 
     @staticmethod
@@ -54,20 +53,12 @@ class AccountManager:
         :param amount (str): The amount to be validated
         :return: bool: True if the amount is valid, otherwise False
         """
-        # Check if the amount follows the correct format (must have two decimal places explicitly)
-        amount = re.sub(r'[^\d.]', '', amount)
-        if not re.match(r'^\d+\.\d{2}$', amount):
-            return False
-
-        try:
-            # Convert to a float
-            value = float(amount)
-        except ValueError:
-            return False
-
-        # Check valid range
-        return 10 <= value <= 1000
+        # Check if the amount follows the correct format (must have two decimal places
+        # explicitly) and is within the valid range, with the precompiled rules
+        return deposit_amount_ok(amount)
 
+    @profiled
+    @memory_tracked
     def deposit_into_account(self, input_file: str) -> str:
         """
         Processes a deposit by reading account details from a JSON file,
@@ -78,46 +69,135 @@ class AccountManager:
         :raises AccountManagementException: If the file is missing, improperly formatted,
         contains invalid data, or encounters an internal error
         """
+        try:
+            ob_jam = self.__read_deposit(input_file)
+            self.__store_deposits([ob_jam])
+            # Returns the signature of the deposit
+            return ob_jam.deposit_signature
+        except Exception as e:
+            raise AccountManagementException(f"Internal processing error: {str(e)}") from e
+
+    @profiled
+    @memory_tracked
+    def deposit_batch(self, input_files: list) -> list:
+        """
+        Processes many deposit files as deposit_into_account does for each of
+        them in turn, storing the deposits together. Every file is validated
+        before any deposit is stored.
+
+        :param input_files (list): The names of the JSON files containing deposit details
+        :return: list: The deposit signatures, in the same order as the files
+        :raises AccountManagementException: If a file is missing, improperly formatted,
+        contains invalid data, or encounters an internal error
+        """
+        try:
+            deposits = [self.__read_deposit(input_file) for input_file in input_files]
+            if not deposits:
+                return []
+            signatures = [deposit.deposit_signature for deposit in deposits]
+            self.__store_deposits(deposits)
+            return signatures
+        except Exception as e:
+            raise AccountManagementException(f"Internal processing error: {str(e)}") from e
+
+    def __read_deposit(self, input_file: str) -> AccountDeposit:
+        """Reads and validates the deposit of a file in the json_files folder"""
         # open file, verify account number and deposit value
         current_spot = os.getcwd()
         json_file_path = os.path.join(current_spot, 'json_files', input_file)
-        try:
-            # Initializes the path to check to make sure the file can be found
-            path = Path(json_file_path)
-            if not path.is_file():
-                # Throws if the file is not found
-                raise AccountManagementException("Data file not found")
-            with open(json_file_path, "r", encoding="utf-8", newline="") as f:
-                try:
-                    data_list = json.load(f)
-                except json.decoder.JSONDecodeError as e:
-                    # Throws if the opened file is not in JSON format
-                    raise AccountManagementException("File is not in JSON format") from e
+        # Initializes the path to check to make sure the file can be found
+        path = Path(json_file_path)
+        if not path.is_file():
+            # Throws if the file is not found
+            raise AccountManagementException("Data file not found")
+        with open(json_file_path, "r", encoding="utf-8", newline="") as f:
+            try:
+                data_list = serialization.load(f)
+            except serialization.JSONDecodeError as e:
+                # Throws if the opened file is not in JSON format
+                raise AccountManagementException("File is not in JSON format") from e
 
-                # Checks that the file includes IBAN, AMOUNT, and the given structure
-                if not all(key in data_list for key in ["IBAN", "AMOUNT"]):
-                    raise AccountManagementException("JSON does not have expected structure")
+        # Checks that the file includes IBAN, AMOUNT, and the given structure
+        if not all(key in data_list for key in ["IBAN", "AMOUNT"]):
+            raise AccountManagementException("JSON does not have expected structure")
 
-                # Takes away the IBAN and AMOUNT attached with the data values
-                str_iban = data_list["IBAN"].strip()
-                str_amount = data_list["AMOUNT"].strip()
+        # Takes away the IBAN and AMOUNT attached with the data values
+        str_iban = data_list["IBAN"].strip()
+        str_amount = data_list["AMOUNT"].strip()
 
-                # Validates the given data values
-                if not self.validate_iban(str_iban) or not self.validate_amount(str_amount):
-                    raise AccountManagementException("The JSON data does not have valid values")
+        # Validates the given data values
+        if not self.validate_iban(str_iban) or not self.validate_amount(str_amount):
+            raise AccountManagementException("The JSON data does not have valid values")
 
-                ob_jam = AccountDeposit(str_iban, str_amount)
+        return AccountDeposit(str_iban, str_amount)
 
-                # Places the deposits into an output folder
-                output = "deposits.json"
-                with open(output, "w", encoding="utf-8", newline="") as file:
-                    json.dump(ob_jam.to_json(), file, indent=4)
+    def __store_deposits(self, deposits: list):
+        """Writes the last deposit to deposits.json, which each deposit replaces,
+        and credits every deposit to the posting engine"""
+        # Places the deposits into an output folder
+        output = "deposits.json"
+        if self.__wal is not None:
+            self.__wal.commit(self.__wal.log(REPLACE, output, deposits[-1].to_json()))
+        else:
+            with open(output, "w", encoding="utf-8", newline="") as file:
+                file.write(serialization.dumps_pretty(deposits[-1].to_json()))
+        for deposit in deposits:
+            if self.__postings is not None:
+                self.__postings.post_deposit(deposit.to_iban, deposit.deposit_amount,
+                                             deposit.deposit_signature)
+            if self.__balance_cache is not None:
+                self.__balance_cache.invalidate(IBAN_REGISTRY.normalize(deposit.to_iban))
 
-                # Returns the signature of the deposit
-                return ob_jam.deposit_signature
-        except Exception as e:
-            raise AccountManagementException(f"Internal processing error: {str(e)}") from e
+    @staticmethod
+    def _ledger_balance(json_file_path: str, iban: str) -> float:
+        """
+        Sums the amounts of the transactions of a canonical IBAN in a ledger file
+
+        :raises AccountManagementException: If the ledger is missing or invalid, or
+        the IBAN has no transactions
+        """
+        try:
+            with open(json_file_path, "r", encoding="utf-8") as file:
+                if should_stream(json_file_path):
+                    # Over the memory budget only one transaction is decoded at a time
+                    return AccountManager.__sum_transactions(
+                        serialization.iter_array_file(file), iban)
+                transactions = serialization.load(file)
+        except FileNotFoundError as exc:
+            raise AccountManagementException(f"Transactions file "
+                                             f"'{json_file_path}' not found") from exc
+        except serialization.JSONDecodeError as exc:
+            raise AccountManagementException(f"Invalid JSON format in "
+                                             f"'{json_file_path}'") from exc
+        return AccountManager.__sum_transactions(transactions, iban)
 
+    @staticmethod
+    def __sum_transactions(transactions, iban: str) -> float:
+        """Sums the amounts of the transactions of a canonical IBAN"""
+        balance = 0.0
+        iban_found = False
+        for transaction in transactions:
+            ledger_iban = transaction.get("IBAN")
+            if isinstance(ledger_iban, str) and IBAN_REGISTRY.normalize(ledger_iban) == iban:
+                iban_found = True
+                if ("amount" not in transaction or not
+                isinstance(transaction["amount"], (int, float, str))):
+                    raise (AccountManagementException
+                           (f"Invalid amount field in transaction: {transaction}"))
+                try:
+                    amount = float(transaction["amount"])
+                    balance += amount
+                except ValueError as exc:
+                    raise AccountManagementException(
+                        f"Invalid amount format in transaction: "
+                        f"{transaction}") from exc
+
+        if not iban_found:
+            raise AccountManagementException(f"IBAN '{iban}' not found in transactions")
+        return balance
+
+    @profiled
+    @memory_tracked
     def calculate_balance(self, iban: str) -> bool:
         """
         Calculates the balance for a given IBAN by processing transactions from a JSON file,
@@ -136,35 +216,15 @@ class AccountManager:
             if not self.validate_iban(iban):
                 raise AccountManagementException("Invalid IBAN")
 
-            try:
-                with open(json_file_path, "r", encoding="utf-8") as file:
-                    transactions = json.load(file)
-            except FileNotFoundError as exc:
-                raise AccountManagementException(f"Transactions file "
-                                                 f"'{json_file_path}' not found") from exc
-            except json.JSONDecodeError as exc:
-                raise AccountManagementException(f"Invalid JSON format in "
-                                                 f"'{json_file_path}'") from exc
-
-            balance = 0.0
-            iban_found = False
-            for transaction in transactions:
-                if transaction.get("IBAN") == iban:
-                    iban_found = True
-                    if ("amount" not in transaction or not
-                    isinstance(transaction["amount"], (int, float, str))):
-                        raise (AccountManagementException
-                               (f"Invalid amount field in transaction: {transaction}"))
-                    try:
-                        amount = float(transaction["amount"])
-                        balance += amount
-                    except ValueError as exc:
-                        raise AccountManagementException(
-                            f"Invalid amount format in transaction: "
-                            f"{transaction}") from exc
-
-            if not iban_found:
-                raise AccountManagementException(f"IBAN '{iban}' not found in transactions")
+            iban = IBAN_REGISTRY.normalize(iban)
+            cache = self.__balance_cache
+            balance = None if cache is None else cache.get(json_file_path, iban)
+            if balance is None:
+                # Taken before reading, so a concurrent write invalidates this entry
+                fingerprint = BalanceCache.fingerprint(json_file_path)
+                balance = self._ledger_balance(json_file_path, iban)
+                if cache is not None:
+                    cache.put(json_file_path, iban, balance, fingerprint)
 
             # Save the balance data to the balance file
             balance_data = {
@@ -175,9 +235,11 @@ class AccountManager:
             current_spot_again = os.getcwd()
             json_file_path_new = os.path.join(current_spot_again, 'test_balances.json')
             try:
-                with open(json_file_path_new, "a", encoding="utf-8") as file:
-                    json.dump(balance_data, file)
-                    file.write("\n")
+                if self.__balance_log is not None:
+                    self.__balance_log.append(balance_data)
+                else:
+                    with open(json_file_path_new, "a", encoding="utf-8") as file:
+                        file.write(serialization.dumps(balance_data) + "\n")
             except Exception as e:
                 raise AccountManagementException(f"Balance data saved incorrectly: "
                                                  f"{e}") from e
@@ -187,3 +249,20 @@ class AccountManager:
             raise e
         except Exception as e:
             raise AccountManagementException(f"Error with processing: {e}") from e
+
+    def get_transactions(self, iban: str, limit: int = None, offset: int = 0) -> list:
+        """
+        Returns the transactions of an IBAN in the ledger, for account statements.
+        Uses the persisted per-IBAN index, so only that account's records are read.
+
+        :param iban (str): The IBAN of the account
+        :param limit (int): Maximum number of transactions returned, None for all
+        :param offset (int): Number of transactions of the account to skip
+        :return: list: The transactions, in ledger order
+        :raises AccountManagementException: If the IBAN is invalid or the
+        transactions file is missing or improperly formatted
+        """
+        if not self.validate_iban(iban):
+            raise AccountManagementException("Invalid IBAN")
+        json_file_path = os.path.join(os.getcwd(), 'Transactions.json')
+        return ledger_index(json_file_path).get_transactions(iban, limit, offset)
@@ -0,0 +1,115 @@
+"""MODULE: balance_cache. In-process LRU/TTL cache of account balances"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class BalanceCache:
+    """Class that caches the balance of each IBAN computed from a ledger file.
+
+    Entries expire after ttl seconds and the least recently used ones are evicted
+    beyond max_entries. Every entry of a ledger is dropped when the file changes
+    on disk (mtime, inode or size), and writers of the package drop them
+    explicitly through invalidate()."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0, clock=time.monotonic):
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        # (ledger, iban) -> (balance, expiry)
+        self.__entries = OrderedDict()
+        # ledger -> fingerprint of the file the entries were computed from
+        self.__fingerprints = {}
+        self.__counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def fingerprint(ledger: str):
+        """Returns what identifies a version of the ledger file, None if it is missing"""
+        try:
+            stat = os.stat(ledger)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def get(self, ledger: str, iban: str):
+        """
+        Returns the cached balance of the IBAN in the ledger
+
+        :param ledger (str): Path of the ledger file
+        :param iban (str): The canonical IBAN
+        :return: float: The balance, or None if it is not cached or no longer valid
+        """
+        ledger = os.path.abspath(ledger)
+        fingerprint = self.fingerprint(ledger)
+        with self.__lock:
+            if self.__fingerprints.get(ledger) != fingerprint:
+                self.__drop_ledger(ledger)
+            entry = self.__entries.get((ledger, iban))
+            if entry is not None and entry[1] <= self.__clock():
+                del self.__entries[(ledger, iban)]
+                entry = None
+            if entry is None:
+                self.__counters["misses"] += 1
+                return None
+            self.__entries.move_to_end((ledger, iban))
+            self.__counters["hits"] += 1
+            return entry[0]
+
+    def put(self, ledger: str, iban: str, balance: float, fingerprint=None):
+        """
+        Caches the balance of the IBAN
+
+        :param fingerprint: Fingerprint of the ledger read to compute the balance,
+        taken now if not given. Should be taken before reading the ledger
+        """
+        ledger = os.path.abspath(ledger)
+        if fingerprint is None:
+            fingerprint = self.fingerprint(ledger)
+        with self.__lock:
+            if self.__fingerprints.get(ledger) != fingerprint:
+                self.__drop_ledger(ledger)
+                self.__fingerprints[ledger] = fingerprint
+            self.__entries[(ledger, iban)] = (balance, self.__clock() + self.__ttl)
+            self.__entries.move_to_end((ledger, iban))
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+                self.__counters["evictions"] += 1
+
+    def invalidate(self, iban=None, ledger: str = None):
+        """
+        Drops the cached balances of some IBANs, of a ledger, or all of them
+
+        :param iban: A canonical IBAN or a collection of them, None for all
+        :param ledger (str): Path of the ledger, None for all
+        """
+        ledger = None if ledger is None else os.path.abspath(ledger)
+        ibans = None if iban is None else {iban} if isinstance(iban, str) else set(iban)
+        with self.__lock:
+            keys = [key for key in self.__entries
+                    if (ibans is None or key[1] in ibans)
+                    and (ledger is None or key[0] == ledger)]
+            for key in keys:
+                del self.__entries[key]
+            self.__counters["invalidations"] += len(keys)
+
+    def stats(self) -> dict:
+        """Returns the size of the cache and its hit, miss and eviction counters"""
+        with self.__lock:
+            stats = dict(self.__counters)
+            stats["size"] = len(self.__entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def __drop_ledger(self, ledger):
+        """Drops every entry computed from an old version of the ledger"""
+        keys = [key for key in self.__entries if key[0] == ledger]
+        for key in keys:
+            del self.__entries[key]
+        self.__counters["invalidations"] += len(keys)
+        self.__fingerprints.pop(ledger, None)
+
+
+BALANCE_CACHE = BalanceCache()
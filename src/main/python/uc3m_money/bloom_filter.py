@@ -0,0 +1,298 @@
+"""MODULE: bloom_filter. Persisted Bloom filter over the duplicate keys of a
+transfers file, so save_to_json only scans the file for possible duplicates"""
+import atexit
+import hashlib
+import math
+import os
+import threading
+from . import serialization
+from .segmented_log import archived_segments, open_segment, read_manifest
+from .transfer_store import duplicate_key
+
+BLOOM_ERROR_RATE_ENV = "UC3M_MONEY_BLOOM_ERROR_RATE"
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_CAPACITY = 10000
+
+
+class BloomFilter:
+    """Class implementing a Bloom filter sized for a capacity and false positive rate"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE,
+                 bits: bytearray = None, count: int = 0):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError("The capacity must be positive and the error rate in (0, 1)")
+        self.__capacity = capacity
+        self.__error_rate = error_rate
+        self.__size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.__hashes = max(1, round(self.__size / capacity * math.log(2)))
+        self.__bits = bits if bits is not None else bytearray((self.__size + 7) // 8)
+        self.__count = count
+
+    @property
+    def capacity(self):
+        """Number of keys the filter was sized for"""
+        return self.__capacity
+
+    @property
+    def error_rate(self):
+        """False positive rate at full capacity"""
+        return self.__error_rate
+
+    @property
+    def bits(self):
+        """The bit array"""
+        return self.__bits
+
+    def __len__(self):
+        return self.__count
+
+    def add(self, key: bytes):
+        """Adds a key"""
+        bits = self.__bits
+        for position in self.__positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.__count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.__bits
+        return all(bits[position >> 3] & (1 << (position & 7))
+                   for position in self.__positions(key))
+
+    def stats(self) -> dict:
+        """Returns the size of the filter and its expected false positive rate"""
+        return {"keys": self.__count, "capacity": self.__capacity,
+                "error_rate": self.__error_rate, "hashes": self.__hashes,
+                "bits": self.__size, "memory_bytes": len(self.__bits),
+                "estimated_false_positive_rate":
+                    (1 - math.exp(-self.__hashes * self.__count / self.__size)) ** self.__hashes}
+
+    def __positions(self, key: bytes):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        size = self.__size
+        return [(first + index * second) % size for index in range(self.__hashes)]
+
+
+def filter_key(transfer_data: dict) -> bytes:
+    """Returns the bytes hashed into the filter for the duplicate key of a transfer.
+    Numbers are taken as floats, as the exact check finds 400 equal to 400.0."""
+    return serialization.dumps([float(value) if isinstance(value, (int, float))
+                                and not isinstance(value, bool) else value
+                                for value in duplicate_key(transfer_data)]).encode()
+
+
+class DuplicateFilter:
+    """Class that keeps a Bloom filter of the duplicate keys of a transfers file.
+
+    It is saved next to the file as <file>.bloom. Transfers appended since the
+    last refresh are added by reading only the new tail of the file; any other
+    change (a deletion, a rewrite) rebuilds it, so deleted transfers do not
+    stay as false positives. It doubles its capacity when it fills up.
+    A segmented store is covered whole: its archives are added on a rebuild."""
+
+    def __init__(self, filename: str = "transfers.json", error_rate: float = None,
+                 save_interval: int = 1000):
+        self.__filename = os.path.abspath(filename)
+        if error_rate is None:
+            error_rate = float(os.environ.get(BLOOM_ERROR_RATE_ENV, DEFAULT_ERROR_RATE))
+        self.__error_rate = error_rate
+        self.__save_interval = save_interval
+        self.__lock = threading.RLock()
+        self.__filter = None
+        self.__state = None
+        self.__unsaved = 0
+        self.__checks = {"definitely_new": 0, "exact_checks": 0, "false_positives": 0}
+
+    @property
+    def filename(self):
+        """Path of the transfers file"""
+        return self.__filename
+
+    @property
+    def filter_file(self):
+        """Path of the persisted filter"""
+        return self.__filename + ".bloom"
+
+    def might_contain(self, transfer_data: dict) -> bool:
+        """
+        Tells if a transfer may have a duplicate in the file
+
+        :param transfer_data (dict): The transfer about to be saved
+        :return: bool: False if there is definitely no duplicate, True if the
+        file has to be checked
+        """
+        with self.__lock:
+            self.refresh()
+            # An unterminated last line is unknown to the filter, the scan decides
+            if self.__state["partial"] or filter_key(transfer_data) in self.__filter:
+                self.__checks["exact_checks"] += 1
+                return True
+            self.__checks["definitely_new"] += 1
+            return False
+
+    def record_false_positive(self):
+        """Counts an exact check that found no duplicate"""
+        with self.__lock:
+            self.__checks["false_positives"] += 1
+
+    def stats(self) -> dict:
+        """Returns the filter size, its memory and how often it avoided a scan"""
+        with self.__lock:
+            self.refresh()
+            stats = self.__filter.stats()
+            stats.update(self.__checks)
+            return stats
+
+    def refresh(self):
+        """Brings the filter up to date with the transfers file"""
+        with self.__lock:
+            if self.__filter is None:
+                self.__load()
+            stat = self.__stat()
+            state = self.__state
+            if state is not None and state["fingerprint"] == stat:
+                return
+            if state is not None and stat is not None and (
+                    state["size"] == 0 or (state["fingerprint"] is not None
+                                           and stat[1] == state["fingerprint"][1]
+                                           and stat[2] >= state["size"]
+                                           and self.__anchor() == state["anchor"])):
+                self.__add_tail(state["size"])
+            else:
+                self.__rebuild()
+            self.__state["fingerprint"] = self.__stat()
+            if self.__unsaved >= self.__save_interval:
+                self.save()
+
+    def rolled(self):
+        """Keeps the keys after the active segment was archived by a SegmentedLog,
+        which must have been preceded by a refresh, and starts on the new one"""
+        with self.__lock:
+            self.__state = {"fingerprint": self.__stat(), "size": 0, "last": None,
+                            "anchor": None, "partial": False}
+            self.save()
+
+    def save(self):
+        """Writes the filter next to the transfers file"""
+        with self.__lock:
+            if self.__filter is None:
+                return
+            header = dict(self.__state, capacity=self.__filter.capacity,
+                          error_rate=self.__filter.error_rate, keys=len(self.__filter))
+            temporary = self.filter_file + ".tmp"
+            try:
+                with open(temporary, "wb") as file:
+                    file.write(serialization.dumps(header).encode() + b"\n")
+                    file.write(self.__filter.bits)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporary, self.filter_file)
+                self.__unsaved = 0
+            except OSError:
+                pass  # A read-only directory only costs a rebuild in the next process
+
+    def flush(self):
+        """Saves the filter if keys were added since it was last written"""
+        with self.__lock:
+            if self.__unsaved:
+                self.save()
+
+    def __stat(self):
+        try:
+            stat = os.stat(self.__filename)
+        except FileNotFoundError:
+            return None
+        return [stat.st_mtime_ns, stat.st_ino, stat.st_size]
+
+    def __anchor(self):
+        """Digest of the last line added, which must still be in place for the
+        file to have only grown by appends"""
+        state = self.__state
+        if state["last"] is None:
+            return None
+        start, length = state["last"]
+        with open(self.__filename, "rb") as file:
+            file.seek(start)
+            return hashlib.blake2b(file.read(length), digest_size=8).hexdigest()
+
+    def __load(self):
+        try:
+            with open(self.filter_file, "rb") as file:
+                header = serialization.loads(file.readline())
+                bits = bytearray(file.read())
+            if header["error_rate"] != self.__error_rate:
+                return
+            loaded = BloomFilter(header["capacity"], header["error_rate"], bits,
+                                 header["keys"])
+            if len(loaded.bits) != len(BloomFilter(header["capacity"],
+                                                   header["error_rate"]).bits):
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self.__filter = loaded
+        self.__state = {key: header[key] for key in ("fingerprint", "size", "last", "anchor",
+                                                  "partial")}
+
+    def __rebuild(self, capacity: int = DEFAULT_CAPACITY):
+        stat = self.__stat()
+        archived = sum(archive["lines"] for archive in read_manifest(self.__filename)["archives"])
+        # Sized for the transfers already there, one line being ~300 bytes
+        capacity = max(capacity, 2 * (archived + (stat[2] // 300 if stat else 0)))
+        self.__filter = BloomFilter(capacity, self.__error_rate)
+        self.__state = {"fingerprint": None, "size": 0, "last": None, "anchor": None,
+                        "partial": False}
+        for path in archived_segments(self.__filename):
+            with open_segment(path) as file:
+                for line in file:
+                    if line.strip():
+                        self.__filter.add(filter_key(serialization.loads(line)))
+        if stat is not None:
+            self.__add_tail(0)
+        self.__unsaved = self.__save_interval
+
+    def __add_tail(self, start: int):
+        """Adds the keys of every complete line from a byte offset to the end"""
+        state = self.__state
+        offset = start
+        state["partial"] = False
+        with open(self.__filename, "rb") as file:
+            file.seek(start)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # A line still being written is added on the next refresh
+                    state["partial"] = bool(line.strip())
+                    break
+                content = line.rstrip(b"\r\n")
+                if content.strip():
+                    self.__filter.add(filter_key(serialization.loads(content)))
+                    state["last"] = [offset, len(content)]
+                    state["anchor"] = hashlib.blake2b(content, digest_size=8).hexdigest()
+                    self.__unsaved += 1
+                offset += len(line)
+        state["size"] = offset
+        if len(self.__filter) > self.__filter.capacity:
+            # Full: the false positive rate would grow, rebuild with twice the room
+            self.__rebuild(2 * self.__filter.capacity)
+
+
+_FILTERS = {}
+_FILTERS_LOCK = threading.Lock()
+
+
+def duplicate_filter(filename: str = "transfers.json") -> DuplicateFilter:
+    """Returns the process-wide duplicate filter of a transfers file"""
+    filename = os.path.abspath(filename)
+    with _FILTERS_LOCK:
+        if filename not in _FILTERS:
+            _FILTERS[filename] = DuplicateFilter(filename)
+        return _FILTERS[filename]
+
+
+@atexit.register
+def _save_filters():
+    """Saves the filters with keys added since they were last written"""
+    with _FILTERS_LOCK:
+        for duplicates in _FILTERS.values():
+            duplicates.flush()
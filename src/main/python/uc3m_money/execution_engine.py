@@ -0,0 +1,233 @@
+"""MODULE: execution_engine. Executes saved transfers on their transfer_date
+
+Pending transfers wait in a heap ordered by date. At each day boundary the
+due ones are popped and executed together: appended in one write to the
+executed transfers file and, with a PostingEngine, posted to the accounts.
+The daily run only touches the transfers that are due. A transfer the
+posting engine refuses (no funds) is recorded with status "rejected".
+
+A run that fails puts its due transfers back in the heap. A run that crashed
+after appending and before saving its state is recognised on restart by the
+records past the size saved in the state, so they are not appended again.
+"""
+import heapq
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+from .account_management_exception import AccountManagementException
+from . import serialization
+from .transfer_index import date_key, transfer_index
+from .write_ahead_log import atomic_write
+
+
+class UtcClock:
+    """Clock giving the current UTC date"""
+
+    @staticmethod
+    def today() -> date:
+        """Returns the current UTC date"""
+        return datetime.now(timezone.utc).date()
+
+
+class SimulatedClock:
+    """Clock whose date only moves when it is told to, for tests and dry runs"""
+
+    def __init__(self, start: date):
+        self.__today = start
+
+    def today(self) -> date:
+        """Returns the simulated date"""
+        return self.__today
+
+    def advance(self, days: int = 1) -> date:
+        """Moves the date forward and returns it"""
+        self.__today += timedelta(days=days)
+        return self.__today
+
+
+class ExecutionEngine:
+    """Class that keeps the pending transfers in a heap by transfer_date and
+    releases the due ones in bulk when run.
+
+    The last day run and the codes executed on it are saved in <executed>.state,
+    so a restarted engine neither skips nor repeats executions."""
+
+    def __init__(self, transfers_file: str = "transfers.json",
+                 executed_file: str = "executed_transfers.json", clock=None, postings=None):
+        self.__transfers_file = transfers_file
+        self.__executed_file = executed_file
+        self.__clock = clock or UtcClock()
+        self.__postings = postings
+        self.__lock = threading.Lock()
+        self.__heap = []
+        self.__scheduled = set()
+        self.__sequence = 0
+        # Size of the executed file when the state was saved
+        self.__executed_size = 0
+        self.__executed_through, self.__last_codes = self.__load_state()
+        # Records appended by a run whose state was never saved, by code
+        self.__recorded = self.__recover()
+
+    @property
+    def executed_through(self):
+        """Last date run, None before the first run"""
+        return self.__executed_through
+
+    def __len__(self):
+        return len(self.__heap)
+
+    def schedule(self, transfer) -> bool:
+        """
+        Adds a transfer to the pending heap
+
+        :param transfer: The TransferRequest, or its to_json() record
+        :return: bool: False if it was already scheduled or executed
+        """
+        if not isinstance(transfer, dict):
+            transfer = transfer.to_json()
+        key = date_key(transfer.get("transfer_date"))
+        code = transfer.get("transfer_code")
+        if key is None or not isinstance(code, str):
+            raise ValueError("A scheduled transfer needs a transfer_date and transfer_code")
+        with self.__lock:
+            if code in self.__scheduled or code in self.__last_codes:
+                return False
+            if (self.__executed_through is not None
+                    and key < self.__executed_through.isoformat()):
+                return False  # Executed by an earlier run
+            self.__scheduled.add(code)
+            self.__sequence += 1
+            heapq.heappush(self.__heap, (key, self.__sequence, transfer))
+            return True
+
+    def load_pending(self) -> int:
+        """
+        Schedules the transfers of the transfers file not executed yet, read
+        through its date index
+
+        :return: int: The number of transfers added to the heap
+        """
+        start = None
+        if self.__executed_through is not None:
+            start = self.__executed_through.strftime("%d/%m/%Y")
+        if not os.path.exists(self.__transfers_file):
+            return 0
+        return sum(self.schedule(transfer) for transfer in
+                   transfer_index(self.__transfers_file).scan(start_date=start))
+
+    def next_due(self):
+        """Returns the date of the earliest pending transfer, None if there is none"""
+        with self.__lock:
+            return date.fromisoformat(self.__heap[0][0]) if self.__heap else None
+
+    def run(self) -> list:
+        """
+        Executes every pending transfer dated on or before the clock date
+
+        :return: list: The records written for the due transfers, each one the
+        transfer with its "executed_on" date and "status"
+        """
+        today = self.__clock.today()
+        limit = today.isoformat()
+        with self.__lock:
+            if self.__executed_through is not None and today < self.__executed_through:
+                return []  # A clock behind the last run has nothing new due
+            entries = []
+            while self.__heap and self.__heap[0][0] <= limit:
+                entries.append(heapq.heappop(self.__heap))
+            due = [entry[2] for entry in entries]
+            try:
+                written = [self.__execute(transfer, limit) for transfer in due
+                           if transfer["transfer_code"] not in self.__recorded]
+                self.__append(written)
+            except Exception:
+                # Nothing was appended: the next run executes them again, and the
+                # postings already made are not repeated
+                for entry in entries:
+                    heapq.heappush(self.__heap, entry)
+                raise
+            records = dict(self.__recorded)
+            records.update((record["transfer_code"], record) for record in written)
+            codes = [transfer["transfer_code"] for transfer in due]
+            executed = [records[code] for code in codes]
+            self.__scheduled.difference_update(codes)
+            if today == self.__executed_through:
+                codes = sorted(self.__last_codes.union(codes))
+            self.__executed_through, self.__last_codes = today, set(codes)
+            self.__save_state()
+            self.__recorded = {}
+            return executed
+
+    def run_until(self, end: date) -> list:
+        """
+        Advances a SimulatedClock day by day up to a date, running at each boundary
+
+        :return: list: The records written, in execution order
+        """
+        executed = self.run()
+        while self.__clock.today() < end:
+            self.__clock.advance()
+            executed.extend(self.run())
+        return executed
+
+    def __execute(self, transfer, limit) -> dict:
+        record = dict(transfer, executed_on=limit, status="executed")
+        if self.__postings is not None:
+            try:
+                self.__postings.post_transfer(transfer)
+            except AccountManagementException as e:
+                record.update(status="rejected", reason=e.message)
+        return record
+
+    def __append(self, records):
+        """Appends the executed records in one write, cutting a failed write off"""
+        if not records:
+            return
+        size = self.__size()
+        try:
+            with open(self.__executed_file, "a", encoding="utf-8") as file:
+                file.write(serialization.dumps_lines(records))
+        except OSError:
+            if os.path.exists(self.__executed_file):
+                os.truncate(self.__executed_file, size)
+            raise
+
+    def __size(self) -> int:
+        try:
+            return os.path.getsize(self.__executed_file)
+        except FileNotFoundError:
+            return 0
+
+    def __recover(self) -> dict:
+        """Reads the records appended after the state was last saved, dropping a
+        torn last line"""
+        size = self.__size()
+        if size <= self.__executed_size:
+            return {}
+        with open(self.__executed_file, "rb") as file:
+            file.seek(self.__executed_size)
+            tail = file.read()
+        complete = tail[:tail.rfind(b"\n") + 1]
+        if len(complete) < len(tail):
+            os.truncate(self.__executed_file, self.__executed_size + len(complete))
+        return {record["transfer_code"]: record for record in
+                (serialization.loads(line) for line in complete.splitlines() if line.strip())}
+
+    def __load_state(self):
+        try:
+            with open(self.__executed_file + ".state", "r", encoding="utf-8") as file:
+                state = serialization.load(file)
+        except FileNotFoundError:
+            # Whatever the file holds was appended by a run that never saved its state
+            return None, set()
+        # States saved before the size was recorded cover the whole file
+        self.__executed_size = state.get("executed_size", self.__size())
+        return date.fromisoformat(state["executed_through"]), set(state["last_codes"])
+
+    def __save_state(self):
+        self.__executed_size = self.__size()
+        atomic_write(self.__executed_file + ".state",
+                     serialization.dumps({"executed_through":
+                                          self.__executed_through.isoformat(),
+                                          "last_codes": sorted(self.__last_codes),
+                                          "executed_size": self.__executed_size}))
@@ -0,0 +1,295 @@
+"""MODULE: hash_chain. Tamper evidence for a transfers file through a hash chain
+
+Every transfer line is chained to the previous one: digest = SHA-256(previous
+digest + line). Lines are grouped in segments of segment_size; a full segment
+is sealed by appending [start offset, end offset, lines, start digest, end
+digest] to <file>.chain, and the open segment and the verification checkpoint
+are kept in <file>.chain.head.
+
+A sealed segment can be checked on its own from its start digest, so full
+verification runs the segments in parallel processes, and incremental
+verification only checks what was chained after the last checkpoint.
+
+When a SegmentedLog rolls the file over, the chain carries on: the segments
+of the rolled file are tagged with the name of its archive, where their
+offsets now point, and the chain continues from the same digest in the new
+active segment.
+"""
+import hashlib
+import os
+import threading
+from .account_management_exception import AccountManagementException
+from . import serialization
+from .segmented_log import open_segment, read_manifest
+from .write_ahead_log import atomic_write, read_json_lines
+
+GENESIS = "0" * 64
+
+
+def chain_range(filename: str, start: int, end: int, digest: str):
+    """
+    Chains the lines stored between two byte offsets of a file, or of a
+    compressed archive once decompressed
+
+    :return: tuple: (last digest, number of lines)
+    """
+    if start == end:
+        return digest, 0
+    value = bytes.fromhex(digest)
+    lines = 0
+    with open_segment(filename, binary=True) as file:
+        file.seek(start)
+        for line in file.read(end - start).splitlines():
+            if line.strip():
+                value = hashlib.sha256(value + line).digest()
+                lines += 1
+    return value.hex(), lines
+
+
+def check_segment(filename: str, segment: list) -> bool:
+    """Tells if a sealed segment still chains from its start to its end digest.
+    A segment tagged with an archive is read from that archive"""
+    start, end, lines, start_digest, end_digest = segment[:5]
+    if len(segment) > 5:
+        filename = os.path.join(os.path.dirname(filename), segment[5])
+    try:
+        return chain_range(filename, start, end, start_digest) == (end_digest, lines)
+    except FileNotFoundError:
+        return False
+
+
+def line_anchor(line: bytes) -> str:
+    """Digest of a chained line, to tell later if it is still in place"""
+    return hashlib.blake2b(line, digest_size=8).hexdigest()
+
+
+class HashChain:
+    """Class that chains the lines of a transfers file as they are appended and
+    verifies them, fully or from the last verified checkpoint"""
+
+    def __init__(self, filename: str = "transfers.json", segment_size: int = 1000):
+        self.__filename = os.path.abspath(filename)
+        self.__segment_size = segment_size
+        self.__lock = threading.RLock()
+        self.__segments = []
+        self.__tail = [0, 0, 0, GENESIS, GENESIS]
+        # Offset, length and digest of the last line chained in the file
+        self.__anchor = None
+        # Sealed segments verified, and the offset and digest verified in the tail
+        self.__verified = [0, 0, GENESIS]
+        self.__load()
+
+    @property
+    def filename(self):
+        """Path of the chained transfers file"""
+        return self.__filename
+
+    @property
+    def head(self):
+        """Digest of the last chained line, GENESIS for an empty file"""
+        return self.__tail[4]
+
+    def __len__(self):
+        return sum(segment[2] for segment in self.__segments) + self.__tail[2]
+
+    def update(self) -> int:
+        """
+        Chains the lines appended to the file since the last update
+
+        :return: int: The number of lines chained
+        :raises AccountManagementException: If the chained part was truncated or
+        rewritten; an authorized rewrite is followed by rebuild()
+        """
+        with self.__lock:
+            try:
+                size = os.path.getsize(self.__filename)
+            except FileNotFoundError:
+                size = 0
+            if size < self.__tail[1]:
+                raise AccountManagementException("Transfer log was truncated after "
+                                                 f"offset {size}")
+            self.__check_anchor()
+            added = 0
+            if size > self.__tail[1]:
+                with open(self.__filename, "rb") as file:
+                    file.seek(self.__tail[1])
+                    added = self.__chain(file)
+            self.__save_head()
+            return added
+
+    def rolled(self, archive: str):
+        """
+        Carries the chain over a SegmentedLog roll: the segments of the rolled
+        file now live in the archive, and the chain goes on in the new file.
+        The chain must have been updated just before the roll.
+
+        :param archive (str): Path of the archive of the rolled file
+        """
+        with self.__lock:
+            tail, verified = self.__tail, self.__verified
+            fully_verified = verified[0] == len(self.__segments) and verified[1] == tail[1]
+            name = os.path.basename(archive)
+            if tail[2]:
+                self.__segments.append(list(tail))
+            for segment in self.__segments:
+                if len(segment) == 5:
+                    segment.append(name)
+            atomic_write(self.__segments_file(), serialization.dumps_lines(self.__segments))
+            self.__tail = [0, 0, 0, tail[4], tail[4]]
+            self.__anchor = None
+            if fully_verified:
+                first = len(self.__segments)
+            else:
+                first = min(verified[0], max(0, len(self.__segments) - 1))
+            self.__verified = [first, 0, tail[4]]
+            self.__save_head()
+
+    def verify(self, max_workers: int = None) -> int:
+        """
+        Verifies the whole chain, the sealed segments in parallel processes
+
+        :param max_workers (int): Processes used, 1 to verify in this process
+        :return: int: The number of lines verified
+        :raises AccountManagementException: If a line was changed
+        """
+        with self.__lock:
+            lines = self.__check_segments(0, max_workers)
+            self.__verified = [len(self.__segments), self.__tail[0], self.__tail[3]]
+            return lines + self.__finish()
+
+    def verify_incremental(self) -> int:
+        """
+        Verifies only what was chained after the last verified checkpoint
+
+        :return: int: The number of lines verified
+        :raises AccountManagementException: If a line was changed
+        """
+        with self.__lock:
+            first = self.__verified[0]
+            lines = self.__check_segments(first, 1)
+            if first < len(self.__segments):
+                self.__verified = [len(self.__segments), self.__tail[0], self.__tail[3]]
+            return lines + self.__finish()
+
+    def rebuild(self) -> int:
+        """Chains the file again from scratch, archived segments first, after an
+        authorized rewrite such as delete_from_json"""
+        with self.__lock:
+            for path in (self.__segments_file(), self.__head_file()):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.__segments = []
+            self.__tail = [0, 0, 0, GENESIS, GENESIS]
+            self.__anchor = None
+            directory = os.path.dirname(self.__filename)
+            added = 0
+            for archive in read_manifest(self.__filename)["archives"]:
+                with open_segment(os.path.join(directory, archive["name"]),
+                                  binary=True) as file:
+                    added += self.__chain(file)
+                self.rolled(archive["name"])
+            self.__verified = [0, 0, GENESIS]
+            return added + self.update()
+
+    def __chain(self, file) -> int:
+        """Chains the complete lines read from the end of the tail"""
+        tail = self.__tail
+        added = 0
+        for line in file:
+            if not line.endswith(b"\n"):
+                break  # Chained once it is complete
+            content = line.rstrip(b"\r\n")
+            offset = tail[1]
+            tail[1] += len(line)
+            if not content.strip():
+                continue
+            tail[4] = hashlib.sha256(bytes.fromhex(tail[4]) + content).hexdigest()
+            tail[2] += 1
+            added += 1
+            self.__anchor = [offset, len(content), line_anchor(content)]
+            if tail[2] == self.__segment_size:
+                self.__seal()
+                tail = self.__tail
+        return added
+
+    def __check_anchor(self):
+        """Raises if the last chained line is no longer where it was chained"""
+        if self.__anchor is None:
+            return
+        start, length, digest = self.__anchor
+        try:
+            with open(self.__filename, "rb") as file:
+                file.seek(start)
+                found = line_anchor(file.read(length))
+        except FileNotFoundError:
+            found = None
+        if found != digest:
+            raise AccountManagementException(f"Transfer log was rewritten before "
+                                             f"offset {start + length}")
+
+    def __check_segments(self, first, max_workers):
+        pending = self.__segments[first:]
+        if max_workers == 1 or len(pending) < 2:
+            results = [check_segment(self.__filename, segment) for segment in pending]
+        else:
+            # Only full verifications pay for importing the process pool
+            import concurrent.futures  # pylint: disable=import-outside-toplevel
+            with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+                results = list(executor.map(check_segment, [self.__filename] * len(pending),
+                                            pending, chunksize=8))
+        for index, valid in enumerate(results):
+            if not valid:
+                raise AccountManagementException(f"Transfer log tampered in segment "
+                                                 f"{first + index} (bytes "
+                                                 f"{pending[index][0]}-{pending[index][1]})")
+        return sum(segment[2] for segment in pending)
+
+    def __finish(self) -> int:
+        """Verifies the open segment from the checkpoint and moves the checkpoint"""
+        _, end, _, _, head = self.__tail
+        start, digest = self.__verified[1], self.__verified[2]
+        try:
+            last, lines = chain_range(self.__filename, start, end, digest)
+        except FileNotFoundError:
+            last, lines = None, 0
+        if last != head:
+            raise AccountManagementException(f"Transfer log tampered after offset {start}")
+        self.__verified[1:] = [end, head]
+        self.__save_head()
+        return lines
+
+    def __seal(self):
+        segment = list(self.__tail)
+        with open(self.__segments_file(), "a", encoding="utf-8") as file:
+            file.write(serialization.dumps(segment) + "\n")
+        self.__segments.append(segment)
+        self.__tail = [segment[1], segment[1], 0, segment[4], segment[4]]
+
+    def __segments_file(self):
+        return self.__filename + ".chain"
+
+    def __head_file(self):
+        return self.__filename + ".chain.head"
+
+    def __save_head(self):
+        atomic_write(self.__head_file(), serialization.dumps(
+            {"segment_size": self.__segment_size, "tail": self.__tail,
+             "anchor": self.__anchor, "verified": self.__verified}))
+
+    def __load(self):
+        self.__segments = read_json_lines(self.__segments_file())
+        try:
+            with open(self.__head_file(), "r", encoding="utf-8") as file:
+                head = serialization.load(file)
+        except FileNotFoundError:
+            head = None
+        if head is not None:
+            self.__segment_size = head["segment_size"]
+            self.__tail = head["tail"]
+            self.__anchor = head.get("anchor")
+            self.__verified = head["verified"]
+        if self.__segments:
+            last = self.__segments[-1]
+            if len(last) == 5 and self.__tail[0] < last[1]:
+                # Crashed after sealing a segment and before saving the head
+                self.__tail = [last[1], last[1], 0, last[4], last[4]]
@@ -0,0 +1,106 @@
+"""MODULE: iban_registry. Contains the process-wide IBAN registry"""
+import functools
+import sys
+import threading
+from .validation_rules import iban_checksum_ok
+
+# Spellings and verdicts kept by the registry before the least recently used go
+DEFAULT_MAX_ENTRIES = 65536
+
+
+class IbanRegistry:
+    """Class that interns normalized IBANs, caches their validation verdict
+    and maps them to compact integer ids.
+
+    Spellings and verdicts are bounded LRU caches, so a feed of distinct or
+    invalid IBANs cannot grow them without limit; only valid IBANs are interned.
+    Ids are never evicted, since they must stay stable, and are only given to
+    valid IBANs."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.__lock = threading.Lock()
+        # raw spelling -> canonical (normalized, and interned if valid) IBAN
+        self.__canonical = functools.lru_cache(maxsize=max_entries)(self.__canonicalize)
+        # canonical IBAN -> MOD-97 verdict
+        self.__verdicts = functools.lru_cache(maxsize=max_entries)(self.check_iban)
+        # canonical IBAN <-> compact integer id
+        self.__ids = {}
+        self.__ibans = []
+
+    def normalize(self, iban: str) -> str:
+        """
+        Returns the canonical form of the IBAN (no spaces, upper case),
+        interned so every repeated account shares the same string object.
+
+        :param iban (str): The IBAN as written by the caller
+        :return: str: The canonical IBAN
+        """
+        return self.__canonical(iban)
+
+    def is_valid(self, iban: str) -> bool:
+        """
+        Returns the cached MOD-97 verdict of the IBAN, computing it the first
+        time the account is seen.
+
+        :param iban (str): The IBAN to be checked
+        :return: bool: True if the IBAN has the correct format and is valid, else false
+        """
+        return self.__verdicts(self.normalize(iban))
+
+    def iban_id(self, iban: str) -> int:
+        """
+        Returns the compact integer id of the IBAN, assigning the next free one
+        the first time the account is seen.
+
+        :param iban (str): The IBAN to be mapped
+        :return: int: The id of the canonical IBAN
+        :raises ValueError: If the IBAN is not valid
+        """
+        canonical = self.normalize(iban)
+        iban_id = self.__ids.get(canonical)
+        if iban_id is None:
+            if not self.__verdicts(canonical):
+                raise ValueError(f"Invalid IBAN {iban!r}")
+            with self.__lock:
+                iban_id = self.__ids.get(canonical)
+                if iban_id is None:
+                    iban_id = len(self.__ibans)
+                    self.__ibans.append(canonical)
+                    self.__ids[canonical] = iban_id
+        return iban_id
+
+    def iban_for_id(self, iban_id: int) -> str:
+        """Returns the canonical IBAN registered under the given id"""
+        if not isinstance(iban_id, int) or iban_id < 0:
+            raise KeyError(f"Unknown IBAN id {iban_id}")
+        try:
+            return self.__ibans[iban_id]
+        except IndexError as exc:
+            raise KeyError(f"Unknown IBAN id {iban_id}") from exc
+
+    def clear(self):
+        """Forgets every interned IBAN, verdict and id"""
+        with self.__lock:
+            self.__canonical.cache_clear()
+            self.__verdicts.cache_clear()
+            self.__ids.clear()
+            self.__ibans.clear()
+
+    def stats(self) -> dict:
+        """Returns the number of entries held by the registry"""
+        return {"spellings": self.__canonical.cache_info().currsize,
+                "verdicts": self.__verdicts.cache_info().currsize,
+                "ids": len(self.__ibans)}
+
+    def __canonicalize(self, iban: str) -> str:
+        canonical = iban.replace(" ", "").upper()
+        # Interned strings are shared process-wide, so only real accounts are
+        return sys.intern(canonical) if self.__verdicts(canonical) else canonical
+
+    @staticmethod
+    def check_iban(iban: str) -> bool:
+        """Performs the format and MOD-97 check on an already normalized IBAN"""
+        return iban_checksum_ok(iban)
+
+
+IBAN_REGISTRY = IbanRegistry()
@@ -0,0 +1,147 @@
+"""MODULE: lane_scheduler. Priority lanes per transfer_type for the transfer service"""
+import queue
+import threading
+import time
+from collections import deque
+
+# Share of the worker each lane gets while they all have work, highest priority first
+DEFAULT_SHARES = {"IMMEDIATE": 6, "URGENT": 3, "ORDINARY": 1}
+
+
+def parse_shares(text: str) -> dict:
+    """
+    Parses lane shares such as "IMMEDIATE=6,URGENT=3,ORDINARY=1"
+
+    :param text (str): Comma separated LANE=SHARE pairs
+    :return: dict: The shares by lane
+    :raises ValueError: If a pair is not valid
+    """
+    shares = {}
+    for pair in text.split(","):
+        lane, _, share = pair.partition("=")
+        shares[lane.strip().upper()] = int(share)
+    return shares
+
+
+class LaneScheduler:
+    """Class that keeps one bounded FIFO lane per transfer type and hands batches
+    to the worker with smooth weighted round robin over the lanes with work.
+
+    A lane with share s out of a total S gets at least s/S of every batch while
+    it has work, so IMMEDIATE requests wait at most about one batch behind any
+    ORDINARY backlog. Slots a lane cannot use go to the others."""
+
+    def __init__(self, shares: dict = None, max_queue: int = 1000, clock=time.perf_counter):
+        shares = dict(DEFAULT_SHARES if shares is None else shares)
+        if not shares or any(share < 1 for share in shares.values()):
+            raise ValueError("Every lane needs a share of at least 1")
+        # Highest share first, ties broken by the given order
+        self.__shares = dict(sorted(shares.items(), key=lambda item: -item[1]))
+        self.__default_lane = list(self.__shares)[-1]
+        self.__max_queue = max_queue
+        self.__clock = clock
+        self.__lanes = {lane: deque() for lane in self.__shares}
+        self.__credit = dict.fromkeys(self.__shares, 0)
+        self.__stats = {lane: {"queued": 0, "dequeued": 0, "total_wait": 0.0, "max_wait": 0.0}
+                        for lane in self.__shares}
+        self.__condition = threading.Condition()
+        self.__closed = False
+
+    @property
+    def shares(self):
+        """Share of each lane, highest priority first"""
+        return dict(self.__shares)
+
+    @property
+    def max_queue(self):
+        """Bound of each lane"""
+        return self.__max_queue
+
+    def lane_for(self, transfer_type) -> str:
+        """Returns the lane of a transfer type; unknown types go to the lowest lane"""
+        if isinstance(transfer_type, str) and transfer_type.upper() in self.__shares:
+            return transfer_type.upper()
+        return self.__default_lane
+
+    def put(self, transfer_type, item, block: bool = True, timeout: float = None):
+        """
+        Queues an item in the lane of its transfer type
+
+        :raises queue.Full: If the lane stays full
+        """
+        lane = self.lane_for(transfer_type)
+        with self.__condition:
+            pending = self.__lanes[lane]
+            if len(pending) >= self.__max_queue and not (
+                    block and self.__condition.wait_for(
+                        lambda: len(pending) < self.__max_queue, timeout)):
+                raise queue.Full
+            pending.append((item, self.__clock()))
+            self.__stats[lane]["queued"] += 1
+            self.__condition.notify_all()
+
+    def get_batch(self, size: int):
+        """
+        Waits for work and takes up to size items, following the lane shares
+
+        :return: list: The items, or None once the scheduler is closed and empty
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__closed or self.depth())
+            if not self.depth():
+                return None
+            lanes, credit = self.__lanes, self.__credit
+            now = self.__clock()
+            batch = []
+            while len(batch) < size:
+                active = [lane for lane in lanes if lanes[lane]]
+                if not active:
+                    break
+                for lane in active:
+                    credit[lane] += self.__shares[lane]
+                chosen = max(active, key=credit.get)
+                credit[chosen] -= sum(self.__shares[lane] for lane in active)
+                item, queued_at = lanes[chosen].popleft()
+                self.__record(chosen, now - queued_at)
+                batch.append(item)
+            # Credit only matters while lanes compete; idle lanes start afresh
+            for lane in lanes:
+                if not lanes[lane]:
+                    credit[lane] = 0
+            self.__condition.notify_all()
+            return batch
+
+    def close(self):
+        """Lets the worker drain the lanes and then stop"""
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def reopen(self):
+        """Accepts a new worker after close"""
+        with self.__condition:
+            self.__closed = False
+
+    def depth(self, lane: str = None) -> int:
+        """Returns the number of queued items, of one lane or of all"""
+        if lane is not None:
+            return len(self.__lanes[lane])
+        return sum(len(pending) for pending in self.__lanes.values())
+
+    def stats(self) -> dict:
+        """Returns the depth, counters and queue time of each lane"""
+        with self.__condition:
+            return {lane: {"share": self.__shares[lane],
+                           "queue_depth": len(self.__lanes[lane]),
+                           "queued": stats["queued"],
+                           "dequeued": stats["dequeued"],
+                           "avg_queue_ms": (stats["total_wait"] / stats["dequeued"] * 1000
+                                            if stats["dequeued"] else 0.0),
+                           "max_queue_ms": stats["max_wait"] * 1000}
+                    for lane, stats in self.__stats.items()}
+
+    def __record(self, lane, wait):
+        stats = self.__stats[lane]
+        stats["dequeued"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
@@ -0,0 +1,136 @@
+"""MODULE: ledger_index. Persisted IBAN -> record offsets index over a ledger file"""
+import os
+import threading
+from .account_management_exception import AccountManagementException
+from .balance_cache import BalanceCache
+from .iban_registry import IBAN_REGISTRY
+from . import serialization
+from .write_ahead_log import atomic_write
+
+
+class LedgerIndex:
+    """Class that maps each IBAN of a ledger (a JSON array of transactions such as
+    Transactions.json) to the byte offset and length of its transactions.
+
+    The index is saved next to the ledger as <ledger>.idx together with the
+    fingerprint of the ledger it describes, and is rebuilt with a single scan
+    whenever the ledger changes."""
+
+    def __init__(self, ledger: str = "Transactions.json"):
+        self.__ledger = os.path.abspath(ledger)
+        self.__lock = threading.Lock()
+        self.__fingerprint = None
+        self.__offsets = {}
+
+    @property
+    def ledger(self):
+        """Path of the indexed ledger"""
+        return self.__ledger
+
+    @property
+    def index_file(self):
+        """Path of the persisted index"""
+        return self.__ledger + ".idx"
+
+    def ibans(self) -> list:
+        """Returns the canonical IBANs found in the ledger"""
+        self.refresh()
+        return list(self.__offsets)
+
+    def count(self, iban: str) -> int:
+        """Returns the number of transactions of an IBAN"""
+        self.refresh()
+        return len(self.__offsets.get(IBAN_REGISTRY.normalize(iban), ()))
+
+    def get_transactions(self, iban: str, limit: int = None, offset: int = 0) -> list:
+        """
+        Reads the transactions of an IBAN, seeking directly to each of them
+
+        :param iban (str): The IBAN of the account
+        :param limit (int): Maximum number of transactions returned, None for all
+        :param offset (int): Number of transactions of the account to skip
+        :return: list: The transactions, in ledger order
+        """
+        if offset < 0 or (limit is not None and limit < 0):
+            raise AccountManagementException("Limit and offset must not be negative")
+        self.refresh()
+        positions = self.__offsets.get(IBAN_REGISTRY.normalize(iban), [])
+        end = None if limit is None else offset + limit
+        transactions = []
+        with open(self.__ledger, "rb") as file:
+            for start, length in positions[offset:end]:
+                file.seek(start)
+                transactions.append(serialization.loads(file.read(length)))
+        return transactions
+
+    def refresh(self):
+        """Loads the persisted index, or rebuilds it if the ledger has changed"""
+        fingerprint = BalanceCache.fingerprint(self.__ledger)
+        if fingerprint is None:
+            raise AccountManagementException(f"Transactions file "
+                                             f"'{self.__ledger}' not found")
+        fingerprint = list(fingerprint)
+        with self.__lock:
+            if self.__fingerprint == fingerprint:
+                return
+            if not self.__load(fingerprint):
+                self.__build(fingerprint)
+
+    def __load(self, fingerprint) -> bool:
+        """Loads the persisted index if it describes this version of the ledger"""
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as file:
+                saved = serialization.load(file)
+        except (OSError, ValueError):
+            return False
+        if saved.get("fingerprint") != fingerprint:
+            return False
+        self.__offsets = saved["ibans"]
+        self.__fingerprint = fingerprint
+        return True
+
+    def __build(self, fingerprint):
+        """Scans the ledger once and saves the index"""
+        with open(self.__ledger, "rb") as file:
+            raw = file.read()
+        try:
+            text = raw.decode("utf-8")
+            items = serialization.iter_array(text)
+            offsets = {}
+            # Positions are in characters, the index stores bytes
+            ascii_only = text.isascii()
+            byte_position, char_position = 0, 0
+            for start, end, transaction in items:
+                if not ascii_only:
+                    byte_position += len(text[char_position:start].encode())
+                    length = len(text[start:end].encode())
+                    char_position = start
+                else:
+                    byte_position, length = start, end - start
+                ledger_iban = transaction.get("IBAN") if isinstance(transaction, dict) else None
+                if isinstance(ledger_iban, str):
+                    offsets.setdefault(IBAN_REGISTRY.normalize(ledger_iban),
+                                       []).append([byte_position, length])
+        except (UnicodeDecodeError, serialization.JSONDecodeError) as exc:
+            raise AccountManagementException(f"Invalid JSON format in "
+                                             f"'{self.__ledger}'") from exc
+        self.__offsets = offsets
+        self.__fingerprint = fingerprint
+        try:
+            atomic_write(self.index_file, serialization.dumps({"fingerprint": fingerprint,
+                                                               "ibans": offsets}))
+        except OSError:
+            pass  # A read-only directory only costs a rebuild in the next process
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def ledger_index(ledger: str = "Transactions.json") -> LedgerIndex:
+    """Returns the process-wide index of a ledger file"""
+    ledger = os.path.abspath(ledger)
+    with _INDEXES_LOCK:
+        if ledger not in _INDEXES:
+            _INDEXES[ledger] = LedgerIndex(ledger)
+        return _INDEXES[ledger]
@@ -0,0 +1,167 @@
+"""MODULE: memory_budget. Memory reporting and a memory budget for bulk operations
+
+With UC3M_MONEY_MEMORY_REPORT=1 every run of the operations decorated with
+memory_tracked() is measured with tracemalloc, and memory_stats() returns the
+peak allocated by each operation together with the peak RSS of the process.
+
+UC3M_MONEY_MEMORY_BUDGET (bytes, or with a K, M or G suffix) or
+set_memory_budget() sets the memory the bulk paths may use to hold a file:
+reading a file whose decoded size would exceed it, calculate_balance and
+delete_from_json stream it instead of loading it whole. An invalid
+UC3M_MONEY_MEMORY_BUDGET is reported once with a warning and means no budget.
+"""
+import functools
+import os
+import threading
+import warnings
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+MEMORY_BUDGET_ENV = "UC3M_MONEY_MEMORY_BUDGET"
+MEMORY_REPORT_ENV = "UC3M_MONEY_MEMORY_REPORT"
+# Decoded JSON records take about eight times their size on disk
+DECODED_SIZE_FACTOR = 8
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_UNSET = object()
+_budget = _UNSET
+# Last UC3M_MONEY_MEMORY_BUDGET read and the budget parsed from it
+_env_budget = ("", None)
+_stats = {}
+_stats_lock = threading.Lock()
+_active = threading.local()
+
+
+def parse_size(value: str) -> int:
+    """
+    Parses a size such as "1048576", "512K" or "64M"
+
+    :param value (str): The size, in bytes or with a K, M or G suffix
+    :return: int: The size in bytes
+    :raises ValueError: If the size is not valid
+    """
+    text = str(value).strip().upper().removesuffix("B")
+    factor = _UNITS.get(text[-1:], 1)
+    if factor != 1:
+        text = text[:-1]
+    size = int(float(text) * factor)
+    if size < 0:
+        raise ValueError(f"Invalid memory size '{value}'")
+    return size
+
+
+def set_memory_budget(size=None):
+    """
+    Sets the memory budget of the bulk paths, overriding UC3M_MONEY_MEMORY_BUDGET
+
+    :param size: Bytes, or a string accepted by parse_size; None for no budget
+    """
+    global _budget  # pylint: disable=global-statement
+    _budget = None if size is None else parse_size(size)
+
+
+def reset_memory_budget():
+    """Goes back to the budget of UC3M_MONEY_MEMORY_BUDGET"""
+    global _budget  # pylint: disable=global-statement
+    _budget = _UNSET
+
+
+def memory_budget():
+    """Returns the memory budget in bytes, None if there is none"""
+    global _env_budget  # pylint: disable=global-statement
+    if _budget is not _UNSET:
+        return _budget
+    value = os.environ.get(MEMORY_BUDGET_ENV, "").strip()
+    if value != _env_budget[0]:
+        try:
+            _env_budget = (value, parse_size(value) if value else None)
+        except ValueError:
+            warnings.warn(f"Ignoring invalid {MEMORY_BUDGET_ENV} '{value}'", RuntimeWarning)
+            _env_budget = (value, None)
+    return _env_budget[1]
+
+
+def should_stream(path: str) -> bool:
+    """
+    Tells if a file is too big to be decoded whole within the memory budget
+
+    :param path (str): The file a bulk path is going to read
+    :return: bool: True if the file has to be streamed
+    """
+    budget = memory_budget()
+    if budget is None:
+        return False
+    try:
+        return os.path.getsize(path) * DECODED_SIZE_FACTOR > budget
+    except OSError:
+        return False
+
+
+def memory_tracked(function):
+    """Decorator that measures the memory of each run of an operation when
+    UC3M_MONEY_MEMORY_REPORT is set. Nested operations count in the outer one.
+    A tracemalloc session started by the caller is left as it is: its peak is
+    not reset, so the peak recorded is an upper bound."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if (os.environ.get(MEMORY_REPORT_ENV, "0") in ("", "0")
+                or getattr(_active, "running", False)):
+            return function(*args, **kwargs)
+        import tracemalloc  # pylint: disable=import-outside-toplevel
+        _active.running = True
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        if started:
+            tracemalloc.reset_peak()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            if started:
+                tracemalloc.stop()
+            _active.running = False
+            _record(function.__qualname__, peak - base, current - base)
+    return wrapper
+
+
+def memory_stats() -> dict:
+    """
+    Returns the memory measured per operation
+
+    :return: dict: For each operation its runs, the peak and retained bytes of
+    the last run and the highest peak; "peak_rss" is the peak resident set
+    size of the process in bytes, None where it cannot be read
+    """
+    with _stats_lock:
+        stats = {name: dict(values) for name, values in _stats.items()}
+    stats["peak_rss"] = peak_rss()
+    return stats
+
+
+def reset_memory_stats():
+    """Forgets the measured operations"""
+    with _stats_lock:
+        _stats.clear()
+
+
+def peak_rss():
+    """Returns the peak resident set size of the process in bytes, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _record(name, peak, retained):
+    with _stats_lock:
+        values = _stats.setdefault(name, {"runs": 0, "last_peak": 0, "max_peak": 0,
+                                          "last_retained": 0})
+        values["runs"] += 1
+        values["last_peak"] = peak
+        values["last_retained"] = retained
+        values["max_peak"] = max(values["max_peak"], peak)
@@ -0,0 +1,156 @@
+"""MODULE: netting. Bilateral and multilateral netting of pending transfers
+
+Transfers are aggregated in one pass into hash maps of integer cents, so the
+memory used grows with the number of accounts and pairs, not of transfers.
+"""
+import math
+from .iban_registry import IBAN_REGISTRY
+from .posting_engine import PostingEngine
+from .snapshot import Snapshot
+
+
+class NettingResult:
+    """Class holding the net postings that settle a batch of transfers"""
+
+    def __init__(self, postings: list, transfer_count: int, gross_cents: int):
+        self.__postings = postings
+        self.__transfer_count = transfer_count
+        self.__gross_cents = gross_cents
+
+    @property
+    def postings(self):
+        """Net postings as {"from_iban", "to_iban", "amount"} dicts"""
+        return [{"from_iban": sender, "to_iban": receiver, "amount": cents / 100}
+                for sender, receiver, cents in self.__postings]
+
+    @property
+    def transfer_count(self):
+        """Number of transfers netted"""
+        return self.__transfer_count
+
+    @property
+    def posting_count(self):
+        """Number of net postings"""
+        return len(self.__postings)
+
+    @property
+    def gross_amount(self):
+        """Sum of the amounts of the transfers"""
+        return self.__gross_cents / 100
+
+    @property
+    def net_amount(self):
+        """Sum of the amounts of the net postings"""
+        return sum(cents for _, _, cents in self.__postings) / 100
+
+    @property
+    def compression_ratio(self):
+        """Transfers per net posting; 0.0 without transfers, and infinity
+        (math.inf) if there are transfers and they all cancel out"""
+        if not self.__postings:
+            return math.inf if self.__transfer_count else 0.0
+        return self.__transfer_count / len(self.__postings)
+
+    def positions(self) -> dict:
+        """Returns the net position of each account, positive for receivers"""
+        positions = {}
+        for sender, receiver, cents in self.__postings:
+            positions[sender] = positions.get(sender, 0) - cents
+            positions[receiver] = positions.get(receiver, 0) + cents
+        return {iban: cents / 100 for iban, cents in positions.items()}
+
+    def stats(self) -> dict:
+        """Returns the counts, amounts and compression ratio, ready to be written as
+        JSON: the ratio of transfers that all cancel out is None instead of infinity"""
+        ratio = self.compression_ratio
+        return {"transfers": self.__transfer_count, "postings": self.posting_count,
+                "gross_amount": self.gross_amount, "net_amount": self.net_amount,
+                "compression_ratio": None if math.isinf(ratio) else ratio}
+
+
+def bilateral_net(transfers) -> NettingResult:
+    """
+    Nets the flows of each pair of accounts into at most one posting
+
+    :param transfers: Iterable of TransferRequest objects or to_json() records
+    :return: NettingResult: One posting per pair with a non-zero net flow
+    """
+    # Each pair is keyed in IBAN order, the flow counting positive in that direction
+    flows = {}
+    count = gross = 0
+    for sender, receiver, cents in _flows(transfers):
+        count += 1
+        gross += cents
+        if sender < receiver:
+            flows[sender, receiver] = flows.get((sender, receiver), 0) + cents
+        elif receiver < sender:
+            flows[receiver, sender] = flows.get((receiver, sender), 0) - cents
+    postings = []
+    for (first, second), cents in flows.items():
+        if cents > 0:
+            postings.append((first, second, cents))
+        elif cents < 0:
+            postings.append((second, first, -cents))
+    return NettingResult(postings, count, gross)
+
+
+def multilateral_net(transfers) -> NettingResult:
+    """
+    Nets the flows of all the accounts together: each account ends up either
+    paying or receiving its net position, in at most accounts - 1 postings
+
+    :param transfers: Iterable of TransferRequest objects or to_json() records
+    :return: NettingResult: The postings, largest payers matched to largest receivers
+    """
+    positions = {}
+    count = gross = 0
+    for sender, receiver, cents in _flows(transfers):
+        positions[sender] = positions.get(sender, 0) - cents
+        positions[receiver] = positions.get(receiver, 0) + cents
+        count += 1
+        gross += cents
+    payers = sorted(((-cents, iban) for iban, cents in positions.items() if cents < 0),
+                    reverse=True)
+    receivers = sorted(((cents, iban) for iban, cents in positions.items() if cents > 0),
+                       reverse=True)
+    postings = []
+    payer_index = receiver_index = 0
+    owed = payers[0][0] if payers else 0
+    due = receivers[0][0] if receivers else 0
+    while payer_index < len(payers) and receiver_index < len(receivers):
+        cents = min(owed, due)
+        postings.append((payers[payer_index][1], receivers[receiver_index][1], cents))
+        owed -= cents
+        due -= cents
+        if not owed:
+            payer_index += 1
+            owed = payers[payer_index][0] if payer_index < len(payers) else 0
+        if not due:
+            receiver_index += 1
+            due = receivers[receiver_index][0] if receiver_index < len(receivers) else 0
+    return NettingResult(postings, count, gross)
+
+
+def net_transfers(transfers, multilateral: bool = False) -> NettingResult:
+    """Nets a batch of transfers bilaterally, or across all the accounts"""
+    return multilateral_net(transfers) if multilateral else bilateral_net(transfers)
+
+
+def read_transfers(filename: str = "transfers.json"):
+    """Yields the transfers of a transfers file one line at a time, archived
+    segments included, to net a whole store without loading it. They come from
+    a snapshot, so transfers saved or deleted meanwhile do not show up halfway"""
+    with Snapshot(filename) as snapshot:
+        yield from snapshot.records()
+
+
+def _flows(transfers):
+    """Yields (sender, receiver, cents) for each transfer"""
+    normalize, to_cents = IBAN_REGISTRY.normalize, PostingEngine.to_cents
+    for transfer in transfers:
+        if isinstance(transfer, dict):
+            yield (normalize(transfer["from_iban"]), normalize(transfer["to_iban"]),
+                   to_cents(transfer["transfer_amount"]))
+        else:
+            # A TransferRequest already holds canonical IBANs
+            yield (transfer.from_iban, transfer.to_iban, to_cents(transfer.transfer_amount))
@@ -0,0 +1,256 @@
+"""MODULE: posting_engine. Double-entry posting of transfers and deposits to a
+live account table persisted through an append log"""
+import os
+import threading
+from .account_management_exception import AccountManagementException
+from .balance_cache import BalanceCache
+from .iban_registry import IBAN_REGISTRY
+from . import serialization
+from .validation_rules import AMOUNT_SIGN_PATTERN, AMOUNT_STRIP_PATTERN
+from .write_ahead_log import atomic_write, read_json_lines
+
+# Contra account of the money that enters through deposits, so every posting
+# balances and the sum of all the accounts is always zero
+EXTERNAL_ACCOUNT = "EXTERNAL"
+
+
+class PostingEngine:
+    """Class that turns each transfer into a debit/credit pair and each deposit
+    into a credit, keeping the balance of every account in memory.
+
+    Every posting is appended to the log before it is applied, and the table
+    is rebuilt from the log when the engine is created. Postings are keyed by
+    the transfer_code or deposit signature, so posting one twice does nothing.
+
+    With an overdraft_limit (0 for none allowed) transfers that would take the
+    sender below minus that limit are refused, checked against the running
+    balance in O(1).
+
+    With a ledger (such as Transactions.json) the balances it holds are the
+    opening balances of the accounts, so balance() agrees with
+    calculate_balance. The ledger is summed again only when it changes."""
+
+    def __init__(self, log_file: str = "postings.log", durable: bool = True,
+                 overdraft_limit: float = None, ledger: str = None):
+        self.__log_file = log_file
+        self.__durable = durable
+        self.__overdraft_limit = (None if overdraft_limit is None
+                                  else self.to_cents(overdraft_limit))
+        self.__lock = threading.Lock()
+        self.__accounts = {}
+        self.__references = set()
+        self.__ledger = None if ledger is None else os.path.abspath(ledger)
+        # Fingerprint of the ledger and the balances in cents summed from it
+        self.__opening = (None, {})
+        self.__replay()
+
+    @property
+    def log_file(self):
+        """Path of the append log"""
+        return self.__log_file
+
+    def __len__(self):
+        return len(self.__references)
+
+    @property
+    def overdraft_limit(self):
+        """Overdraft allowed to senders, None if funds are not checked"""
+        return None if self.__overdraft_limit is None else self.__overdraft_limit / 100
+
+    def has_funds(self, iban: str, amount) -> bool:
+        """
+        Tells if an account can send an amount without exceeding the overdraft limit
+
+        :param iban (str): The IBAN of the sender
+        :param amount: The amount to send
+        :return: bool: True if it can, always True when funds are not checked
+        """
+        cents = self.to_cents(amount)
+        with self.__lock:
+            return self.__has_funds(IBAN_REGISTRY.normalize(iban), cents)
+
+    def check_funds(self, iban: str, amount):
+        """
+        Checks the funds of a sender before a transfer is saved
+
+        :raises AccountManagementException: If the sender does not have the funds
+        """
+        if not self.has_funds(iban, amount):
+            raise AccountManagementException("Insufficient funds")
+
+    def post_transfer(self, transfer) -> bool:
+        """
+        Debits the sender and credits the receiver of a transfer
+
+        :param transfer: The TransferRequest, or its to_json() record
+        :return: bool: True if it was posted, False if it already was
+        :raises AccountManagementException: If the sender does not have the funds
+        """
+        if not isinstance(transfer, dict):
+            transfer = transfer.to_json()
+        cents = self.to_cents(transfer["transfer_amount"])
+        sender = IBAN_REGISTRY.normalize(transfer["from_iban"])
+        return self.__post(transfer["transfer_code"], "transfer",
+                           [[sender, -cents],
+                            [IBAN_REGISTRY.normalize(transfer["to_iban"]), cents]],
+                           sender)
+
+    def reverse_transfer(self, transfer) -> bool:
+        """
+        Posts the reversal of a transfer, such as one whose append failed
+
+        :param transfer: The TransferRequest, or its to_json() record
+        :return: bool: True if it was reversed, False if it was not posted
+        """
+        if not isinstance(transfer, dict):
+            transfer = transfer.to_json()
+        cents = self.to_cents(transfer["transfer_amount"])
+        with self.__lock:
+            if transfer["transfer_code"] not in self.__references:
+                return False
+            self.__write({"ref": transfer["transfer_code"], "kind": "reversal",
+                          "legs": [[IBAN_REGISTRY.normalize(transfer["from_iban"]), cents],
+                                   [IBAN_REGISTRY.normalize(transfer["to_iban"]), -cents]]})
+            return True
+
+    def post_deposit(self, iban: str, amount, reference: str) -> bool:
+        """
+        Credits a deposit to an account
+
+        :param iban (str): The IBAN of the account
+        :param amount: The amount, as a number or as a string such as "EUR 1000.00"
+        :param reference (str): The deposit signature
+        :return: bool: True if it was posted, False if it already was
+        """
+        cents = self.to_cents(amount)
+        return self.__post(reference, "deposit",
+                           [[EXTERNAL_ACCOUNT, -cents], [IBAN_REGISTRY.normalize(iban), cents]])
+
+    def balance(self, iban: str) -> float:
+        """Returns the balance of an account, its ledger balance included, 0.0 if
+        nothing was posted to it"""
+        return self.balance_cents(iban) / 100
+
+    def balance_cents(self, iban: str) -> int:
+        """Returns the balance of an account in cents"""
+        iban = IBAN_REGISTRY.normalize(iban)
+        with self.__lock:
+            return self.__accounts.get(iban, 0) + self.__opening_cents(iban)
+
+    def accounts(self) -> dict:
+        """Returns the posted balance of every account, EXTERNAL_ACCOUNT included
+        and the ledger left out, so they always add up to zero"""
+        with self.__lock:
+            return {iban: cents / 100 for iban, cents in self.__accounts.items()}
+
+    def is_posted(self, reference: str) -> bool:
+        """Tells if a transfer_code or deposit signature has been posted"""
+        with self.__lock:
+            return reference in self.__references
+
+    def compact(self):
+        """Replaces the log by a snapshot of the account table"""
+        with self.__lock:
+            snapshot = {"snapshot": {"accounts": self.__accounts,
+                                     "references": sorted(self.__references)}}
+            atomic_write(self.__log_file, serialization.dumps(snapshot) + "\n")
+
+    @staticmethod
+    def to_cents(amount) -> int:
+        """Converts an amount, such as 10.5, "-1280.06" or "EUR 1000.00", to
+        integer cents"""
+        sign = 1
+        if isinstance(amount, str):
+            sign = -1 if AMOUNT_SIGN_PATTERN.match(amount) else 1
+            amount = AMOUNT_STRIP_PATTERN.sub("", amount)
+        try:
+            return sign * round(float(amount) * 100)
+        except (TypeError, ValueError) as exc:
+            raise AccountManagementException(f"Invalid amount {amount!r}") from exc
+
+    def __has_funds(self, iban, cents) -> bool:
+        if self.__overdraft_limit is None:
+            return True
+        balance = self.__accounts.get(iban, 0) + self.__opening_cents(iban)
+        return balance - cents >= -self.__overdraft_limit
+
+    def __opening_cents(self, iban) -> int:
+        """Balance of an account in the ledger, summed again if the ledger changed"""
+        if self.__ledger is None:
+            return 0
+        fingerprint = BalanceCache.fingerprint(self.__ledger)
+        if fingerprint != self.__opening[0]:
+            self.__opening = (fingerprint, self.__sum_ledger())
+        return self.__opening[1].get(iban, 0)
+
+    def __sum_ledger(self) -> dict:
+        balances = {}
+        try:
+            with open(self.__ledger, "r", encoding="utf-8") as file:
+                for transaction in serialization.iter_array_file(file):
+                    iban = IBAN_REGISTRY.normalize(transaction["IBAN"])
+                    balances[iban] = balances.get(iban, 0) + self.to_cents(transaction["amount"])
+        except FileNotFoundError:
+            pass
+        except (serialization.JSONDecodeError, KeyError, TypeError,
+                AccountManagementException) as exc:
+            raise AccountManagementException(f"Invalid JSON format in "
+                                             f"'{self.__ledger}'") from exc
+        return balances
+
+    def __post(self, reference, kind, legs, sender=None) -> bool:
+        if not isinstance(reference, str) or not reference:
+            raise AccountManagementException("A posting needs a reference")
+        with self.__lock:
+            if reference in self.__references:
+                return False
+            # Checked under the lock, so concurrent transfers cannot overdraw
+            if sender is not None and not self.__has_funds(sender, legs[1][1]):
+                raise AccountManagementException("Insufficient funds")
+            self.__write({"ref": reference, "kind": kind, "legs": legs})
+            return True
+
+    def __write(self, entry):
+        """Appends an entry to the log and applies it, called under the lock"""
+        with open(self.__log_file, "a", encoding="utf-8") as file:
+            file.write(serialization.dumps(entry) + "\n")
+            if self.__durable:
+                file.flush()
+                os.fsync(file.fileno())
+        self.__apply(entry)
+
+    def __apply(self, entry):
+        if entry["kind"] == "reversal":
+            self.__references.discard(entry["ref"])
+        else:
+            self.__references.add(entry["ref"])
+        accounts = self.__accounts
+        for iban, cents in entry["legs"]:
+            accounts[iban] = accounts.get(iban, 0) + cents
+
+    def __replay(self):
+        """Rebuilds the account table from the log"""
+        try:
+            entries = read_json_lines(self.__log_file)
+        except serialization.JSONDecodeError as exc:
+            raise AccountManagementException(f"Invalid posting log "
+                                             f"'{self.__log_file}'") from exc
+        if self.__torn():
+            # Drops a torn last line left by a crash so appends start on a new line
+            atomic_write(self.__log_file, serialization.dumps_lines(entries))
+        for entry in entries:
+            if "snapshot" in entry:
+                self.__accounts = dict(entry["snapshot"]["accounts"])
+                self.__references = set(entry["snapshot"]["references"])
+            elif (entry["kind"] == "reversal") == (entry["ref"] in self.__references):
+                self.__apply(entry)
+
+    def __torn(self) -> bool:
+        try:
+            with open(self.__log_file, "rb") as file:
+                if file.seek(0, os.SEEK_END) == 0:
+                    return False
+                file.seek(-1, os.SEEK_END)
+                return file.read(1) != b"\n"
+        except FileNotFoundError:
+            return False
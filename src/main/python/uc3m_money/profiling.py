@@ -0,0 +1,148 @@
+"""MODULE: profiling. Opt-in profiling of uc3m_money operations
+
+Setting UC3M_MONEY_PROFILE to "cprofile" (or "1") or "collapsed" profiles every
+run of the operations decorated with profiled(): deposit_into_account,
+calculate_balance and transfer_request. Each run is written to its own file in
+UC3M_MONEY_PROFILE_DIR (default "profiles"): a pstats dump (.prof) for
+cProfile, or one "frame;frame;frame microseconds" line per stack (.collapsed)
+that flamegraph.pl, speedscope or inferno read directly.
+
+An unknown UC3M_MONEY_PROFILE is reported once with a warning and leaves
+profiling off. Profile can also be used as a context manager around any code.
+"""
+import functools
+import itertools
+import os
+import sys
+import threading
+import time
+import warnings
+
+PROFILE_ENV = "UC3M_MONEY_PROFILE"
+PROFILE_DIR_ENV = "UC3M_MONEY_PROFILE_DIR"
+CPROFILE = "cprofile"
+COLLAPSED = "collapsed"
+_MODES = {"1": CPROFILE, CPROFILE: CPROFILE, COLLAPSED: COLLAPSED}
+_EXTENSIONS = {CPROFILE: ".prof", COLLAPSED: ".collapsed"}
+_RUNS = itertools.count(1)
+_ACTIVE = threading.local()
+# Last UC3M_MONEY_PROFILE read and the mode validated from it
+_ENV_MODE = ["", None]
+
+
+class Profile:
+    """Class that profiles the code run inside it and writes the result to a file"""
+
+    def __init__(self, name: str = "uc3m_money", mode: str = CPROFILE,
+                 directory: str = None):
+        if mode not in _EXTENSIONS:
+            raise ValueError(f"Unknown profiling mode '{mode}'")
+        self.__name = name
+        self.__mode = mode
+        self.__directory = directory or os.environ.get(PROFILE_DIR_ENV, "profiles")
+        self.__profiler = None
+        self.__path = None
+
+    @property
+    def path(self):
+        """File the profile was written to, None until the block ends"""
+        return self.__path
+
+    def __enter__(self):
+        if self.__mode == CPROFILE:
+            import cProfile  # pylint: disable=import-outside-toplevel
+            self.__profiler = cProfile.Profile()
+        else:
+            self.__profiler = _StackProfiler()
+        self.__profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__profiler.disable()
+        os.makedirs(self.__directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        self.__path = os.path.join(self.__directory,
+                                   f"{self.__name}-{stamp}-{os.getpid()}-{next(_RUNS)}"
+                                   f"{_EXTENSIONS[self.__mode]}")
+        if self.__mode == CPROFILE:
+            self.__profiler.dump_stats(self.__path)
+        else:
+            self.__profiler.dump(self.__path)
+        return False
+
+
+def profile_mode():
+    """Returns the profiling mode selected by UC3M_MONEY_PROFILE, None if off"""
+    value = os.environ.get(PROFILE_ENV, "")
+    if value != _ENV_MODE[0]:
+        mode = value.strip().lower()
+        if mode not in _MODES and mode not in ("", "0"):
+            warnings.warn(f"Ignoring unknown profiling mode '{mode}' in {PROFILE_ENV}",
+                          RuntimeWarning)
+        _ENV_MODE[:] = [value, _MODES.get(mode)]
+    return _ENV_MODE[1]
+
+
+def profiled(function):
+    """Decorator that profiles each run of an operation when UC3M_MONEY_PROFILE
+    is set. Operations called from a profiled one are part of its profile."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        mode = profile_mode()
+        if mode is None or getattr(_ACTIVE, "running", False):
+            return function(*args, **kwargs)
+        _ACTIVE.running = True
+        try:
+            with Profile(function.__name__, mode):
+                return function(*args, **kwargs)
+        finally:
+            _ACTIVE.running = False
+    return wrapper
+
+
+class _StackProfiler:
+    """Deterministic profiler that accumulates the self time of each call stack"""
+
+    def __init__(self):
+        self.__stack = []
+        self.__times = {}
+        self.__last = 0
+
+    def enable(self):
+        """Starts tracing the current thread"""
+        self.__last = time.perf_counter_ns()
+        sys.setprofile(self.__trace)
+
+    def disable(self):
+        """Stops tracing, charging the pending time to the open stack"""
+        sys.setprofile(None)
+        self.__charge()
+
+    def dump(self, path: str):
+        """Writes the stacks in collapsed format"""
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, elapsed in sorted(self.__times.items()):
+                if elapsed >= 1000:
+                    file.write(f"{stack} {elapsed // 1000}\n")
+
+    def __charge(self):
+        now = time.perf_counter_ns()
+        if self.__stack:
+            stack = ";".join(self.__stack)
+            self.__times[stack] = self.__times.get(stack, 0) + now - self.__last
+        self.__last = now
+
+    def __trace(self, frame, event, arg):
+        if event in ("call", "c_call"):
+            self.__charge()
+            if event == "call":
+                code = frame.f_code
+                self.__stack.append(f"{code.co_name} "
+                                    f"({os.path.basename(code.co_filename)}:"
+                                    f"{code.co_firstlineno})")
+            else:
+                self.__stack.append(getattr(arg, "__qualname__", str(arg)))
+        elif event in ("return", "c_return", "c_exception"):
+            self.__charge()
+            if self.__stack:
+                self.__stack.pop()
@@ -0,0 +1,173 @@
+"""MODULE: query. Lazy, composable queries over ledgers and transfer stores
+
+    scan("Transactions.json").where(IBAN=iban).sum("amount")
+    scan("transfers.json").where(transfer_type="URGENT").group_by("to_iban").count()
+
+Nothing is read until a result is asked for, and then records stream through
+the filters one at a time: memory grows with the number of groups, not of
+records. Equality filters are pushed down into the reader: a transfer store
+line that does not contain the encoded value is skipped without decoding it
+(IBAN fields excepted, as a stored IBAN may be spelled with spaces or in
+lower case), and a ledger filtered by IBAN is read through its per-IBAN index.
+Sums are added up in integer cents, as the posting engine does.
+"""
+import os
+from .account_management_exception import AccountManagementException
+from .iban_registry import IBAN_REGISTRY
+from .ledger_index import ledger_index
+from .memory_budget import should_stream
+from . import serialization
+from .segmented_log import read_manifest
+from .snapshot import Snapshot
+
+# Fields compared as canonical IBANs, whatever their spelling in the file
+IBAN_FIELDS = ("IBAN", "from_iban", "to_iban")
+
+
+class Query:
+    """Class describing a query over the records of a file. where() returns a
+    new query, so a partial query can be shared and refined"""
+
+    def __init__(self, filename: str, predicates: tuple = (), equals: tuple = ()):
+        self.__filename = os.path.abspath(filename)
+        self.__predicates = predicates
+        self.__equals = equals
+
+    @property
+    def filename(self):
+        """Path of the scanned file"""
+        return self.__filename
+
+    def where(self, predicate=None, **fields) -> "Query":
+        """
+        Keeps the records matching a predicate and equal to the given fields
+
+        :param predicate: Callable taking a record and returning a bool
+        :param fields: Field values the records must have; IBAN fields are
+        compared in canonical form
+        :return: Query: The refined query
+        """
+        equals = tuple((field, IBAN_REGISTRY.normalize(value)
+                        if field in IBAN_FIELDS and isinstance(value, str) else value)
+                       for field, value in fields.items())
+        predicates = self.__predicates + ((predicate,) if predicate is not None else ())
+        return Query(self.__filename, predicates, self.__equals + equals)
+
+    def group_by(self, key) -> "GroupedQuery":
+        """Groups the records by a field name or by a callable taking a record"""
+        return GroupedQuery(self, key)
+
+    def __iter__(self):
+        for record in self.__read():
+            if self.__matches(record):
+                yield record
+
+    def count(self) -> int:
+        """Returns the number of matching records"""
+        return sum(1 for _ in self)
+
+    def sum(self, field: str) -> float:
+        """
+        Adds up a numeric field of the matching records, such as the signed
+        "amount" strings of a ledger, in integer cents
+
+        :raises AccountManagementException: If a value is not a number
+        """
+        return sum(_cents(record, field) for record in self) / 100
+
+    def __matches(self, record) -> bool:
+        if not isinstance(record, dict):
+            return False
+        for field, value in self.__equals:
+            found = record.get(field)
+            if field in IBAN_FIELDS and isinstance(found, str):
+                found = IBAN_REGISTRY.normalize(found)
+            if found != value:
+                return False
+        return all(predicate(record) for predicate in self.__predicates)
+
+    def __read(self):
+        """Yields the records of the file, skipping the ones the pushed down
+        filters rule out"""
+        if self.__is_ledger():
+            yield from self.__read_ledger()
+            return
+        # Only plain ASCII strings are spelled the same by every encoder, and
+        # IBANs are compared in canonical form once decoded
+        needles = ['"' + value + '"' for field, value in self.__equals
+                   if field not in IBAN_FIELDS and isinstance(value, str) and value.isascii()
+                   and serialization.dumps(value) == '"' + value + '"']
+        try:
+            snapshot = Snapshot(self.__filename)
+        except FileNotFoundError as exc:
+            raise AccountManagementException(f"File '{self.__filename}' not found") from exc
+        with snapshot:
+            for line in snapshot.lines():
+                if line.strip() and all(needle in line for needle in needles):
+                    yield serialization.loads(line)
+
+    def __read_ledger(self):
+        ibans = {value for field, value in self.__equals if field == "IBAN"}
+        try:
+            if len(ibans) == 1 and not should_stream(self.__filename):
+                yield from ledger_index(self.__filename).get_transactions(ibans.pop())
+                return
+            with open(self.__filename, "r", encoding="utf-8") as file:
+                yield from serialization.iter_array_file(file)
+        except FileNotFoundError as exc:
+            raise AccountManagementException(f"File '{self.__filename}' not found") from exc
+        except serialization.JSONDecodeError as exc:
+            raise AccountManagementException(f"Invalid JSON format in "
+                                             f"'{self.__filename}'") from exc
+
+    def __is_ledger(self) -> bool:
+        """Tells a ledger (a JSON array) from a JSONL transfer store"""
+        try:
+            with open(self.__filename, "r", encoding="utf-8") as file:
+                return file.read(64).lstrip().startswith("[")
+        except FileNotFoundError:
+            if read_manifest(self.__filename)["archives"]:
+                return False  # A segmented store right after a roll
+            raise AccountManagementException(f"File '{self.__filename}' "
+                                             f"not found") from None
+
+
+class GroupedQuery:
+    """Class aggregating the records of a query per group"""
+
+    def __init__(self, query: Query, key):
+        self.__query = query
+        self.__key = key if callable(key) else lambda record: record.get(key)
+
+    def count(self) -> dict:
+        """Returns the number of matching records per group"""
+        counts = {}
+        for record in self.__query:
+            group = self.__key(record)
+            counts[group] = counts.get(group, 0) + 1
+        return counts
+
+    def sum(self, field: str) -> dict:
+        """Returns the sum of a numeric field per group"""
+        totals = {}
+        for record in self.__query:
+            group = self.__key(record)
+            totals[group] = totals.get(group, 0) + _cents(record, field)
+        return {group: cents / 100 for group, cents in totals.items()}
+
+
+def scan(filename: str = "Transactions.json") -> Query:
+    """Starts a query over a ledger (a JSON array) or a transfer store (JSON lines)"""
+    return Query(filename)
+
+
+def _cents(record: dict, field: str) -> int:
+    """Returns a field as integer cents, the ledger storing amounts as strings"""
+    value = record.get(field)
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        return round(float(value) * 100)
+    except (TypeError, ValueError) as exc:
+        raise AccountManagementException(f"Invalid {field} field in record: "
+                                         f"{record}") from exc
@@ -0,0 +1,172 @@
+"""MODULE: request_processor. Streaming processor of JSONL transfer request feeds
+
+Every input line is a JSON object with the TransferRequest.transfer_request
+arguments (from_iban, to_iban, concept, transfer_type, date, amount). Each one
+produces an output line with its transfer code or its error:
+
+    python -m uc3m_money.request_processor feed.jsonl results.jsonl --resume
+
+Memory stays bounded by the batch size plus the duplicate index of the
+transfers file. After every batch the input and output offsets are saved to
+<output>.offset, so an interrupted feed restarts after the last saved batch.
+The codes of a batch are saved there too before it reaches the store: a
+resumed batch reports the transfers it saved before the interruption with
+their codes, not as duplicates.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+from .account_management_exception import AccountManagementException
+from . import serialization
+from .transfer_request import TransferRequest
+from .transfer_store import TransferStore
+from .transfer_validator import REQUEST_FIELDS, check_transfer, error_message
+from .write_ahead_log import atomic_write
+
+
+class RequestProcessor:
+    """Class that validates and stores the transfer requests of a JSONL feed"""
+
+    def __init__(self, transfers_file: str = "transfers.json", batch_size: int = 1000,
+                 wal=None):
+        self.__store = TransferStore(transfers_file, wal, keep_records=False)
+        self.__batch_size = batch_size
+        self.__today = None
+        # Line number -> code of the transfers of an interrupted batch
+        self.__interrupted = {}
+        # Offsets saved after the last batch written
+        self.__offsets = None
+
+    @staticmethod
+    def offset_file(output_file: str) -> str:
+        """Returns the file where the resume offsets of an output are saved"""
+        return output_file + ".offset"
+
+    def process_line(self, line: bytes) -> dict:
+        """
+        Validates and stores one request
+
+        :param line (bytes): The JSON encoded request
+        :return: dict: {"transfer_code": ...} or {"error": ..., "codes": {...}}
+        """
+        try:
+            request = serialization.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError:
+            return {"error": "Request is not in JSON format"}
+        arguments = [request.get(field) for field in REQUEST_FIELDS]
+        # Invalid requests are rejected without building a TransferRequest
+        errors = check_transfer(*arguments, today=self.__today)
+        if errors:
+            return {"error": error_message(errors), "codes": errors}
+        try:
+            transfer_data = TransferRequest.checked(request).to_json()
+            self.__store.add(transfer_data)
+        except AccountManagementException as e:
+            return {"error": e.message}
+        return {"transfer_code": transfer_data["transfer_code"]}
+
+    def process(self, input_file: str, output_file: str, resume: bool = False) -> dict:
+        """
+        Processes a feed, "-" reads it from stdin
+
+        :param input_file (str): The JSONL feed of requests
+        :param output_file (str): The JSONL file receiving one result per request
+        :param resume (bool): Continue after the offsets saved by an interrupted run
+        :return: dict: Number of lines processed, accepted and rejected, and the
+        input offset reached
+        """
+        offsets = {"input": 0, "output": 0, "line": 0}
+        if resume:
+            try:
+                with open(self.offset_file(output_file), "r", encoding="utf-8") as file:
+                    offsets = serialization.load(file)
+            except FileNotFoundError:
+                pass
+        self.__interrupted = {int(line): code
+                              for line, code in offsets.pop("batch", {}).items()}
+        summary = {"processed": 0, "accepted": 0, "rejected": 0}
+        if input_file == "-":
+            source = sys.stdin.buffer
+            self.__skip(source, offsets["input"])
+        else:
+            source = open(input_file, "rb")  # pylint: disable=consider-using-with
+            source.seek(offsets["input"])
+        # Offsets read so far; the saved ones only move once a batch is written
+        self.__offsets, reached = offsets, dict(offsets)
+        try:
+            with open(output_file, "a+b") as output:
+                # Drops results written after the last saved batch
+                output.truncate(offsets["output"])
+                batch = []
+                for line in source:
+                    reached["input"] += len(line)
+                    reached["line"] += 1
+                    if not line.strip():
+                        continue
+                    batch.append((reached["line"], line))
+                    if len(batch) >= self.__batch_size:
+                        self.__process_batch(batch, output, reached, output_file, summary)
+                        batch = []
+                self.__process_batch(batch, output, reached, output_file, summary)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        summary["offset"] = offsets["input"]
+        return summary
+
+    @staticmethod
+    def __skip(source, size):
+        """Discards the first bytes of a stream that cannot seek"""
+        while size > 0:
+            chunk = source.read(min(size, 1 << 20))
+            if not chunk:
+                break
+            size -= len(chunk)
+
+    def __process_batch(self, batch, output, reached, output_file, summary):
+        """Saves the codes of a batch with the resume offsets, then writes the
+        store, the results and the new offsets"""
+        offsets = self.__offsets
+        self.__today = datetime.now(timezone.utc).date()
+        results = []
+        for line_number, line in batch:
+            result = self.process_line(line)
+            code = self.__interrupted.get(line_number)
+            if code is not None and result.get("error") == "Duplicate transfer detected":
+                # Saved by this batch before the run was interrupted
+                result = {"transfer_code": code}
+            summary["rejected" if "error" in result else "accepted"] += 1
+            results.append({"line": line_number, **result})
+        summary["processed"] += len(batch)
+        codes = {str(result["line"]): result["transfer_code"] for result in results
+                 if "transfer_code" in result}
+        if codes:
+            atomic_write(self.offset_file(output_file),
+                         serialization.dumps(dict(offsets, batch=codes)))
+        self.__store.flush()
+        output.write(serialization.dumps_lines(results).encode())
+        output.flush()
+        os.fsync(output.fileno())
+        offsets.update(input=reached["input"], line=reached["line"], output=output.tell())
+        atomic_write(self.offset_file(output_file), serialization.dumps(offsets))
+
+
+def main(argv=None):
+    """Processes a feed from the command line and prints the summary"""
+    parser = argparse.ArgumentParser(description="Process a JSONL feed of transfer requests")
+    parser.add_argument("input", help="JSONL feed, - for stdin")
+    parser.add_argument("output", help="JSONL file receiving the results")
+    parser.add_argument("--transfers", default="transfers.json")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--resume", action="store_true",
+                        help="continue after the offsets saved by an interrupted run")
+    args = parser.parse_args(argv)
+    processor = RequestProcessor(args.transfers, args.batch_size)
+    print(serialization.dumps(processor.process(args.input, args.output, args.resume)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""MODULE: segmented_log. Rolling JSONL stores with compressed archived segments
+
+The file itself (transfers.json, test_balances.json) is the active segment:
+appends and the indexes keep working on it alone. When it grows past
+max_bytes, or has been open for max_age seconds, it is sealed: renamed to
+<file>.rolling, compressed to <stem>.<number><suffix>.gz (or .xz) and
+recorded in the manifest <file>.segments. Archives never change again.
+
+Readers that go through iter_lines() stream the archives in order and then
+the active segment, decompressing one line at a time. The duplicate checks,
+TransferStore and the lookups of transfer_index read the archives too, but
+an archived transfer can no longer be deleted: those deletions are refused.
+"""
+import gzip
+import lzma
+import os
+import shutil
+import threading
+import time
+from . import serialization
+from .write_ahead_log import atomic_write
+
+# Compression name -> (file suffix, opener)
+COMPRESSIONS = {"gzip": (".gz", gzip.open), "xz": (".xz", lzma.open)}
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def open_segment(path: str, binary: bool = False):
+    """Opens a plain or compressed segment for reading text, or bytes"""
+    for suffix, opener in COMPRESSIONS.values():
+        if path.endswith(suffix):
+            return opener(path, "rb") if binary else opener(path, "rt", encoding="utf-8")
+    if binary:
+        return open(path, "rb")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_manifest(filename: str) -> dict:
+    """Returns the manifest of a store, an empty one if it was never rolled"""
+    try:
+        with open(filename + ".segments", "r", encoding="utf-8") as file:
+            return serialization.load(file)
+    except FileNotFoundError:
+        return {"next": 1, "opened": None, "archives": []}
+
+
+def archived_segments(filename: str) -> list:
+    """Returns the paths of the archived segments of a store, oldest first"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    return [os.path.join(directory, archive["name"])
+            for archive in read_manifest(filename)["archives"]]
+
+
+def iter_lines(filename: str):
+    """
+    Yields the lines of a store across its archived segments and the active one
+
+    :raises FileNotFoundError: If the store has neither segment
+    """
+    archives = archived_segments(filename)
+    for path in archives:
+        with open_segment(path) as file:
+            yield from file
+    try:
+        with open(filename, "r", encoding="utf-8") as file:
+            yield from file
+    except FileNotFoundError:
+        # Right after a roll the active segment may not exist yet
+        if not archives:
+            raise
+
+
+def archived_records(filename: str):
+    """Yields the decoded records of the archived segments of a store, oldest first"""
+    for path in archived_segments(filename):
+        with open_segment(path) as file:
+            for line in file:
+                if line.strip():
+                    yield serialization.loads(line)
+
+
+def iter_records(filename: str):
+    """Yields the decoded records of a store across all of its segments; a
+    store that does not exist has none"""
+    try:
+        for line in iter_lines(filename):
+            if line.strip():
+                yield serialization.loads(line)
+    except FileNotFoundError:
+        pass
+
+
+class SegmentedLog:
+    """Class that appends to the active segment of a JSONL store and rolls it
+    over into a compressed archive by size or age"""
+
+    def __init__(self, filename: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = None, compression: str = "gzip", clock=time.time):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', "
+                             f"use one of {sorted(COMPRESSIONS)}")
+        self.__filename = os.path.abspath(filename)
+        self.__max_bytes = max_bytes
+        self.__max_age = max_age
+        self.__compression = compression
+        self.__clock = clock
+        self.__lock = threading.RLock()
+        self.__manifest = read_manifest(self.__filename)
+        self.__recover()
+
+    @property
+    def filename(self):
+        """Path of the active segment"""
+        return self.__filename
+
+    @property
+    def manifest_file(self):
+        """Path of the manifest listing the archived segments"""
+        return self.__filename + ".segments"
+
+    def segments(self) -> list:
+        """Returns the archived segments, oldest first, and the active one"""
+        return archived_segments(self.__filename) + [self.__filename]
+
+    def append(self, record: dict):
+        """Appends a record to the active segment and rolls it over when due"""
+        self.append_lines([record])
+
+    def append_lines(self, records: list):
+        """Appends records to the active segment with one write and rolls it over
+        when due"""
+        with self.__lock:
+            with open(self.__filename, "a", encoding="utf-8") as file:
+                file.write(serialization.dumps_lines(records))
+            self.maybe_roll()
+
+    def due(self) -> bool:
+        """Tells if the active segment has reached its size or age limit"""
+        with self.__lock:
+            try:
+                size = os.path.getsize(self.__filename)
+            except FileNotFoundError:
+                return False
+            if not size:
+                return False
+            if self.__max_age is not None and self.__manifest["opened"] is None:
+                # First look at this segment: its age counts from now
+                self.__manifest["opened"] = self.__clock()
+                self.__save_manifest()
+            return size >= self.__max_bytes or (
+                self.__max_age is not None
+                and self.__clock() - self.__manifest["opened"] >= self.__max_age)
+
+    def maybe_roll(self):
+        """
+        Rolls the active segment over if it is due
+
+        :return: str: The path of the new archive, None if nothing was rolled
+        """
+        with self.__lock:
+            return self.roll() if self.due() else None
+
+    def roll(self):
+        """
+        Seals the active segment into a compressed archive and starts an empty one
+
+        :return: str: The path of the new archive, None if the active segment is empty
+        """
+        with self.__lock:
+            if not os.path.exists(self.__filename) or not os.path.getsize(self.__filename):
+                return None
+            # The rename is atomic: the next append already starts a new segment
+            os.replace(self.__filename, self.__rolling_file())
+            return self.__archive()
+
+    def __archive(self):
+        """Compresses <file>.rolling into the next archive and records it"""
+        manifest = self.__manifest
+        suffix, opener = COMPRESSIONS[self.__compression]
+        stem, extension = os.path.splitext(os.path.basename(self.__filename))
+        name = f"{stem}.{manifest['next']:06d}{extension}{suffix}"
+        path = os.path.join(os.path.dirname(self.__filename), name)
+        with open(self.__rolling_file(), "rb") as source, \
+                open(path + ".tmp", "wb") as raw, opener(raw, "wb") as target:
+            shutil.copyfileobj(source, target)
+            source.seek(0)
+            lines = sum(1 for line in source if line.strip())
+            target.close()
+            # Durable before the manifest lists it and the rolled file is removed
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(path + ".tmp", path)
+        stat = os.stat(self.__rolling_file())
+        manifest["archives"].append({"name": name, "lines": lines, "bytes": stat.st_size,
+                                     "inode": stat.st_ino})
+        manifest["next"] += 1
+        manifest["opened"] = self.__clock()
+        self.__save_manifest()
+        os.remove(self.__rolling_file())
+        return path
+
+    def __recover(self):
+        """Finishes a roll interrupted after the active segment was renamed"""
+        try:
+            inode = os.stat(self.__rolling_file()).st_ino
+        except FileNotFoundError:
+            return
+        archives = self.__manifest["archives"]
+        if archives and archives[-1]["inode"] == inode:
+            # Archived and recorded already, only the removal was missed
+            os.remove(self.__rolling_file())
+        else:
+            self.__archive()
+
+    def __rolling_file(self):
+        return self.__filename + ".rolling"
+
+    def __save_manifest(self):
+        atomic_write(self.manifest_file, serialization.dumps(self.__manifest))
@@ -0,0 +1,217 @@
+"""MODULE: serialization. JSON encode/decode layer used by every uc3m_money store
+
+Decoding goes through the fastest backend available: orjson when it is
+installed, the standard library otherwise. The UC3M_MONEY_JSON_BACKEND
+environment variable ("json" or "orjson") or set_backend() force one; an
+unknown or missing backend in the variable is reported once with a warning and
+the standard library is used.
+
+Encoding always uses prebuilt standard library encoders: orjson cannot emit
+the ", " and ": " separators, the ASCII escapes or the float spelling of the
+files already on disk, and the stores must stay byte-compatible with them.
+
+Both backends decode the same documents to the same values. NaN, Infinity and
+numbers too large for a float are rejected, as orjson does, and are never
+encoded either; an integer beyond 64 bits, which orjson would turn into a
+float, is decoded by the standard library instead.
+"""
+import json
+import math
+import os
+import re
+import warnings
+
+try:
+    from orjson import loads as _orjson_loads
+except ImportError:  # pragma: no cover - optional dependency
+    _orjson_loads = None
+
+JSON_BACKEND_ENV = "UC3M_MONEY_JSON_BACKEND"
+# Re-exported so callers do not depend on the backend for error handling;
+# orjson.JSONDecodeError is a subclass of it
+JSONDecodeError = json.JSONDecodeError
+
+
+
+def _reject_constant(name: str):
+    raise JSONDecodeError(f"{name} is not a valid number", name, 0)
+
+
+def _finite_float(text: str) -> float:
+    value = float(text)
+    if not math.isfinite(value):
+        raise JSONDecodeError("Number too large for a float", text, 0)
+    return value
+
+
+_ENCODER = json.JSONEncoder(allow_nan=False)
+_DECODER = json.JSONDecoder(parse_constant=_reject_constant, parse_float=_finite_float)
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_PRETTY_ENCODER = json.JSONEncoder(indent=4, allow_nan=False)
+_BACKENDS = ("json", "orjson")
+# An integer of 19 digits or more may not fit in 64 bits; strings merely
+# containing one only cost a slower decode
+_LONG_INTEGER = re.compile(r"(?:^|[\[:,])\s*-?\d{19}")
+_LONG_INTEGER_BYTES = re.compile(_LONG_INTEGER.pattern.encode())
+
+
+def _json_loads(data):
+    if not isinstance(data, str):
+        data = bytes(data).decode("utf-8")
+    return _DECODER.decode(data)
+
+
+def _guarded_orjson_loads(data):
+    pattern = _LONG_INTEGER if isinstance(data, str) else _LONG_INTEGER_BYTES
+    if pattern.search(data):
+        return _json_loads(data)
+    return _orjson_loads(data)
+
+
+_loads = _json_loads
+
+
+def available_backends() -> list:
+    """Returns the decoding backends that can be selected"""
+    return [name for name in _BACKENDS if name == "json" or _orjson_loads is not None]
+
+
+def backend() -> str:
+    """Returns the name of the decoding backend in use"""
+    return "orjson" if _loads is _guarded_orjson_loads else "json"
+
+
+def set_backend(name: str):
+    """
+    Selects the decoding backend
+
+    :param name (str): "json" or "orjson"
+    :raises ValueError: If the backend is unknown or not installed
+    """
+    global _loads  # pylint: disable=global-statement
+    if name not in available_backends():
+        raise ValueError(f"JSON backend '{name}' is not available")
+    _loads = _guarded_orjson_loads if name == "orjson" else _json_loads
+
+
+def loads(data):
+    """Decodes a JSON document given as str or bytes"""
+    return _loads(data)
+
+
+def load(file):
+    """Decodes the JSON document of an open file"""
+    return _loads(file.read())
+
+
+def dumps(obj) -> str:
+    """Encodes an object exactly as json.dumps(obj) does, refusing NaN and
+    infinities with ValueError"""
+    return _ENCODER.encode(obj)
+
+
+def dumps_pretty(obj) -> str:
+    """Encodes an object exactly as json.dumps(obj, indent=4) does, refusing
+    NaN and infinities with ValueError"""
+    return _PRETTY_ENCODER.encode(obj)
+
+
+def dumps_lines(records) -> str:
+    """Encodes records as JSON lines, one json.dumps(record) per line"""
+    encode = _ENCODER.encode
+    return "".join([encode(record) + "\n" for record in records])
+
+
+def iter_array(text: str):
+    """
+    Walks the items of a top-level JSON array without building the whole list
+
+    :param text (str): The JSON document
+    :return: generator: (start, end, item) per item, start and end being the
+    character positions of the item in the text
+    :raises JSONDecodeError: If the document is not a JSON array
+    """
+    decode = _DECODER.raw_decode
+    position = _skip_whitespace(text, 0)
+    if not text.startswith("[", position):
+        raise JSONDecodeError("Expecting '['", text, position)
+    position = _skip_whitespace(text, position + 1)
+    if text.startswith("]", position):
+        return
+    while True:
+        item, end = decode(text, position)
+        yield position, end, item
+        position = _skip_whitespace(text, end)
+        if text.startswith("]", position):
+            return
+        if not text.startswith(",", position):
+            raise JSONDecodeError("Expecting ',' delimiter", text, position)
+        position = _skip_whitespace(text, position + 1)
+
+
+def iter_array_file(file, chunk_size: int = 65536):
+    """
+    Walks the items of a top-level JSON array read from a text file, holding
+    only the item being decoded and one chunk of the file in memory
+
+    :param file: The open text file
+    :param chunk_size (int): Number of characters read at a time
+    :return: generator: The items, in order
+    :raises JSONDecodeError: If the document is not a JSON array
+    """
+    decode = _DECODER.raw_decode
+    buffer, position, state, done = "", 0, "[", False
+    while True:
+        position = _skip_whitespace(buffer, position)
+        # An item ending with the buffer (a number) may continue in the next chunk
+        if position == len(buffer) or (state in ("first", "item") and not done and
+                                       buffer.find(",", position) < 0 and
+                                       buffer.find("]", position) < 0):
+            if done:
+                raise JSONDecodeError("Expecting ']'", buffer, position)
+            chunk = file.read(chunk_size)
+            done = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        if state == "[":
+            if not buffer.startswith("[", position):
+                raise JSONDecodeError("Expecting '['", buffer, position)
+            position, state = position + 1, "first"
+        elif state in ("first", ",") and buffer.startswith("]", position):
+            return
+        elif state == ",":
+            if not buffer.startswith(",", position):
+                raise JSONDecodeError("Expecting ',' delimiter", buffer, position)
+            position, state = position + 1, "item"
+        else:
+            try:
+                item, end = decode(buffer, position)
+            except JSONDecodeError:
+                if done:
+                    raise
+                chunk = file.read(chunk_size)
+                done = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            yield item
+            position, state = end, ","
+
+
+def _skip_whitespace(text: str, position: int) -> int:
+    """Returns the position of the next non-whitespace character"""
+    return _WHITESPACE.match(text, position).end()
+
+
+def _environment_backend() -> str:
+    """Returns the backend chosen by UC3M_MONEY_JSON_BACKEND, the fastest one
+    available if it is not set, and "json" if it is not available"""
+    default = "orjson" if _orjson_loads is not None else "json"
+    name = os.environ.get(JSON_BACKEND_ENV, default)
+    if name not in available_backends():
+        warnings.warn(f"Ignoring unavailable JSON backend '{name}' in {JSON_BACKEND_ENV}",
+                      RuntimeWarning)
+        return "json"
+    return name
+
+
+set_backend(_environment_backend())
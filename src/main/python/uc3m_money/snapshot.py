@@ -0,0 +1,104 @@
+"""MODULE: snapshot. Consistent reads of a store while a single writer goes on
+
+Every rewrite of a store (delete_from_json, the write-ahead log, the index,
+a segment roll) replaces the file with os.replace, so each rewrite is a new
+generation of the file and an open handle keeps the generation it was opened
+on. Appends only add bytes after the end. A snapshot opens the store and
+notes its size: reading that many bytes from that handle gives the store
+exactly as it was, whatever the writer does next, without blocking it.
+"""
+import os
+from . import serialization
+from .segmented_log import open_segment, read_manifest
+
+# Times the segments are listed again when a roll happens while opening
+_OPEN_ATTEMPTS = 10
+
+
+class Snapshot:
+    """Class holding a consistent view of a JSONL store, archived segments
+    included, for as long as it is open"""
+
+    def __init__(self, filename: str = "transfers.json"):
+        self.__filename = os.path.abspath(filename)
+        self.__archives = []
+        self.__handles = []
+        self.__open()
+
+    @property
+    def filename(self):
+        """Path of the store"""
+        return self.__filename
+
+    @property
+    def size(self):
+        """Bytes of the active segment (and of a segment being rolled) in the view"""
+        return sum(size for _, size in self.__handles)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Releases the files held by the snapshot"""
+        for handle, _ in self.__handles:
+            handle.close()
+        self.__handles = []
+
+    def lines(self):
+        """Yields the complete lines of the view, as text"""
+        for path in self.__archives:
+            with open_segment(path) as file:
+                yield from file
+        for handle, size in self.__handles:
+            handle.seek(0)
+            remaining = size
+            for line in handle:
+                if remaining < len(line) or not line.endswith(b"\n"):
+                    break  # An append in progress when the snapshot was taken
+                remaining -= len(line)
+                yield line.decode("utf-8")
+
+    def records(self):
+        """Yields the decoded records of the view"""
+        for line in self.lines():
+            if line.strip():
+                yield serialization.loads(line)
+
+    def __open(self):
+        """Opens the active segment, and one being rolled, under an unchanged
+        manifest so that no line is missed or seen twice"""
+        directory = os.path.dirname(self.__filename)
+        for _ in range(_OPEN_ATTEMPTS):
+            before = read_manifest(self.__filename)
+            active = self.__open_handle(self.__filename)
+            # Opened second: if a roll renamed the active segment after it was
+            # opened, both are the same file
+            rolling = self.__open_handle(self.__filename + ".rolling")
+            seen = {archive["inode"] for archive in before["archives"]}
+            if active is not None:
+                seen.add(os.fstat(active[0].fileno()).st_ino)
+            if rolling is not None and os.fstat(rolling[0].fileno()).st_ino in seen:
+                rolling[0].close()
+                rolling = None
+            handles = [handle for handle in (rolling, active) if handle is not None]
+            if read_manifest(self.__filename) == before:
+                if not handles and not before["archives"]:
+                    raise FileNotFoundError(f"No such store: '{self.__filename}'")
+                self.__archives = [os.path.join(directory, archive["name"])
+                                   for archive in before["archives"]]
+                self.__handles = handles
+                return
+            for handle, _ in handles:
+                handle.close()
+        raise OSError(f"The segments of '{self.__filename}' kept changing")
+
+    @staticmethod
+    def __open_handle(path):
+        try:
+            handle = open(path, "rb")  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            return None
+        return handle, os.fstat(handle.fileno()).st_size
@@ -0,0 +1,393 @@
+"""MODULE: transfer_index. Persisted transfer_code -> record offset index over a
+transfers file (one JSON transfer per line, as written by TransferRequest), with
+a secondary index ordered by transfer_date and transfer_type"""
+import bisect
+import os
+import threading
+from .account_management_exception import AccountManagementException
+from . import serialization
+from .segmented_log import archived_records
+from .validation_rules import DATE_PATTERN
+from .write_ahead_log import DELETE, atomic_write
+
+
+def date_key(date):
+    """
+    Returns the sortable YYYY-MM-DD form of a DD/MM/YYYY transfer date
+
+    :param date (str): The date in DD/MM/YYYY format
+    :return: str: The key, or None if the date is not well formed
+    """
+    match = DATE_PATTERN.match(date) if isinstance(date, str) else None
+    if match is None:
+        return None
+    day, month, year = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+class TransferIndex:
+    """Class that maps the transfer_code of every transfer in a transfers file to
+    the byte offset and length of its line.
+
+    Every transfer is also listed as [date key, transfer_type, code], kept sorted,
+    so date ranges are answered by reading only the matching lines.
+
+    The index is saved next to the file as a journal of added and removed
+    entries, <file>.idx, and a small head, <file>.idx.head, so a refresh only
+    appends the new entries. Transfers appended since the last refresh are
+    indexed by reading only the new tail of the file; any other change (a
+    rewrite by delete_from_json, a truncation) rebuilds it. A transfer cut out
+    by delete_by_code is recorded as a cut, and the offsets after it are
+    shifted when they are read instead of one by one.
+
+    Only the active segment of a SegmentedLog store is indexed: lookups that
+    miss it, and date ranges, also stream its archives."""
+
+    def __init__(self, filename: str = "transfers.json"):
+        self.__filename = os.path.abspath(filename)
+        self.__lock = threading.RLock()
+        self.__state = self.__empty_state()
+        # Journal entries not saved yet, and whether the saved journal is stale
+        self.__journal = []
+        self.__rewrite = False
+
+    @property
+    def filename(self):
+        """Path of the indexed transfers file"""
+        return self.__filename
+
+    @property
+    def index_file(self):
+        """Path of the persisted index"""
+        return self.__filename + ".idx"
+
+    def __len__(self):
+        self.refresh()
+        return len(self.__state["codes"])
+
+    def get_by_code(self, transfer_code: str):
+        """
+        Reads the transfer with the given code, seeking directly to its line
+
+        :param transfer_code (str): The MD5 code returned by transfer_request
+        :return: dict: The transfer, or None if there is none with that code
+        """
+        with self.__lock:
+            self.refresh()
+            position = self.__state["codes"].get(transfer_code)
+            if position is not None:
+                return self.__read(position)
+        return self.__archived(transfer_code)
+
+    def delete_by_code(self, transfer_code: str, wal=None) -> dict:
+        """
+        Removes the transfer with the given code from the file
+
+        :param transfer_code (str): The MD5 code returned by transfer_request
+        :param wal (WriteAheadLog): Optional log the deletion goes through
+        :return: dict: The deleted transfer
+        :raises AccountManagementException: If there is no transfer with that code,
+        or it is in an archived segment
+        """
+        with self.__lock:
+            self.refresh()
+            position = self.__state["codes"].get(transfer_code)
+            if position is None:
+                if self.__archived(transfer_code) is not None:
+                    raise AccountManagementException("Archived transfers cannot be deleted")
+                raise AccountManagementException("No matching transfer found to delete.")
+            transfer = self.__read(position)
+            if wal is not None:
+                # The log rewrites the file, the next refresh rebuilds the index
+                wal.commit(wal.log(DELETE, self.__filename, {"transfer_code": transfer_code}))
+                return transfer
+            # The line is cut out by copying bytes, no other transfer is decoded
+            with open(self.__filename, "rb") as file:
+                head = file.read(self.__actual(position[0]))
+                # Whatever its terminator, "\n" or "\r\n"
+                removed = len(file.readline())
+                tail = file.read()
+            atomic_write(self.__filename, (head + tail).decode("utf-8"))
+            self.__remove(transfer, position[0], removed, head)
+            return transfer
+
+    def scan(self, start_date: str = None, end_date: str = None,
+             transfer_type: str = None) -> list:
+        """
+        Reads the transfers dated within a range, seeking directly to each of them
+
+        :param start_date (str): First date included, DD/MM/YYYY, None for no bound
+        :param end_date (str): Last date included, DD/MM/YYYY, None for no bound
+        :param transfer_type (str): Only transfers of this type, None for all
+        :return: list: The transfers, by date and then in file order, archived
+        segments first
+        :raises AccountManagementException: If a bound is not a valid date
+        """
+        bounds = []
+        for date in (start_date, end_date):
+            key = None if date is None else date_key(date)
+            if date is not None and key is None:
+                raise AccountManagementException("Invalid date format")
+            bounds.append(key)
+        if transfer_type is not None:
+            transfer_type = transfer_type.upper()
+        with self.__lock:
+            self.refresh()
+            dates, codes = self.__state["dates"], self.__state["codes"]
+            low = 0 if bounds[0] is None else bisect.bisect_left(dates, [bounds[0]])
+            # "~" sorts after every transfer type, so the whole end date is included
+            high = len(dates) if bounds[1] is None else bisect.bisect_right(dates,
+                                                                            [bounds[1], "~"])
+            selected = sorted((key, codes[code][0], codes[code][1])
+                              for key, kind, code in dates[low:high]
+                              if transfer_type is None or kind == transfer_type)
+            transfers = self.__read_all(selected)
+        archived = [transfer for transfer in archived_records(self.__filename)
+                    if self.__in_range(transfer, bounds, transfer_type)]
+        if not archived:
+            return transfers
+        # Stable, so transfers of the same date stay in file order
+        return sorted(archived + transfers,
+                      key=lambda transfer: date_key(transfer["transfer_date"]))
+
+    def refresh(self):
+        """Brings the index up to date with the transfers file"""
+        with self.__lock:
+            stat = self.__stat()
+            if stat is None:
+                self.__state = self.__empty_state()
+                return
+            state = self.__state
+            if state["fingerprint"] is None:
+                state = self.__load() or state
+            self.__state = state
+            if state["fingerprint"] == list(stat):
+                return
+            _, inode, size = stat
+            if (state["fingerprint"] is not None and state["fingerprint"][1] == inode
+                    and size >= state["size"] and self.__anchor_holds()):
+                self.__index_tail(state["size"])
+            else:
+                self.__state = self.__empty_state()
+                self.__journal = []
+                self.__rewrite = True
+                self.__index_tail(0)
+            self.__state["fingerprint"] = list(self.__stat())
+            self.__save()
+
+    @staticmethod
+    def __empty_state():
+        # Offsets are kept as they were before the cuts: [offset, bytes removed
+        # up to that cut included], so an offset is shifted by the cuts before it
+        return {"fingerprint": None, "size": 0, "last": None, "codes": {}, "dates": [],
+                "cuts": [], "journal_size": 0, "removed": 0}
+
+    def __stat(self):
+        try:
+            stat = os.stat(self.__filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def __actual(self, offset: int) -> int:
+        """Offset in the file of an indexed offset, after the cuts before it"""
+        cuts = self.__state["cuts"]
+        index = bisect.bisect_left(cuts, [offset])
+        return offset - cuts[index - 1][1] if index else offset
+
+    def __archived(self, transfer_code):
+        """Finds a transfer in the archived segments, None if it is not there"""
+        for transfer in archived_records(self.__filename):
+            if transfer.get("transfer_code") == transfer_code:
+                return transfer
+        return None
+
+    @staticmethod
+    def __in_range(transfer, bounds, transfer_type) -> bool:
+        key = date_key(transfer.get("transfer_date"))
+        if key is None or not isinstance(transfer.get("transfer_code"), str):
+            return False
+        if transfer_type is not None and str(transfer.get("transfer_type")) != transfer_type:
+            return False
+        return (bounds[0] is None or key >= bounds[0]) and (bounds[1] is None or key <= bounds[1])
+
+    def __read(self, position) -> dict:
+        start, length = position
+        with open(self.__filename, "rb") as file:
+            file.seek(self.__actual(start))
+            return serialization.loads(file.read(length))
+
+    def __read_all(self, selected) -> list:
+        """Reads the lines at the given [key, offset, length] entries, in order"""
+        if not selected:
+            return []
+        with open(self.__filename, "rb") as file:
+            transfers = []
+            for _, start, length in selected:
+                file.seek(self.__actual(start))
+                transfers.append(serialization.loads(file.read(length)))
+        return transfers
+
+    def __anchor_holds(self) -> bool:
+        """Checks that the last indexed line is still where it was, so the file
+        has only grown by appends since the index was built"""
+        state = self.__state
+        if state["last"] is None:
+            return state["size"] == 0
+        code, position = state["last"]
+        try:
+            return self.__read(position).get("transfer_code") == code
+        except (ValueError, AttributeError):
+            return False
+
+    def __index_tail(self, start: int):
+        """Indexes every complete line from a byte offset to the end of the file"""
+        state = self.__state
+        # Lines after every cut are shifted by all of them
+        shift = state["cuts"][-1][1] if state["cuts"] else 0
+        offset = start
+        dates = []
+        with open(self.__filename, "rb") as file:
+            file.seek(start)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # A line still being written is indexed on the next refresh
+                content = line.rstrip(b"\r\n")
+                if content.strip():
+                    try:
+                        transfer = serialization.loads(content)
+                    except serialization.JSONDecodeError as exc:
+                        raise AccountManagementException(f"Invalid JSON format in "
+                                                         f"'{self.__filename}'") from exc
+                    position = [offset + shift, len(content)]
+                    code = transfer.get("transfer_code")
+                    state["codes"][code] = position
+                    state["last"] = [code, position]
+                    key = date_key(transfer.get("transfer_date"))
+                    kind = str(transfer.get("transfer_type"))
+                    if key is not None and isinstance(code, str):
+                        dates.append([key, kind, code])
+                    self.__journal.append(["+", code, position[0], position[1], key, kind])
+                offset += len(line)
+        if dates:
+            # Sorted once; the sort merges the new run into the sorted entries
+            dates.sort()
+            state["dates"].extend(dates)
+            state["dates"].sort()
+        state["size"] = offset
+
+    def __remove(self, transfer, start, removed, head):
+        """Drops a line cut out of the file, recording the cut for the offsets
+        after it"""
+        state = self.__state
+        code = transfer.get("transfer_code")
+        del state["codes"][code]
+        key = date_key(transfer.get("transfer_date"))
+        if key is not None:
+            entry = [key, str(transfer.get("transfer_type")), code]
+            index = bisect.bisect_left(state["dates"], entry)
+            if index < len(state["dates"]) and state["dates"][index] == entry:
+                del state["dates"][index]
+        cuts = state["cuts"]
+        index = bisect.bisect_left(cuts, [start])
+        cuts.insert(index, [start, (cuts[index - 1][1] if index else 0) + removed])
+        for cut in cuts[index + 1:]:
+            cut[1] += removed
+        state["size"] -= removed
+        state["removed"] += 1
+        if state["last"] is not None and state["last"][0] == code:
+            state["last"] = self.__last_before(head)
+        self.__journal.append(["-", code])
+        state["fingerprint"] = list(self.__stat())
+        self.__save()
+
+    def __last_before(self, head: bytes):
+        """Anchor on the last line before a cut, None to rebuild on the next refresh"""
+        content = head.rstrip()
+        try:
+            code = serialization.loads(content[content.rfind(b"\n") + 1:])["transfer_code"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        position = self.__state["codes"].get(code)
+        return None if position is None else [code, position]
+
+    def __load(self):
+        """Reads the head and replays the journal it covers"""
+        try:
+            with open(self.index_file + ".head", "r", encoding="utf-8") as file:
+                head = serialization.load(file)
+            state = {key: head[key] for key in _HEAD_KEYS}
+            with open(self.index_file, "rb") as file:
+                journal = file.read(state["journal_size"])
+            if len(journal) != state["journal_size"]:
+                return None
+            codes, entries = {}, {}
+            for line in journal.splitlines():
+                entry = serialization.loads(line)
+                if entry[0] == "+":
+                    codes[entry[1]] = [entry[2], entry[3]]
+                    entries[entry[1]] = entry[4:6]
+                else:
+                    del codes[entry[1]]
+                    del entries[entry[1]]
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return None
+        state["codes"] = codes
+        state["dates"] = sorted([key, kind, code] for code, (key, kind) in entries.items()
+                                if key is not None and isinstance(code, str))
+        if state["last"] is not None:
+            # Shares the position of its code, as when it was indexed
+            state["last"][1] = codes.get(state["last"][0], state["last"][1])
+        return state
+
+    def __save(self):
+        """Appends the journal of the last changes and saves the head; the
+        journal is written again from scratch when stale or mostly removals"""
+        state = self.__state
+        try:
+            if self.__rewrite or state["removed"] > len(state["codes"]):
+                self.__compact()
+                atomic_write(self.index_file, serialization.dumps_lines(self.__journal))
+                state["journal_size"] = os.path.getsize(self.index_file)
+            elif self.__journal:
+                with open(self.index_file, "ab") as file:
+                    # Drops entries written after the head was last saved
+                    file.truncate(state["journal_size"])
+                    file.write(serialization.dumps_lines(self.__journal).encode("utf-8"))
+                    state["journal_size"] = file.tell()
+            atomic_write(self.index_file + ".head", serialization.dumps(
+                {key: state[key] for key in _HEAD_KEYS}))
+            self.__rewrite = False
+        except OSError:
+            # A read-only directory only costs a rebuild in the next process
+            self.__rewrite = True
+        self.__journal = []
+
+    def __compact(self):
+        """Applies the cuts to the offsets and lists every entry in the journal"""
+        state = self.__state
+        kinds = {code: (key, kind) for key, kind, code in state["dates"]}
+        for position in state["codes"].values():
+            position[0] = self.__actual(position[0])
+        state["cuts"] = []
+        state["removed"] = 0
+        if state["last"] is not None:
+            state["last"] = [state["last"][0], state["codes"].get(state["last"][0])]
+        self.__journal = [["+", code, position[0], position[1], *kinds.get(code, (None, None))]
+                          for code, position in state["codes"].items()]
+
+
+# Persisted in <file>.idx.head; the entries are replayed from the journal
+_HEAD_KEYS = ("fingerprint", "size", "last", "cuts", "journal_size", "removed")
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def transfer_index(filename: str = "transfers.json") -> TransferIndex:
+    """Returns the process-wide code index of a transfers file"""
+    filename = os.path.abspath(filename)
+    with _INDEXES_LOCK:
+        if filename not in _INDEXES:
+            _INDEXES[filename] = TransferIndex(filename)
+        return _INDEXES[filename]
@@ -1,9 +1,19 @@
 """MODULE: transfer_request. Contains the transfer request class"""
 import hashlib
-import json
+import os
 from datetime import datetime, timezone
 from .account_management_exception import AccountManagementException
 from .account_manager import AccountManager
+from .bloom_filter import duplicate_filter
+from .iban_registry import IBAN_REGISTRY
+from .memory_budget import memory_tracked, should_stream
+from . import serialization
+from .profiling import profiled
+from .segmented_log import archived_records, iter_lines
+from . import transfer_validator
+from .transfer_index import transfer_index
+from .transfer_store import DUPLICATE_KEYS
+from .write_ahead_log import APPEND, DELETE, atomic_write
 
 
 class TransferRequest:
@@ -15,38 +25,42 @@ class TransferRequest:
                  transfer_concept: str,
                  transfer_date: str,
                  transfer_amount: float):
-        # Validate all inputs during initialization
-        if not AccountManager.validate_iban(from_iban):
-            raise AccountManagementException("Invalid sender IBAN")
-        if not AccountManager.validate_iban(to_iban):
-            raise AccountManagementException("Invalid recipient IBAN")
-        if transfer_type.upper() not in ["ORDINARY", "URGENT", "IMMEDIATE"]:
-            raise AccountManagementException("Invalid transfer type")
-        if not isinstance(transfer_concept, str):
-            raise AccountManagementException("Concept must be a string")
-        if not (10 <= len(transfer_concept) <= 30 and len(transfer_concept.split()) >= 2 and
-                TransferRequest._validate_concept_words(transfer_concept)):
-            raise AccountManagementException("Concept must be 10-30 chars with at least 2 words")
-        if not TransferRequest.validate_date(transfer_date):
-            raise AccountManagementException("Invalid transfer date")
-        if not isinstance(transfer_amount, (int, float)):
-            raise AccountManagementException("Amount must be a number")
-        if not 10.00 <= float(transfer_amount) <= 10000.00:
-            raise AccountManagementException("Amount must be between 10.00 and 10000.00")
-        if isinstance(transfer_amount, float) and not round(transfer_amount, 2) == transfer_amount:
-            raise AccountManagementException("Amount must have exactly 2 decimal places")
-
-        self.__from_iban = from_iban
-        self.__to_iban = to_iban
-        self.__transfer_type = transfer_type.upper()
-        self.__transfer_concept = transfer_concept  # Fixed attribute name
-        self.__transfer_date = transfer_date
-        self.__transfer_amount = float (transfer_amount)
+        # Validate all inputs during initialization, with the same rules used
+        # by the non-raising transfer_validator.check_transfer
+        errors = transfer_validator.check_transfer(from_iban, to_iban, transfer_concept,
+                                                   transfer_type, transfer_date,
+                                                   transfer_amount)
+        if errors:
+            raise AccountManagementException(transfer_validator.error_message(errors))
+        self.__assign({"from_iban": from_iban, "to_iban": to_iban,
+                       "transfer_type": transfer_type, "concept": transfer_concept,
+                       "date": transfer_date, "amount": transfer_amount})
+
+    @classmethod
+    def checked(cls, request: dict):
+        """
+        Builds a transfer request from arguments that already passed
+        transfer_validator.check_transfer, without validating them again
+
+        :param request (dict): The arguments named as in transfer_validator.REQUEST_FIELDS
+        """
+        transfer = cls.__new__(cls)
+        transfer.__assign(request)
+        return transfer
+
+    def __assign(self, request: dict):
+        # Canonical IBANs are interned, so repeated accounts share one string
+        self.__from_iban = IBAN_REGISTRY.normalize(request["from_iban"])
+        self.__to_iban = IBAN_REGISTRY.normalize(request["to_iban"])
+        self.__transfer_type = request["transfer_type"].upper()
+        self.__transfer_concept = request["concept"]  # Fixed attribute name
+        self.__transfer_date = request["date"]
+        self.__transfer_amount = float (request["amount"])
         justnow = datetime.now(timezone.utc)
         self.__time_stamp = datetime.timestamp(justnow)
 
     def __str__(self):
-        return "Transfer:" + json.dumps(self.__dict__)
+        return "Transfer:" + serialization.dumps(self.__dict__)
 
     def to_json(self):
         """returns the object information in json format"""
@@ -61,73 +75,166 @@ class TransferRequest:
             "transfer_code": self.transfer_code
         }
 
-    def save_to_json(self, filename: str = "transfers.json"):
-        """Saves transfer data to JSON file after checking for duplicates."""
+    @memory_tracked
+    def save_to_json(self, filename: str = "transfers.json", wal=None, postings=None,
+                     chain=None, segments=None):
+        """Saves transfer data to JSON file after checking for duplicates.
+        With a WriteAheadLog the append is logged and committed first.
+        With a PostingEngine the transfer is posted to the account table before it
+        is appended, checking the funds of the sender if the engine has an overdraft
+        limit, and the posting is reversed if the append fails.
+        With a HashChain the appended line is chained to the previous ones.
+        With a SegmentedLog the file is rolled over into an archive when due, and
+        the duplicate check also reads the archived segments; a HashChain given
+        too carries on into the new segment."""
         try:
             transfer_data = self.to_json()
 
-            # Read existing transfers
-            existing_transfers = []
+            # Check for duplicates (ignore timestamp/code), one line at a time. The
+            # Bloom filter skips the scan for the transfers that are surely new
+            duplicates = duplicate_filter(filename)
+            if duplicates.might_contain(transfer_data):
+                try:
+                    for line in iter_lines(filename):
+                        if not line.strip():
+                            continue
+                        transfer = serialization.loads(line)
+                        if all(transfer[key] == transfer_data[key]
+                               for key in DUPLICATE_KEYS):
+                            raise AccountManagementException("Duplicate transfer detected")
+                except FileNotFoundError:
+                    pass  # File doesn't exist yet (first transfer)
+                duplicates.record_false_positive()
+
+            # Posted first: the O(1) funds check and the debit happen under the lock
+            # of the engine, so a concurrent transfer cannot spend the same money
+            if postings is not None:
+                postings.post_transfer(transfer_data)
+
+            # Append new transfer, reversing the posting if it cannot be saved
             try:
-                with open(filename, "r", encoding="utf-8") as file:
-                    existing_transfers = [json.loads(line) for line in file if line.strip()]
-            except FileNotFoundError:
-                pass  # File doesn't exist yet (first transfer)
-
-            # Check for duplicates (ignore timestamp/code)
-            duplicate_keys = ["from_iban", "to_iban", "transfer_type",
-                            "transfer_amount", "transfer_concept", "transfer_date"]
-            for transfer in existing_transfers:
-                if all(transfer[key] == transfer_data[key] for key in duplicate_keys):
-                    raise AccountManagementException("Duplicate transfer detected")
-
-            # Append new transfer
-            with open(filename, "a", encoding="utf-8") as file:
-                json.dump(transfer_data, file)
-                file.write("\n")
+                if wal is not None:
+                    wal.commit(wal.log(APPEND, filename, transfer_data))
+                else:
+                    with open(filename, "a", encoding="utf-8") as file:
+                        file.write(serialization.dumps(transfer_data) + "\n")
+            except Exception:
+                if postings is not None:
+                    postings.reverse_transfer(transfer_data)
+                raise
+            if chain is not None:
+                chain.update()
+            if segments is not None and segments.due():
+                # The filter takes in the last lines before they are archived
+                duplicates.refresh()
+                archive = segments.roll()
+                duplicates.rolled()
+                if chain is not None and archive is not None:
+                    chain.rolled(archive)
         except AccountManagementException as e:
             raise e # Re-raise duplicate transfer exception directly
         except Exception as e:
             raise AccountManagementException(f"Failed to save transfer: "
                                              f"{str(e)}") from e
 
-    def delete_from_json(self, filename: str = "transfers.json"):
-        """Deletes transfer data from JSON file."""
+    @memory_tracked
+    def delete_from_json(self, filename: str = "transfers.json", wal=None, chain=None,
+                         postings=None):
+        """Deletes transfer data from JSON file.
+        With a WriteAheadLog the deletion is logged and the file replaced atomically.
+        With a HashChain the chain is rebuilt over the rewritten file.
+        With a PostingEngine every deleted transfer is reversed in the account table."""
         try:
-            # Generate the data dictionary of this transfer using the same keys
-            transfer_data = self.to_json()
-
-            # Read existing transfers
-            updated_transfers = []
-            found = False
-            try:
-                with open(filename, "r", encoding="utf-8") as file:
-                    existing_transfers = [json.loads(line) for line in file if line.strip()]
-
-                    # Iterate over existing transfers to filter out the one to delete
-                    for transfer in existing_transfers:
-                        if all(transfer[key] == transfer_data[key] for key in transfer_data if
-                               key != "time_stamp" and key != "transfer_code"):
-                            found = True
-                            continue
-                        updated_transfers.append(transfer)
+            deleted = self.__delete(filename, wal)
+            if chain is not None:
+                chain.rebuild()
+            if postings is not None:
+                for transfer in deleted:
+                    postings.reverse_transfer(transfer)
+        except AccountManagementException as e:
+            raise e  # Re-raise any custom exceptions
+        except Exception as e:
+            raise AccountManagementException(f"Failed to delete transfer: {str(e)}") from e
 
-            except FileNotFoundError:
-                raise AccountManagementException("File not found. No transfer to delete.")
+    def __delete(self, filename: str, wal) -> list:
+        """Removes the transfer from the file, through the log if there is one,
+        and returns the removed records"""
+        # Generate the data dictionary of this transfer using the same keys
+        transfer_data = self.to_json()
 
+        fields = {key: value for key, value in transfer_data.items()
+                  if key not in ("time_stamp", "transfer_code")}
+        # Over the memory budget the kept lines are spilled to a temporary file
+        temporary = filename + ".tmp" if wal is None and should_stream(filename) else None
+        try:
+            found, updated_transfers = self.__split(filename, fields, temporary)
             if not found:
+                self.__refuse_archived(filename, fields)
                 raise AccountManagementException("No matching transfer found to delete.")
+            if wal is not None:
+                wal.commit(wal.log(DELETE, filename, fields))
+            elif temporary is not None:
+                os.replace(temporary, filename)
+            else:
+                # Replace the file with the updated list, excluding the deleted transfer.
+                # Snapshots taken before keep reading the previous generation
+                atomic_write(filename, serialization.dumps_lines(updated_transfers))
+            return found
+        finally:
+            if temporary is not None and os.path.exists(temporary):
+                os.remove(temporary)
+
+    @staticmethod
+    def __split(filename: str, fields: dict, temporary: str = None):
+        """Reads the transfers one line at a time, setting apart the ones
+        matching the fields. The kept ones are returned, or written to the
+        temporary file when there is one.
+
+        :return: tuple: (matching transfers, kept transfers)
+        """
+        found, kept = [], []
+        try:
+            with open(filename, "r", encoding="utf-8") as file:
+                if temporary is None:
+                    found = TransferRequest.__matching(file, fields, kept.append)
+                    return found, kept
+                with open(temporary, "w", encoding="utf-8") as target:
+                    found = TransferRequest.__matching(
+                        file, fields, lambda transfer: target.write(
+                            serialization.dumps(transfer) + "\n"))
+                    target.flush()
+                    os.fsync(target.fileno())
+                return found, kept
+        except FileNotFoundError as exc:
+            TransferRequest.__refuse_archived(filename, fields)
+            raise AccountManagementException("File not found. No transfer to delete.") from exc
 
-            # Write the updated list back to the file, excluding the deleted transfer
-            with open(filename, "w", encoding="utf-8") as file:
-                for transfer in updated_transfers:
-                    json.dump(transfer, file)
-                    file.write("\n")
+    @staticmethod
+    def __matching(lines, fields: dict, keep) -> list:
+        """Returns the transfers of some JSON lines matching the fields, and
+        passes every other transfer to keep"""
+        found = []
+        for line in lines:
+            if not line.strip():
+                continue
+            transfer = serialization.loads(line)
+            if TransferRequest.__matches(transfer, fields):
+                found.append(transfer)
+            else:
+                keep(transfer)
+        return found
 
-        except AccountManagementException as e:
-            raise e  # Re-raise any custom exceptions
-        except Exception as e:
-            raise AccountManagementException(f"Failed to delete transfer: {str(e)}") from e
+    @staticmethod
+    def __matches(transfer: dict, fields: dict) -> bool:
+        return all(transfer[key] == value for key, value in fields.items())
+
+    @staticmethod
+    def __refuse_archived(filename: str, fields: dict):
+        """Raises if the transfer to delete is in an archived segment, which never
+        changes again"""
+        for transfer in archived_records(filename):
+            if TransferRequest.__matches(transfer, fields):
+                raise AccountManagementException("Archived transfers cannot be deleted")
 
     @property
     def from_iban(self):
@@ -138,7 +245,7 @@ class TransferRequest:
     def from_iban(self, value):
         if not AccountManager.validate_iban(value):
             raise AccountManagementException("Invalid sender IBAN")
-        self.__from_iban = value
+        self.__from_iban = IBAN_REGISTRY.normalize(value)
 
     @property
     def to_iban(self):
@@ -149,7 +256,7 @@ class TransferRequest:
     def to_iban(self, value):
         if not AccountManager.validate_iban(value):
             raise AccountManagementException("Invalid recipient IBAN")
-        self.__to_iban = value
+        self.__to_iban = IBAN_REGISTRY.normalize(value)
 
     @property
     def transfer_type(self):
@@ -158,7 +265,7 @@ class TransferRequest:
 
     @transfer_type.setter
     def transfer_type(self, value):
-        if value.upper() not in ["ORDINARY", "URGENT", "IMMEDIATE"]:
+        if transfer_validator.type_error(value) is not None:
             raise AccountManagementException("Invalid transfer type")
         self.__transfer_type = value.upper()
 
@@ -169,12 +276,10 @@ class TransferRequest:
 
     @transfer_amount.setter
     def transfer_amount(self, value):
-        if not isinstance(value, (int, float)):
-            raise AccountManagementException("Amount must be a number")
-        if not 10.00 <= float(value) <= 10000.00:
-            raise AccountManagementException("Amount must be between 10.00 and 10000.00")
-        if isinstance(value, float) and not round(value, 2) == value:
-            raise AccountManagementException("Amount must have exactly 2 decimal places")
+        error = transfer_validator.amount_error(value)
+        if error is not None:
+            raise AccountManagementException(
+                transfer_validator.ERROR_MESSAGES[("transfer_amount", error)])
         self.__transfer_amount = float(value)
     @property
     def transfer_concept(self):
@@ -183,8 +288,7 @@ class TransferRequest:
 
     @transfer_concept.setter
     def transfer_concept(self, value):
-        if not (10 <= len(value) <= 30 and len(value.split()) >= 2
-                and TransferRequest._validate_concept_words(value)):
+        if transfer_validator.concept_error(value) is not None:
             raise AccountManagementException("Concept must be 10-30 chars letters with at "
                                              "least 2 words")
         self.__transfer_concept = value
@@ -219,36 +323,20 @@ class TransferRequest:
     @staticmethod
     def validate_concept(concept: str) -> bool:
         """Returns bool regarding if the concept is in the given standards"""
-        if not isinstance(concept, str):
-            return False
-        return (10 <= len(concept) <= 30 and len(concept.split()) >= 2
-                and TransferRequest._validate_concept_words(concept))
+        return transfer_validator.concept_error(concept) is None
 
     @staticmethod
     def validate_date(date: str) -> bool:
         """Returns bool regarding if the date is in the given standards"""
-        try:
-            # Attempt to parse the date using the expected format
-            datetime.strptime(date, "%d/%m/%Y")
-        except ValueError as exc:
+        error = transfer_validator.date_error(date)
+        if error in (transfer_validator.BAD_FORMAT, transfer_validator.NOT_STRING):
             # Raise a custom exception on format error
-            raise AccountManagementException("Invalid date format") from exc
-
-            # If date format is correct, further validate the date values
-        day, month, year = map(int, date.split("/"))
-        if not 2025 <= year <= 2050:
-            return False
-        if not 1 <= month <= 12:
-            return False
-        if not 1 <= day <= 31:
-            return False
-
-        input_date = datetime.strptime(date, "%d/%m/%Y").replace(tzinfo=timezone.utc)
-        current_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0,
-                                                          microsecond=0)
-        return input_date >= current_date
+            raise AccountManagementException("Invalid date format")
+        return error is None
 
     @staticmethod
+    @profiled
+    @memory_tracked
     def transfer_request(from_iban: str, to_iban: str, concept: str, transfer_type: str,
                          date: str, amount: float) -> str:
         """Static method to create and save a transfer request"""
@@ -262,3 +350,29 @@ class TransferRequest:
         )
         transfer.save_to_json()
         return transfer.transfer_code
+
+    @staticmethod
+    def get_by_code(transfer_code: str, filename: str = "transfers.json"):
+        """Returns the saved transfer with the given code, or None, through the
+        persisted code index of the transfers file"""
+        return transfer_index(filename).get_by_code(transfer_code)
+
+    @staticmethod
+    def delete_by_code(transfer_code: str, filename: str = "transfers.json", wal=None,
+                       chain=None, postings=None) -> dict:
+        """Deletes the saved transfer with the given code and returns it.
+        With a HashChain the chain is rebuilt over the rewritten file, and with a
+        PostingEngine the transfer is reversed in the account table"""
+        transfer = transfer_index(filename).delete_by_code(transfer_code, wal)
+        if chain is not None:
+            chain.rebuild()
+        if postings is not None:
+            postings.reverse_transfer(transfer)
+        return transfer
+
+    @staticmethod
+    def transfers_between(start_date: str = None, end_date: str = None,
+                          transfer_type: str = None, filename: str = "transfers.json") -> list:
+        """Returns the saved transfers dated between two DD/MM/YYYY dates, both
+        included, optionally of one type, through the date index of the file"""
+        return transfer_index(filename).scan(start_date, end_date, transfer_type)
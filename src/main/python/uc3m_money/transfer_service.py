@@ -0,0 +1,289 @@
+"""MODULE: transfer_service. Long-running local transfer service
+
+Keeps one warm TransferStore in memory and serves transfer requests from many
+client processes over localhost HTTP:
+
+    python -m uc3m_money.transfer_service --port 8087 --file transfers.json
+
+POST /transfers with the TransferRequest.transfer_request arguments as a JSON
+object returns {"transfer_code": ...}; GET /stats returns the queue metrics.
+
+Requests wait in one lane per transfer_type, served by their --shares, so
+IMMEDIATE transfers are not stuck behind an ORDINARY backlog.
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .account_management_exception import AccountManagementException
+from .lane_scheduler import LaneScheduler, parse_shares
+from .transfer_request import TransferRequest
+from .transfer_store import TransferStore
+from .transfer_validator import REQUEST_FIELDS
+from .write_ahead_log import WriteAheadLog
+
+
+class TransferService:
+    """Class that validates and stores transfer requests taken from bounded lanes,
+    one per transfer type, writing the accepted ones to the transfers file in batches"""
+
+    def __init__(self, filename: str = "transfers.json", max_queue: int = 1000,
+                 batch_size: int = 100, wal=None, shares: dict = None):
+        self.__store = TransferStore(filename, wal)
+        # max_queue bounds each lane, so a full ORDINARY lane never blocks IMMEDIATE
+        self.__lanes = LaneScheduler(shares, max_queue)
+        self.__batch_size = batch_size
+        self.__worker = None
+        self.__stats_lock = threading.Lock()
+        self.__stats = {"accepted": 0, "rejected": 0, "batches": 0,
+                        "total_latency": 0.0, "max_latency": 0.0}
+
+    @property
+    def store(self):
+        """The in-memory transfer store"""
+        return self.__store
+
+    def start(self):
+        """Starts the worker thread that drains the queue"""
+        if self.__worker is None:
+            self.__worker = threading.Thread(target=self.__run, name="transfer-service",
+                                             daemon=True)
+            self.__worker.start()
+
+    def stop(self):
+        """Processes every queued request, flushes the store and stops the worker"""
+        if self.__worker is not None:
+            self.__lanes.close()
+            self.__worker.join()
+            self.__worker = None
+            self.__lanes.reopen()
+
+    def submit(self, request: dict, timeout: float = None) -> Future:
+        """
+        Queues a transfer request in the lane of its transfer_type
+
+        :param request (dict): The transfer_request arguments, keyed by REQUEST_FIELDS
+        :param timeout (float): Seconds to wait for room in the lane, None to fail at once
+        :return: Future: Resolves to the transfer code, or to the rejection exception
+        :raises AccountManagementException: If the lane is full
+        """
+        future = Future()
+        try:
+            self.__lanes.put(request.get("transfer_type"),
+                             (request, future, time.perf_counter()),
+                             block=timeout is not None, timeout=timeout)
+        except queue.Full as e:
+            raise AccountManagementException("Transfer queue is full") from e
+        return future
+
+    def transfer_request(self, from_iban: str, to_iban: str, concept: str,
+                         transfer_type: str, date: str, amount: float) -> str:
+        """Same as TransferRequest.transfer_request, served by the warm store"""
+        request = dict(zip(REQUEST_FIELDS,
+                           (from_iban, to_iban, concept, transfer_type, date, amount)))
+        return self.submit(request, timeout=30).result()
+
+    def stats(self) -> dict:
+        """Returns the queue depth, counters and latency of the service, and the
+        depth and queue time of each lane"""
+        with self.__stats_lock:
+            stats = dict(self.__stats)
+        processed = stats["accepted"] + stats["rejected"]
+        return {"queue_depth": self.__lanes.depth(),
+                "max_queue": self.__lanes.max_queue,
+                "lanes": self.__lanes.stats(),
+                "stored_transfers": len(self.__store),
+                "accepted": stats["accepted"],
+                "rejected": stats["rejected"],
+                "batches": stats["batches"],
+                "avg_latency_ms": (stats["total_latency"] / processed * 1000
+                                   if processed else 0.0),
+                "max_latency_ms": stats["max_latency"] * 1000}
+
+    def __run(self):
+        """Worker loop: takes a batch of requests, validates them and writes them at once"""
+        lanes = self.__lanes
+        while True:
+            batch = lanes.get_batch(self.__batch_size)
+            if batch is None:
+                return
+            self.__process(batch)
+
+    def __process(self, batch):
+        """Validates a batch, writes the accepted transfers and resolves the futures"""
+        results = []
+        for request, future, queued_at in batch:
+            if not future.set_running_or_notify_cancel():
+                # The client gave up waiting, so the transfer must not be saved
+                continue
+            try:
+                transfer = TransferRequest(
+                    from_iban=request.get("from_iban"),
+                    to_iban=request.get("to_iban"),
+                    transfer_type=request.get("transfer_type"),
+                    transfer_concept=request.get("concept"),
+                    transfer_date=request.get("date"),
+                    transfer_amount=request.get("amount"))
+                transfer_data = transfer.to_json()
+                self.__store.add(transfer_data)
+                results.append((future, queued_at, transfer_data["transfer_code"], None))
+            except AccountManagementException as e:
+                results.append((future, queued_at, None, e))
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                results.append((future, queued_at, None, AccountManagementException(
+                    f"Failed to save transfer: {str(e)}")))
+        flush_error = None
+        try:
+            self.__store.flush()
+        except AccountManagementException as e:
+            flush_error = e
+        if flush_error is not None:
+            # The store forgot the batch, so its requests can be submitted again
+            results = [(future, queued_at, code, error or flush_error)
+                       for future, queued_at, code, error in results]
+        finished_at = time.perf_counter()
+        with self.__stats_lock:
+            self.__stats["batches"] += 1
+            for _, queued_at, _, error in results:
+                latency = finished_at - queued_at
+                self.__stats["total_latency"] += latency
+                self.__stats["max_latency"] = max(self.__stats["max_latency"], latency)
+                self.__stats["rejected" if error else "accepted"] += 1
+        for future, _, code, error in results:
+            if error is None:
+                future.set_result(code)
+            else:
+                future.set_exception(error)
+
+
+class TransferServiceHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a TransferService"""
+    service = None
+    # Seconds a POST waits for its transfer to be written
+    timeout = 30
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """GET /stats"""
+        if self.path != "/stats":
+            self.__reply(404, {"error": "Not found"})
+            return
+        self.__reply(200, self.service.stats())
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """POST /transfers"""
+        if self.path != "/transfers":
+            self.__reply(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError:
+            self.__reply(400, {"error": "Request is not in JSON format"})
+            return
+        try:
+            future = self.service.submit(request)
+            code = future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Leaves the request in its lane, where the worker skips it, so the
+            # client can send it again
+            future.cancel()
+            self.__reply(504, {"error": "Transfer request timed out"})
+            return
+        except AccountManagementException as e:
+            status = 503 if e.message == "Transfer queue is full" else 400
+            self.__reply(status, {"error": e.message})
+            return
+        self.__reply(200, {"transfer_code": code})
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Requests are not logged, the service reports through /stats"""
+
+    def __reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def serve(service: TransferService, host: str = "127.0.0.1",
+          port: int = 8087) -> ThreadingHTTPServer:
+    """Starts the service and returns an HTTP server bound to it, ready for serve_forever"""
+    handler = type("BoundTransferServiceHandler", (TransferServiceHandler,),
+                   {"service": service})
+    service.start()
+    return ThreadingHTTPServer((host, port), handler)
+
+
+class TransferServiceClient:
+    """Class used by client processes to send transfers to a running service"""
+
+    def __init__(self, url: str = "http://127.0.0.1:8087", timeout: float = 30):
+        self.__url = url.rstrip("/")
+        self.__timeout = timeout
+
+    def transfer_request(self, from_iban: str, to_iban: str, concept: str,
+                         transfer_type: str, date: str, amount: float) -> str:
+        """Same as TransferRequest.transfer_request, executed by the service"""
+        request = dict(zip(REQUEST_FIELDS,
+                           (from_iban, to_iban, concept, transfer_type, date, amount)))
+        return self.__call("POST", "/transfers", request)["transfer_code"]
+
+    def stats(self) -> dict:
+        """Returns the queue metrics of the service"""
+        return self.__call("GET", "/stats")
+
+    def __call(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(self.__url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.__timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())["error"]
+            except (ValueError, KeyError):
+                message = str(e)
+            raise AccountManagementException(message) from e
+        except urllib.error.URLError as e:
+            raise AccountManagementException(f"Transfer service unreachable: "
+                                             f"{str(e)}") from e
+
+
+def main(argv=None):
+    """Runs the service until interrupted"""
+    parser = argparse.ArgumentParser(description="Local uc3m_money transfer service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8087)
+    parser.add_argument("--file", default="transfers.json")
+    parser.add_argument("--max-queue", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--wal", help="write-ahead log protecting the transfers file")
+    parser.add_argument("--shares", type=parse_shares, default=None,
+                        help="worker share per lane, e.g. IMMEDIATE=6,URGENT=3,ORDINARY=1")
+    args = parser.parse_args(argv)
+    wal = WriteAheadLog(args.wal) if args.wal else None
+    service = TransferService(args.file, args.max_queue, args.batch_size, wal, args.shares)
+    server = serve(service, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+        if wal is not None:
+            wal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""MODULE: transfer_store. In-memory view of a transfers file with its duplicate index"""
+import threading
+from .account_management_exception import AccountManagementException
+from . import serialization
+from .segmented_log import iter_lines
+from .write_ahead_log import APPEND
+
+# Fields that identify a transfer when looking for duplicates (timestamp and code ignored)
+DUPLICATE_KEYS = ("from_iban", "to_iban", "transfer_type",
+                  "transfer_amount", "transfer_concept", "transfer_date")
+
+
+def duplicate_key(transfer_data: dict) -> tuple:
+    """Returns the tuple of fields used to detect a duplicate transfer"""
+    return tuple(transfer_data[key] for key in DUPLICATE_KEYS)
+
+
+class TransferStore:
+    """Class that keeps the transfers of a file and their duplicate keys in memory,
+    appending new transfers to the file in batches. With a WriteAheadLog, every
+    batch is group-committed to the log before touching the file"""
+
+    def __init__(self, filename: str = "transfers.json", wal=None, keep_records: bool = True):
+        self.__filename = filename
+        self.__wal = wal
+        # Without the records only the duplicate keys are held, for bulk loads
+        self.__keep_records = keep_records
+        self.__lock = threading.Lock()
+        self.__records = []
+        self.__keys = set()
+        self.__pending = []
+        self.load()
+
+    @property
+    def filename(self):
+        """Path of the transfers file"""
+        return self.__filename
+
+    @property
+    def pending_count(self):
+        """Number of accepted transfers not yet written to the file"""
+        return len(self.__pending)
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def load(self):
+        """(Re)reads the transfers file, its archived segments included, dropping
+        any transfer not yet flushed"""
+        records = []
+        keys = set()
+        try:
+            for line in iter_lines(self.__filename):
+                if not line.strip():
+                    continue
+                record = serialization.loads(line)
+                keys.add(duplicate_key(record))
+                if self.__keep_records:
+                    records.append(record)
+        except FileNotFoundError:
+            pass  # File doesn't exist yet (first transfer)
+        except serialization.JSONDecodeError as e:
+            raise AccountManagementException(f"Invalid JSON format in "
+                                             f"'{self.__filename}'") from e
+        with self.__lock:
+            self.__keys = keys
+            self.__records = records
+            self.__pending = []
+
+    def contains(self, transfer_data: dict) -> bool:
+        """Returns True if an equivalent transfer is already stored"""
+        return duplicate_key(transfer_data) in self.__keys
+
+    def add(self, transfer_data: dict):
+        """
+        Accepts a transfer, to be written on the next flush
+
+        :param transfer_data (dict): The transfer in the format of TransferRequest.to_json
+        :raises AccountManagementException: If an equivalent transfer is already stored
+        """
+        key = duplicate_key(transfer_data)
+        with self.__lock:
+            if key in self.__keys:
+                raise AccountManagementException("Duplicate transfer detected")
+            self.__keys.add(key)
+            if self.__keep_records:
+                self.__records.append(transfer_data)
+            self.__pending.append(transfer_data)
+
+    def flush(self) -> int:
+        """
+        Appends every pending transfer to the file with a single write. If the
+        write fails the transfers are forgotten, as if never added, so the
+        callers told of the failure can submit them again
+
+        :return: int: The number of transfers written
+        :raises AccountManagementException: If the transfers could not be written
+        """
+        with self.__lock:
+            pending = self.__pending
+            self.__pending = []
+        if not pending:
+            return 0
+        if self.__wal is not None:
+            seqs = [self.__wal.log(APPEND, self.__filename, record) for record in pending]
+            try:
+                self.__wal.commit(*seqs)
+            except AccountManagementException:
+                # Discarded from the log, nothing of the batch was written
+                self.__forget(pending)
+                raise
+        else:
+            try:
+                with open(self.__filename, "a", encoding="utf-8") as file:
+                    file.write(serialization.dumps_lines(pending))
+            except OSError as e:
+                self.__forget(pending)
+                raise AccountManagementException(f"Failed to save transfer: {str(e)}") from e
+        return len(pending)
+
+    def __forget(self, records):
+        """Drops transfers that failed to be written from the duplicate index"""
+        with self.__lock:
+            self.__keys.difference_update(duplicate_key(record) for record in records)
+            if self.__keep_records:
+                failed = {id(record) for record in records}
+                self.__records = [record for record in self.__records
+                                  if id(record) not in failed]
+
+    def records(self) -> list:
+        """Returns a copy of the stored transfers, pending ones included"""
+        with self.__lock:
+            return list(self.__records)
@@ -0,0 +1,138 @@
+"""MODULE: transfer_validator. Non-raising validation of transfer request fields"""
+import calendar
+from datetime import datetime, timezone
+from .iban_registry import IBAN_REGISTRY
+from .validation_rules import (DATE_PATTERN, TRANSFER_TYPES,
+                               MIN_TRANSFER_AMOUNT, MAX_TRANSFER_AMOUNT,
+                               MIN_CONCEPT_LENGTH, MAX_CONCEPT_LENGTH,
+                               MIN_TRANSFER_YEAR, MAX_TRANSFER_YEAR)
+
+# Error codes returned for a field that does not pass its rule
+NOT_STRING = "NOT_STRING"
+NOT_NUMBER = "NOT_NUMBER"
+INVALID = "INVALID"
+BAD_FORMAT = "BAD_FORMAT"
+OUT_OF_RANGE = "OUT_OF_RANGE"
+BAD_DECIMALS = "BAD_DECIMALS"
+
+# Fields checked for every transfer, in the order the constructor reports them
+TRANSFER_FIELDS = ("from_iban", "to_iban", "transfer_type",
+                   "transfer_concept", "transfer_date", "transfer_amount")
+
+# Arguments of TransferRequest.transfer_request, in the order check_transfer takes them
+REQUEST_FIELDS = ("from_iban", "to_iban", "concept", "transfer_type", "date", "amount")
+
+ERROR_MESSAGES = {
+    ("from_iban", NOT_STRING): "IBAN must be a string",
+    ("from_iban", INVALID): "Invalid sender IBAN",
+    ("to_iban", NOT_STRING): "IBAN must be a string",
+    ("to_iban", INVALID): "Invalid recipient IBAN",
+    ("transfer_type", NOT_STRING): "Invalid transfer type",
+    ("transfer_type", INVALID): "Invalid transfer type",
+    ("transfer_concept", NOT_STRING): "Concept must be a string",
+    ("transfer_concept", INVALID): "Concept must be 10-30 chars with at least 2 words",
+    ("transfer_date", NOT_STRING): "Invalid date format",
+    ("transfer_date", BAD_FORMAT): "Invalid date format",
+    ("transfer_date", INVALID): "Invalid transfer date",
+    ("transfer_amount", NOT_NUMBER): "Amount must be a number",
+    ("transfer_amount", OUT_OF_RANGE): "Amount must be between 10.00 and 10000.00",
+    ("transfer_amount", BAD_DECIMALS): "Amount must have exactly 2 decimal places",
+}
+
+
+def iban_error(iban):
+    """Returns the error code of the IBAN, or None if it is valid"""
+    if not isinstance(iban, str):
+        return NOT_STRING
+    return None if IBAN_REGISTRY.is_valid(iban) else INVALID
+
+
+def type_error(transfer_type):
+    """Returns the error code of the transfer type, or None if it is valid"""
+    if not isinstance(transfer_type, str):
+        return NOT_STRING
+    return None if transfer_type.upper() in TRANSFER_TYPES else INVALID
+
+
+def concept_error(concept):
+    """Returns the error code of the concept, or None if it is valid"""
+    if not isinstance(concept, str):
+        return NOT_STRING
+    words = concept.split()
+    if (MIN_CONCEPT_LENGTH <= len(concept) <= MAX_CONCEPT_LENGTH and len(words) >= 2
+            and all(word.isalpha() for word in words)):
+        return None
+    return INVALID
+
+
+def date_error(date, today=None):
+    """
+    Returns the error code of the transfer date, or None if it is valid
+
+    :param date (str): The date in DD/MM/YYYY format
+    :param today (date): The current UTC date, computed if not given
+    :return: str: BAD_FORMAT if the date cannot be parsed, INVALID if it is
+    outside 2025-2050 or in the past, None if it is valid
+    """
+    if not isinstance(date, str):
+        return NOT_STRING
+    match = DATE_PATTERN.match(date)
+    if match is None:
+        return BAD_FORMAT
+    day, month, year = (int(group) for group in match.groups())
+    if year < 1 or day > calendar.monthrange(year, month)[1]:
+        return BAD_FORMAT
+    if not MIN_TRANSFER_YEAR <= year <= MAX_TRANSFER_YEAR:
+        return INVALID
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+    if (year, month, day) < (today.year, today.month, today.day):
+        return INVALID
+    return None
+
+
+def amount_error(amount):
+    """Returns the error code of the transfer amount, or None if it is valid"""
+    if not isinstance(amount, (int, float)):
+        return NOT_NUMBER
+    if not MIN_TRANSFER_AMOUNT <= float(amount) <= MAX_TRANSFER_AMOUNT:
+        return OUT_OF_RANGE
+    if isinstance(amount, float) and not round(amount, 2) == amount:
+        return BAD_DECIMALS
+    return None
+
+
+def check_transfer(from_iban, to_iban, concept, transfer_type, date, amount,
+                   today=None) -> dict:
+    """
+    Checks the six fields of a transfer request without raising
+
+    :param today (date): The current UTC date, computed if not given
+    :return: dict: Error code of every invalid field, empty if the request is valid
+    """
+    codes = (iban_error(from_iban), iban_error(to_iban), type_error(transfer_type),
+             concept_error(concept), date_error(date, today), amount_error(amount))
+    return {field: code for field, code in zip(TRANSFER_FIELDS, codes) if code is not None}
+
+
+def check_transfers(rows):
+    """
+    Checks many transfer requests given as dicts keyed by the transfer fields.
+    The current date is taken once for the whole batch.
+
+    :param rows (iterable): The candidate requests
+    :return: generator: One dict of error codes per row, empty for valid rows
+    """
+    today = datetime.now(timezone.utc).date()
+    for row in rows:
+        yield check_transfer(row.get("from_iban"), row.get("to_iban"),
+                             row.get("transfer_concept"), row.get("transfer_type"),
+                             row.get("transfer_date"), row.get("transfer_amount"), today)
+
+
+def error_message(errors: dict) -> str:
+    """Returns the message of the first invalid field, as raised by TransferRequest"""
+    for field in TRANSFER_FIELDS:
+        if field in errors:
+            return ERROR_MESSAGES[(field, errors[field])]
+    return ""
@@ -0,0 +1,61 @@
+"""MODULE: validation_rules. Precompiled patterns and lookup tables shared by the validators"""
+import re
+import string
+
+# IBAN: Spanish country code, two check digits and the alphanumeric account
+IBAN_PATTERN = re.compile(r"^ES\d{2}[A-Z0-9]+$")
+
+# Letters of an IBAN are replaced by their numeric value (A=10 ... Z=35)
+IBAN_LETTER_TABLE = str.maketrans({letter: str(ord(letter) - 55)
+                                   for letter in string.ascii_uppercase})
+
+# Deposit amounts: everything but digits and dots is dropped, then two decimals are required
+AMOUNT_STRIP_PATTERN = re.compile(r"[^\d.]")
+# Signed amounts, such as the "-1280.06" of a ledger: a minus before the first digit
+AMOUNT_SIGN_PATTERN = re.compile(r"^\D*-")
+AMOUNT_PATTERN = re.compile(r"^\d+\.\d{2}$")
+MIN_DEPOSIT_AMOUNT = 10
+MAX_DEPOSIT_AMOUNT = 1000
+
+# Transfers
+TRANSFER_TYPES = frozenset(("ORDINARY", "URGENT", "IMMEDIATE"))
+MIN_TRANSFER_AMOUNT = 10.00
+MAX_TRANSFER_AMOUNT = 10000.00
+MIN_CONCEPT_LENGTH = 10
+MAX_CONCEPT_LENGTH = 30
+MIN_TRANSFER_YEAR = 2025
+MAX_TRANSFER_YEAR = 2050
+
+# Same shapes accepted by datetime.strptime(date, "%d/%m/%Y"); \Z, unlike $, does
+# not match before a trailing newline
+DATE_PATTERN = re.compile(r"^(3[01]|[12][0-9]|0[1-9]|[1-9])/(1[0-2]|0[1-9]|[1-9])/([0-9]{4})\Z")
+
+
+def iban_checksum_ok(iban: str) -> bool:
+    """
+    Performs the format and MOD-97 check on an already normalized IBAN
+
+    :param iban (str): The IBAN without spaces and in upper case
+    :return: bool: True if the IBAN has the correct format and is valid, else false
+    """
+    # Below makes sure parameter matches the IBAN format
+    if not IBAN_PATTERN.match(iban):
+        return False
+    # Moves the values at the indexes 0-3 to the back of the IBAN and changes
+    # the LETTERS to their numeric counterpart according to the ASCII relation
+    numeric_iban = (iban[4:] + iban[:4]).translate(IBAN_LETTER_TABLE)
+    # Converts the IBAN to an integer and performs the MOD 97 on it
+    return int(numeric_iban) % 97 == 1
+
+
+def deposit_amount_ok(amount: str) -> bool:
+    """
+    Checks that a deposit amount has two decimal places and is within limits
+
+    :param amount (str): The amount as written in the deposit file
+    :return: bool: True if the amount is valid, otherwise False
+    """
+    amount = AMOUNT_STRIP_PATTERN.sub("", amount)
+    if not AMOUNT_PATTERN.match(amount):
+        return False
+    return MIN_DEPOSIT_AMOUNT <= float(amount) <= MAX_DEPOSIT_AMOUNT
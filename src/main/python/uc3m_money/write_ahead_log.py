@@ -0,0 +1,283 @@
+"""MODULE: write_ahead_log. Write-ahead log with group commit and crash recovery
+for the transfer and deposit stores"""
+import os
+import threading
+from .account_management_exception import AccountManagementException
+from . import serialization
+
+# Operations that can be logged
+APPEND = "append"      # add one JSON line to a JSONL store (transfers.json)
+DELETE = "delete"      # remove the lines matching some fields from a JSONL store
+REPLACE = "replace"    # overwrite a JSON document store (deposits.json)
+
+
+def atomic_write(filename: str, content: str):
+    """Writes a file through a synced temporary file, so readers and crashes
+    only ever see the old or the new content"""
+    temp_name = filename + ".tmp"
+    with open(temp_name, "w", encoding="utf-8") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_name, filename)
+
+
+def read_json_lines(filename: str) -> list:
+    """Reads the records of a JSONL store, ignoring a torn last line"""
+    records = []
+    try:
+        with open(filename, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(serialization.loads(line))
+                except serialization.JSONDecodeError:
+                    if line.endswith("\n"):
+                        raise
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class WriteAheadLog:
+    """Class that logs store writes with sequence numbers before applying them.
+
+    Writes are buffered with log() and made durable together by commit(), which
+    pays one fsync for the whole group and then applies them to the stores
+    without syncing. A checkpoint syncs the stores and empties the log of the
+    writes applied. Opening the log replays, idempotently, every committed write
+    after the last checkpoint, so the stores are consistent again after a crash.
+
+    A group that cannot be written to the log is discarded, and the log cut back
+    to where it was. Once in the log a write is committed: if its store cannot
+    be written it stays in the log, unapplied, and is applied again by the next
+    commit, checkpoint or open."""
+
+    def __init__(self, path: str = "uc3m_money.wal", checkpoint_interval: int = 1000):
+        self.__path = os.path.abspath(path)
+        self.__checkpoint_interval = checkpoint_interval
+        self.__lock = threading.RLock()
+        self.__buffer = []
+        # Durable writes not applied to their stores yet, in sequence order
+        self.__unapplied = []
+        # Set after a failed apply: the next attempt skips what already got applied
+        self.__retrying = False
+        # Writes of other callers dropped by a failed commit, until they commit
+        self.__discarded = set()
+        self.__touched = set()
+        self.__since_checkpoint = 0
+        self.__checkpoint_seq = 0
+        self.__last_seq = 0
+        self.__file = None
+        self.recover()
+
+    @property
+    def last_seq(self):
+        """Sequence number of the last logged write"""
+        return self.__last_seq
+
+    @property
+    def checkpoint_seq(self):
+        """Sequence number of the last write covered by a checkpoint"""
+        return self.__checkpoint_seq
+
+    @property
+    def pending_count(self):
+        """Number of logged writes waiting for the next commit"""
+        return len(self.__buffer)
+
+    @property
+    def unapplied_count(self):
+        """Number of committed writes still to be applied to their stores"""
+        return len(self.__unapplied)
+
+    def log(self, operation: str, filename: str, data) -> int:
+        """
+        Buffers a write for the next group commit
+
+        :param operation (str): APPEND, DELETE or REPLACE
+        :param filename (str): The store the write applies to
+        :param data: The record (APPEND), the fields to match (DELETE) or the
+        whole document (REPLACE)
+        :return: int: The sequence number given to the write
+        """
+        if operation not in (APPEND, DELETE, REPLACE):
+            raise AccountManagementException(f"Unknown log operation {operation}")
+        with self.__lock:
+            self.__last_seq += 1
+            self.__buffer.append({"seq": self.__last_seq, "op": operation,
+                                  "file": os.path.abspath(filename), "data": data})
+            return self.__last_seq
+
+    def commit(self, *seqs) -> int:
+        """
+        Makes every buffered write durable with a single fsync and applies them
+
+        :param seqs (int): Sequence numbers of the caller's own writes, which
+        may have been discarded by the failed commit of another caller
+        :return: int: The number of writes committed
+        :raises AccountManagementException: If the group could not be written to
+        the log (it is discarded) or one of seqs was discarded
+        """
+        with self.__lock:
+            if self.__discarded.intersection(seqs):
+                self.__discarded.difference_update(seqs)
+                raise AccountManagementException("Failed to write log: the write was "
+                                                 "discarded by a failed commit")
+            entries = self.__buffer
+            if not entries and not self.__unapplied:
+                return 0
+            if entries:
+                self.__buffer = []
+                position = self.__file.tell()
+                try:
+                    self.__file.write(serialization.dumps_lines(entries))
+                    self.__file.flush()
+                    os.fsync(self.__file.fileno())
+                except OSError as e:
+                    self.__discard(entries, position, seqs)
+                    raise AccountManagementException(f"Failed to write log: "
+                                                     f"{str(e)}") from e
+                self.__unapplied.extend(entries)
+                self.__since_checkpoint += len(entries)
+            try:
+                self.__apply_unapplied()
+                if self.__since_checkpoint >= self.__checkpoint_interval:
+                    self.checkpoint()
+            except AccountManagementException:
+                pass  # Committed all the same, the next commit tries again
+            return len(entries)
+
+    def checkpoint(self):
+        """Syncs every store written since the last checkpoint and empties the log,
+        keeping only the committed writes that could not be applied yet"""
+        with self.__lock:
+            try:
+                self.__apply_unapplied()
+            except AccountManagementException:
+                pass  # They are kept in the log below
+            unapplied = {entry["file"] for entry in self.__unapplied}
+            for filename in self.__touched - unapplied:
+                try:
+                    with open(filename, "a", encoding="utf-8") as file:
+                        os.fsync(file.fileno())
+                except OSError as e:
+                    raise AccountManagementException(f"Failed to sync "
+                                                     f"'{filename}': {str(e)}") from e
+            if self.__file is not None:
+                self.__file.close()
+            # Buffered and unapplied writes keep their sequence numbers
+            pending = [entry["seq"] for entry in self.__unapplied + self.__buffer]
+            self.__checkpoint_seq = min(pending) - 1 if pending else self.__last_seq
+            atomic_write(self.__path, serialization.dumps_lines(
+                [{"checkpoint": self.__checkpoint_seq}] + self.__unapplied))
+            # The log stays open for appends until the next checkpoint
+            self.__file = open(self.__path, "a",  # pylint: disable=consider-using-with
+                               encoding="utf-8")
+            self.__touched = unapplied
+            self.__since_checkpoint = 0
+
+    def recover(self) -> int:
+        """
+        Replays the committed writes found after the last checkpoint
+
+        :return: int: The number of writes replayed
+        :raises AccountManagementException: If they cannot be applied; they stay
+        in the log for the next attempt
+        """
+        with self.__lock:
+            entries = []
+            for record in read_json_lines(self.__path):
+                if "checkpoint" in record:
+                    self.__checkpoint_seq = record["checkpoint"]
+                elif record["seq"] > self.__checkpoint_seq:
+                    entries.append(record)
+            self.__last_seq = max([self.__checkpoint_seq, self.__last_seq] +
+                                  [entry["seq"] for entry in entries])
+            known = {entry["seq"] for entry in self.__unapplied}
+            self.__unapplied.extend(entry for entry in entries if entry["seq"] not in known)
+            self.__unapplied.sort(key=lambda entry: entry["seq"])
+            self.__apply_unapplied(recovering=True)
+            self.checkpoint()
+            return len(entries)
+
+    def close(self):
+        """
+        Commits the buffered writes and leaves a checkpoint behind
+
+        :raises AccountManagementException: If committed writes could not be
+        applied; the next open applies them
+        """
+        with self.__lock:
+            self.commit()
+            self.checkpoint()
+            self.__file.close()
+            if self.__unapplied:
+                raise AccountManagementException(f"{len(self.__unapplied)} committed writes "
+                                                 f"could not be applied, kept in the log")
+
+    def __discard(self, entries, position, seqs):
+        """Drops a group that failed to reach the log and cuts the log back"""
+        self.__discarded.update(entry["seq"] for entry in entries
+                                if entry["seq"] not in seqs)
+        try:
+            self.__file.close()
+        except OSError:
+            pass  # The text buffer that failed to write is dropped with the file
+        try:
+            os.truncate(self.__path, position)
+        except OSError:
+            pass  # A torn last line is ignored by the recovery
+        self.__file = open(self.__path, "a",  # pylint: disable=consider-using-with
+                           encoding="utf-8")
+
+    def __apply_unapplied(self, recovering: bool = False):
+        """Applies the committed writes, dropping each group once it is applied.
+        A failed group is applied again idempotently, as in a recovery"""
+        entries = self.__unapplied
+        recovering = recovering or self.__retrying
+        while entries:
+            group = [entries[0]]
+            if group[0]["op"] == APPEND:
+                # Consecutive appends to the same store go in one write
+                while (len(group) < len(entries) and entries[len(group)]["op"] == APPEND
+                       and entries[len(group)]["file"] == group[0]["file"]):
+                    group.append(entries[len(group)])
+            try:
+                self.__apply(group, recovering)
+            except (OSError, ValueError) as e:
+                self.__retrying = True
+                raise AccountManagementException(f"Failed to apply log: {str(e)}") from e
+            del entries[:len(group)]
+        self.__retrying = False
+
+    def __apply(self, group, recovering):
+        """Applies one write, or consecutive appends to one store. While
+        recovering, appends already present and deletes already done are skipped"""
+        filename = group[0]["file"]
+        self.__touched.add(filename)
+        if group[0]["op"] == APPEND:
+            self.__apply_append(filename, [entry["data"] for entry in group], recovering)
+        elif group[0]["op"] == DELETE:
+            self.__apply_delete(filename, group[0]["data"])
+        else:
+            atomic_write(filename, serialization.dumps_pretty(group[0]["data"]))
+
+    @staticmethod
+    def __apply_append(filename, records, recovering):
+        if recovering:
+            existing = read_json_lines(filename)
+            # Drops a torn last line left by the crash before appending
+            atomic_write(filename, serialization.dumps_lines(existing))
+            records = [record for record in records if record not in existing]
+        with open(filename, "a", encoding="utf-8") as file:
+            file.write(serialization.dumps_lines(records))
+
+    @staticmethod
+    def __apply_delete(filename, fields):
+        existing = read_json_lines(filename)
+        remaining = [line for line in existing
+                     if not all(line.get(key) == value for key, value in fields.items())]
+        if len(remaining) != len(existing):
+            atomic_write(filename, serialization.dumps_lines(remaining))
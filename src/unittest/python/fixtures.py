@@ -0,0 +1,55 @@
+"""Module with the fixtures shared by the tests that work on files
+
+The test modules import it as "from .fixtures import ..." when they run as the
+src.unittest.python package, as pytest does, and as "from fixtures import ..."
+when the test folder is on the path, as PyBuilder runs them.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from uc3m_money import TransferRequest
+
+FROM_IBAN = "ES9121000418450200051332"
+TO_IBAN = "ES8658342044541216872704"
+
+
+def transfer_request(concept: str = "Payment for services", amount: float = 100.0,
+                     **fields) -> TransferRequest:
+    """
+    Returns a valid transfer request from FROM_IBAN to TO_IBAN
+
+    :param concept (str): The transfer concept
+    :param amount (float): The transfer amount
+    :param fields: Any other TransferRequest field to change, such as transfer_date
+    :return: TransferRequest: The transfer
+    """
+    values = {"from_iban": FROM_IBAN, "to_iban": TO_IBAN, "transfer_type": "ORDINARY",
+              "transfer_concept": concept, "transfer_date": "01/01/2050",
+              "transfer_amount": amount}
+    values.update(fields)
+    return TransferRequest(**values)
+
+
+class FileTestCase(unittest.TestCase):
+    """Class for the tests that work on files in a temporary directory.
+    The tests run inside the directory when CHDIR is set."""
+
+    CHDIR = False
+
+    def setUp(self):
+        """Creates the temporary directory, with a transfers file path in it"""
+        self.directory = tempfile.mkdtemp()
+        self.transfers = self.path("transfers.json")
+        self.current = os.getcwd()
+        if self.CHDIR:
+            os.chdir(self.directory)
+
+    def tearDown(self):
+        """Goes back to the original folder and removes the temporary directory"""
+        os.chdir(self.current)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name: str) -> str:
+        """Returns the path of a file in the temporary directory"""
+        return os.path.join(self.directory, name)
@@ -0,0 +1,66 @@
+"""Module to test the signature cache and batch signing of AccountDeposit"""
+import hashlib
+import json
+import os
+import unittest
+from freezegun import freeze_time
+from uc3m_money import AccountDeposit, AccountManager, AccountManagementException
+try:
+    from .fixtures import FROM_IBAN, FileTestCase
+except ImportError:
+    from fixtures import FROM_IBAN, FileTestCase
+
+
+class TestAccountDepositSignature(unittest.TestCase):
+    """Class to test the deposit signature"""
+
+    @freeze_time("2025-03-24 17:55:00")
+    def test_cached_signature_matches_known_hash(self):
+        """The cached signature is the same as the one produced before caching"""
+        deposit = AccountDeposit("ES9121000418450200051332", "EUR 1000.00")
+        check_signature = "cc5f38885ee9362fc670e795e38bbabceada297a436bc05faf7995ebdbeeac6c"
+        self.assertEqual(deposit.deposit_signature, check_signature)
+        self.assertEqual(deposit.to_json()["deposit_signature"], check_signature)
+
+    def test_setters_invalidate_signature(self):
+        """Changing any signed field produces a new signature"""
+        deposit = AccountDeposit("ES9121000418450200051332", "EUR 1000.00")
+        signatures = {deposit.deposit_signature}
+        deposit.deposit_amount = "EUR 10.00"
+        signatures.add(deposit.deposit_signature)
+        deposit.to_iban = "ES7620770024003102575766"
+        signatures.add(deposit.deposit_signature)
+        deposit.deposit_date = 1742838900.0
+        signatures.add(deposit.deposit_signature)
+        self.assertEqual(len(signatures), 4)
+        expected = hashlib.sha256(("{alg:SHA-256,typ:DEPOSIT,iban:ES7620770024003102575766,"
+                                   "amount:EUR 10.00,deposit_date:1742838900.0}").encode())
+        self.assertEqual(deposit.deposit_signature, expected.hexdigest())
+
+
+class TestDepositBatch(FileTestCase):
+    """Class to test the bulk deposit ingestion"""
+
+    CHDIR = True
+
+    def test_deposit_batch(self):
+        """Bulk ingestion signs every deposit and stores none if a file is invalid"""
+        os.mkdir("json_files")
+        for number, amount in enumerate(("EUR 10.00", "EUR 20.00", "EUR 1.0")):
+            with open(os.path.join("json_files", f"deposit{number}.json"), "w",
+                      encoding="utf-8") as file:
+                json.dump({"IBAN": FROM_IBAN, "AMOUNT": amount}, file)
+        with self.assertRaises(AccountManagementException):
+            AccountManager().deposit_batch(["deposit0.json", "deposit2.json"])
+        self.assertFalse(os.path.exists("deposits.json"))
+        signatures = AccountManager().deposit_batch(["deposit0.json", "deposit1.json"])
+        with open("deposits.json", "r", encoding="utf-8") as file:
+            stored = json.load(file)
+        self.assertEqual(len(set(signatures)), 2)
+        self.assertEqual((stored["deposit_amount"], stored["deposit_signature"]),
+                         ("EUR 20.00", signatures[1]))
+        self.assertEqual(AccountManager().deposit_batch([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Module to test the balance cache"""
+import json
+import os
+import unittest
+from uc3m_money import AccountManager
+from uc3m_money.balance_cache import BALANCE_CACHE, BalanceCache
+try:
+    from .fixtures import FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FileTestCase, transfer_request
+
+IBAN = "ES8658342044541216872704"
+
+
+class FakeClock:
+    """Clock moved by hand"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBalanceCache(FileTestCase):
+    """Class to test the LRU/TTL balance cache"""
+
+    def setUp(self):
+        """Creates a ledger in a temporary directory"""
+        super().setUp()
+        self.ledger = self.path("Transactions.json")
+        self.write_ledger([{"IBAN": IBAN, "amount": "+100.00"}])
+        self.clock = FakeClock()
+        self.cache = BalanceCache(max_entries=2, ttl=10, clock=self.clock)
+
+    def write_ledger(self, transactions):
+        """Writes the transactions to the ledger"""
+        with open(self.ledger, "w", encoding="utf-8") as file:
+            json.dump(transactions, file, indent=4)
+
+    def test_hit_and_ttl(self):
+        """Entries are served until they expire"""
+        self.assertIsNone(self.cache.get(self.ledger, IBAN))
+        self.cache.put(self.ledger, IBAN, 100.0)
+        self.assertEqual(self.cache.get(self.ledger, IBAN), 100.0)
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(self.ledger, IBAN))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (1, 2, 0))
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted beyond the size bound"""
+        self.cache.put(self.ledger, "A", 1.0)
+        self.cache.put(self.ledger, "B", 2.0)
+        self.cache.get(self.ledger, "A")
+        self.cache.put(self.ledger, "C", 3.0)
+        self.assertIsNone(self.cache.get(self.ledger, "B"))
+        self.assertEqual(self.cache.get(self.ledger, "A"), 1.0)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_invalidation(self):
+        """Explicit invalidation and ledger changes drop the entries"""
+        self.cache.put(self.ledger, IBAN, 100.0)
+        self.cache.put(self.ledger, "A", 1.0)
+        self.cache.invalidate(iban="A")
+        self.assertIsNone(self.cache.get(self.ledger, "A"))
+        self.write_ledger([{"IBAN": IBAN, "amount": "+100.00"},
+                           {"IBAN": IBAN, "amount": "-50.00"}])
+        self.assertIsNone(self.cache.get(self.ledger, IBAN))
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+    def test_transfer_writes_keep_balances(self):
+        """Saving and deleting transfers leave the ledger, and so its cached balances"""
+        transfer = transfer_request("Cached payment", 10.0, to_iban=IBAN)
+        BALANCE_CACHE.put(self.ledger, IBAN, 100.0)
+        transfer.save_to_json(self.transfers)
+        transfer.delete_from_json(self.transfers)
+        self.assertEqual(BALANCE_CACHE.get(self.ledger, IBAN), 100.0)
+        BALANCE_CACHE.invalidate(iban=IBAN)
+        self.assertIsNone(BALANCE_CACHE.get(self.ledger, IBAN))
+
+    def test_calculate_balance_uses_cache(self):
+        """calculate_balance serves repeated IBANs from the cache until the ledger changes"""
+        manager = AccountManager(balance_cache=self.cache)
+        # The folder is restored by tearDown
+        os.chdir(self.directory)
+        manager.calculate_balance(IBAN)
+        manager.calculate_balance(IBAN)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.write_ledger([{"IBAN": IBAN, "amount": "+100.00"},
+                           {"IBAN": IBAN, "amount": "-50.00"}])
+        manager.calculate_balance(IBAN)
+        with open("test_balances.json", "r", encoding="utf-8") as file:
+            balances = [json.loads(line)["balance"] for line in file]
+        self.assertEqual(balances, [100.0, 100.0, 50.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Module to test the Bloom filter in front of the duplicate check"""
+import json
+import unittest
+from uc3m_money import AccountManagementException
+from uc3m_money.bloom_filter import BloomFilter, DuplicateFilter, duplicate_filter, filter_key
+try:
+    from .fixtures import FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FileTestCase, transfer_request
+
+
+class TestBloomFilter(FileTestCase):
+    """Class to test the Bloom filter and the duplicate filter of a transfers file"""
+
+    def test_false_positive_rate(self):
+        """Added keys are always found and others rarely, as configured"""
+        bloom = BloomFilter(1000, 0.01)
+        for number in range(1000):
+            bloom.add(b"key %d" % number)
+        self.assertTrue(all(b"key %d" % number in bloom for number in range(1000)))
+        false_positives = sum(b"other %d" % number in bloom for number in range(10000))
+        self.assertLess(false_positives, 250)
+        stats = bloom.stats()
+        self.assertEqual(stats["keys"], 1000)
+        self.assertEqual(stats["memory_bytes"], (stats["bits"] + 7) // 8)
+        self.assertAlmostEqual(stats["estimated_false_positive_rate"], 0.01, delta=0.005)
+        with self.assertRaises(ValueError):
+            BloomFilter(10, 1.5)
+
+    def test_numbers_hash_alike(self):
+        """Amounts equal for the exact check have the same filter key"""
+        transfer = transfer_request("First payment").to_json()
+        self.assertEqual(filter_key(transfer), filter_key(dict(transfer, transfer_amount=100)))
+
+    def test_save_skips_the_scan_for_new_transfers(self):
+        """New transfers skip the scan and duplicates are still refused"""
+        first = transfer_request("First payment")
+        first.save_to_json(self.transfers)
+        transfer_request("Second payment").save_to_json(self.transfers)
+        with self.assertRaises(AccountManagementException):
+            transfer_request("First payment").save_to_json(self.transfers)
+        stats = duplicate_filter(self.transfers).stats()
+        self.assertEqual(stats["definitely_new"], 2)
+        self.assertEqual(stats["exact_checks"], 1)
+        self.assertEqual(stats["keys"], 2)
+        self.assertGreater(stats["memory_bytes"], 0)
+        first.delete_from_json(self.transfers)
+        self.assertEqual(duplicate_filter(self.transfers).stats()["keys"], 1)
+        first.save_to_json(self.transfers)
+
+    def test_filter_is_persisted(self):
+        """A saved filter is reused and catches up with appended transfers"""
+        transfer_request("First payment").save_to_json(self.transfers)
+        duplicates = DuplicateFilter(self.transfers, error_rate=0.001)
+        duplicates.refresh()
+        duplicates.save()
+        with open(self.transfers + ".bloom", "rb") as file:
+            self.assertEqual(json.loads(file.readline())["keys"], 1)
+        transfer_request("Second payment").save_to_json(self.transfers)
+        reloaded = DuplicateFilter(self.transfers, error_rate=0.001)
+        self.assertTrue(reloaded.might_contain(transfer_request("Second payment").to_json()))
+        self.assertEqual(reloaded.stats()["keys"], 2)
+        self.assertEqual(reloaded.stats()["error_rate"], 0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""Module to test the execution of transfers on their transfer_date"""
+import json
+import unittest
+from datetime import date
+from unittest import mock
+from uc3m_money.execution_engine import ExecutionEngine, SimulatedClock
+from uc3m_money.posting_engine import PostingEngine
+try:
+    from .fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+
+
+class TestExecutionEngine(FileTestCase):
+    """Class to test the pending heap, daily runs and restarts"""
+
+    def setUp(self):
+        super().setUp()
+        self.executed = self.path("executed.json")
+
+    def save(self, concept, transfer_date, amount=100.0):
+        """Saves a transfer and returns its record"""
+        transfer = transfer_request(concept, amount, transfer_date=transfer_date)
+        transfer.save_to_json(self.transfers)
+        return transfer.to_json()
+
+    def engine(self, clock, postings=None):
+        """Returns an engine over the temporary files"""
+        return ExecutionEngine(self.transfers, self.executed, clock, postings)
+
+    def test_due_transfers_are_released_by_day(self):
+        """Each daily run executes only the transfers dated up to that day"""
+        third = self.save("Third payment", "03/01/2050")
+        first = self.save("First payment", "01/01/2050")
+        second = self.save("Second payment", "2/1/2050")
+        clock = SimulatedClock(date(2049, 12, 31))
+        engine = self.engine(clock)
+        self.assertEqual(engine.load_pending(), 3)
+        self.assertEqual(engine.next_due(), date(2050, 1, 1))
+        self.assertEqual(engine.run(), [])
+        clock.advance()
+        self.assertEqual([record["transfer_code"] for record in engine.run()],
+                         [first["transfer_code"]])
+        executed = engine.run_until(date(2050, 1, 5))
+        self.assertEqual([(record["transfer_code"], record["executed_on"])
+                          for record in executed],
+                         [(second["transfer_code"], "2050-01-02"),
+                          (third["transfer_code"], "2050-01-03")])
+        self.assertEqual(len(engine), 0)
+        with open(self.executed, "r", encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 3)
+
+    def test_restart_neither_skips_nor_repeats(self):
+        """A new engine resumes after the last day run"""
+        first = self.save("First payment", "01/01/2050")
+        clock = SimulatedClock(date(2050, 1, 1))
+        engine = self.engine(clock)
+        engine.load_pending()
+        engine.run()
+        late = self.save("Late payment", "01/01/2050")
+        later = self.save("Later payment", "02/01/2050")
+        restarted = self.engine(clock)
+        self.assertEqual(restarted.executed_through, date(2050, 1, 1))
+        self.assertEqual(restarted.load_pending(), 2)
+        self.assertFalse(restarted.schedule(first))
+        self.assertEqual([record["transfer_code"] for record in restarted.run()],
+                         [late["transfer_code"]])
+        clock.advance()
+        self.assertEqual([record["transfer_code"] for record in restarted.run()],
+                         [later["transfer_code"]])
+
+    def test_execution_posts_to_the_accounts(self):
+        """With a posting engine transfers move money on their date, or are rejected"""
+        postings = PostingEngine(self.path("postings.log"),
+                                 overdraft_limit=0)
+        postings.post_deposit(FROM_IBAN, 150, "deposit")
+        clock = SimulatedClock(date(2050, 1, 1))
+        engine = self.engine(clock, postings)
+        engine.schedule(self.save("Paid payment", "01/01/2050"))
+        engine.schedule(self.save("Unpaid payment", "01/01/2050"))
+        records = engine.run()
+        self.assertEqual([record["status"] for record in records], ["executed", "rejected"])
+        self.assertEqual(records[1]["reason"], "Insufficient funds")
+        self.assertEqual(postings.balance(TO_IBAN), 100.0)
+        with open(self.executed + ".state", "r", encoding="utf-8") as file:
+            self.assertEqual(json.load(file)["executed_through"], "2050-01-01")
+
+    def test_failed_run_keeps_the_due_transfers(self):
+        """Due transfers stay pending when a run fails, and are executed once"""
+        postings = PostingEngine(self.path("postings.log"))
+        clock = SimulatedClock(date(2050, 1, 1))
+        engine = self.engine(clock, postings)
+        engine.schedule(self.save("First payment", "01/01/2050"))
+        engine.schedule(self.save("Second payment", "01/01/2050"))
+        with mock.patch.object(postings, "post_transfer",
+                               side_effect=[True, OSError("disk full")]):
+            with self.assertRaises(OSError):
+                engine.run()
+        self.assertEqual(len(engine), 2)
+        self.assertEqual(len(engine.run()), 2)
+        self.assertEqual(postings.balance(TO_IBAN), 200.0)
+
+    def test_crash_before_the_state_is_saved(self):
+        """Records appended by a run that never saved its state are not repeated"""
+        first = self.save("First payment", "01/01/2050")
+        clock = SimulatedClock(date(2050, 1, 1))
+        engine = self.engine(clock)
+        engine.load_pending()
+        with mock.patch("uc3m_money.execution_engine.atomic_write",
+                        side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                engine.run()
+        with open(self.executed, "a", encoding="utf-8") as file:
+            file.write('{"transfer_code": "torn')
+        restarted = self.engine(clock)
+        self.assertEqual(restarted.load_pending(), 1)
+        records = restarted.run()
+        self.assertEqual([record["transfer_code"] for record in records],
+                         [first["transfer_code"]])
+        with open(self.executed, "r", encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Module to test the hash chain over the transfers file"""
+import os
+import unittest
+from uc3m_money import TransferRequest, AccountManagementException
+from uc3m_money.hash_chain import GENESIS, HashChain
+from uc3m_money.segmented_log import SegmentedLog
+try:
+    from .fixtures import FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FileTestCase, transfer_request
+
+
+class TestHashChain(FileTestCase):
+    """Class to test chaining, sealing and verification"""
+
+    def save(self, count, chain=None, first=0, segments=None):
+        """Saves transfers with distinct amounts and returns the last one"""
+        for number in range(first, first + count):
+            request = transfer_request("Chained payment", 10.0 + number)
+            request.save_to_json(self.transfers, chain=chain, segments=segments)
+        return request
+
+    def tamper(self):
+        """Changes one amount of the first transfer without changing its length"""
+        with open(self.transfers, "r+b") as file:
+            content = file.read()
+            file.seek(0)
+            file.write(content.replace(b"10.0", b"90.0", 1))
+
+    def test_appends_are_chained_and_sealed(self):
+        """Every save extends the chain and full segments are sealed"""
+        chain = HashChain(self.transfers, segment_size=3)
+        self.assertEqual(chain.head, GENESIS)
+        self.save(7, chain)
+        self.assertEqual(len(chain), 7)
+        with open(self.transfers + ".chain", "r", encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 2)
+        reloaded = HashChain(self.transfers)
+        self.assertEqual((len(reloaded), reloaded.head), (7, chain.head))
+        self.assertEqual(reloaded.verify(max_workers=2), 7)
+
+    def test_incremental_verification(self):
+        """Only the lines chained after the checkpoint are checked again"""
+        chain = HashChain(self.transfers, segment_size=4)
+        self.save(5, chain)
+        self.assertEqual(chain.verify_incremental(), 5)
+        self.save(2, chain, first=5)
+        self.assertEqual(chain.verify_incremental(), 2)
+        self.assertEqual(chain.verify_incremental(), 0)
+        self.tamper()
+        # The tampered line was verified already, only a full verification sees it
+        self.assertEqual(chain.verify_incremental(), 0)
+        with self.assertRaises(AccountManagementException) as context:
+            chain.verify()
+        self.assertIn("segment 0", context.exception.message)
+
+    def test_tampered_tail_and_rebuild(self):
+        """A changed open segment is detected and an authorized rewrite re-chained"""
+        chain = HashChain(self.transfers, segment_size=100)
+        self.save(3, chain)
+        self.tamper()
+        with self.assertRaises(AccountManagementException):
+            chain.verify_incremental()
+        with open(self.transfers, "r+b") as file:
+            file.truncate(10)
+        with self.assertRaises(AccountManagementException):
+            chain.update()
+        os.remove(self.transfers)
+        self.save(2)
+        self.assertEqual(chain.rebuild(), 2)
+        self.assertEqual(chain.verify(), 2)
+
+    def test_rewrites_are_detected(self):
+        """A rewrite that keeps the size is caught, an authorized delete re-chains"""
+        chain = HashChain(self.transfers, segment_size=2)
+        last = self.save(3, chain)
+        with open(self.transfers, "rb") as file:
+            lines = file.readlines()
+        # Same size, the last two lines swapped
+        with open(self.transfers, "wb") as file:
+            file.write(lines[0] + lines[2] + lines[1])
+        with self.assertRaises(AccountManagementException) as context:
+            chain.update()
+        self.assertIn("rewritten", context.exception.message)
+        last.delete_from_json(self.transfers, chain=chain)
+        self.assertEqual((len(chain), chain.verify()), (2, 2))
+        self.assertEqual(HashChain(self.transfers).update(), 0)
+        code = self.save(1, chain, first=5).transfer_code
+        TransferRequest.delete_by_code(code, self.transfers, chain=chain)
+        self.assertEqual(chain.verify(), 2)
+
+    def test_chain_carries_over_rolls(self):
+        """Rolled segments are verified in their archives and rebuilt from them"""
+        segments = SegmentedLog(self.transfers, max_bytes=1)
+        chain = HashChain(self.transfers, segment_size=2)
+        self.save(3, chain, segments=segments)
+        self.assertFalse(os.path.exists(self.transfers))
+        self.assertEqual(len(chain), 3)
+        self.assertEqual(chain.verify_incremental(), 3)
+        self.save(1, chain, first=3, segments=segments)
+        self.assertEqual(chain.verify_incremental(), 1)
+        self.assertEqual(chain.verify(max_workers=1), 4)
+        self.assertEqual(HashChain(self.transfers).verify(max_workers=2), 4)
+        head = chain.head
+        self.assertEqual(chain.rebuild(), 4)
+        self.assertEqual((chain.head, chain.verify()), (head, 4))
+        self.save(1, first=4)
+        self.assertEqual(chain.update(), 1)
+        self.assertEqual(chain.verify(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Module to test the process-wide IBAN registry"""
+import unittest
+from uc3m_money import AccountManager
+from uc3m_money.iban_registry import IbanRegistry, IBAN_REGISTRY
+
+
+class TestIbanRegistry(unittest.TestCase):
+    """Class to test the IBAN registry"""
+    def setUp(self):
+        """Creates an empty registry for every test"""
+        self.registry = IbanRegistry()
+
+    def test_normalize_interns_spellings(self):
+        """Different spellings of the same IBAN share one canonical string"""
+        first = self.registry.normalize("es91 2100 0418 4502 0005 1332")
+        second = self.registry.normalize("ES9121000418450200051332")
+        self.assertEqual(first, "ES9121000418450200051332")
+        self.assertIs(first, second)
+
+    def test_verdict_is_cached(self):
+        """Valid and invalid IBANs keep their verdict"""
+        self.assertTrue(self.registry.is_valid("ES9121000418450200051332"))
+        self.assertFalse(self.registry.is_valid("ES9121000418450200051333"))
+        self.assertFalse(self.registry.is_valid("ES91@1000418450200051332"))
+        self.assertEqual(self.registry.stats()["verdicts"], 3)
+
+    def test_ids_are_compact_and_stable(self):
+        """Ids are assigned in order and map back to the canonical IBAN"""
+        first = self.registry.iban_id("ES9121000418450200051332")
+        second = self.registry.iban_id("ES7620770024003102575766")
+        self.assertEqual((first, second), (0, 1))
+        self.assertEqual(self.registry.iban_id("es91 2100 0418 4502 0005 1332"), 0)
+        self.assertEqual(self.registry.iban_for_id(1), "ES7620770024003102575766")
+        with self.assertRaises(KeyError):
+            self.registry.iban_for_id(2)
+        with self.assertRaises(KeyError):
+            self.registry.iban_for_id(-1)
+        with self.assertRaises(ValueError):
+            self.registry.iban_id("ES9121000418450200051333")
+
+    def test_caches_are_bounded(self):
+        """Old spellings are evicted and invalid IBANs are not interned"""
+        registry = IbanRegistry(max_entries=2)
+        for number in range(10):
+            registry.normalize(f"ES00{number:020d}")
+        self.assertEqual(registry.stats(), {"spellings": 2, "verdicts": 2, "ids": 0})
+        invalid = registry.normalize("es91 2100 0418 4502 0005 1333")
+        self.assertEqual(invalid, "ES9121000418450200051333")
+        self.assertIsNot(invalid, registry.normalize("ES9121000418450200051333"))
+
+    def test_clear(self):
+        """Clearing the registry forgets every entry"""
+        self.registry.iban_id("ES9121000418450200051332")
+        self.registry.clear()
+        self.assertEqual(self.registry.stats(), {"spellings": 0, "verdicts": 0, "ids": 0})
+
+    def test_account_manager_uses_shared_registry(self):
+        """validate_iban fills the process-wide registry"""
+        IBAN_REGISTRY.clear()
+        self.assertTrue(AccountManager.validate_iban("es76 2077 0024 0031 0257 5766"))
+        self.assertEqual(IBAN_REGISTRY.stats()["verdicts"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
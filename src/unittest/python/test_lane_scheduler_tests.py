@@ -0,0 +1,91 @@
+"""Module to test the priority lanes of the transfer service"""
+import json
+import queue
+import unittest
+from uc3m_money.lane_scheduler import LaneScheduler, parse_shares
+from uc3m_money.transfer_service import TransferService
+try:
+    from .fixtures import FROM_IBAN, FileTestCase
+except ImportError:
+    from fixtures import FROM_IBAN, FileTestCase
+
+VALID_TRANSFER = {"from_iban": FROM_IBAN,
+                  "to_iban": "ES7620770024003102575766",
+                  "concept": "Payment for services",
+                  "transfer_type": "ORDINARY",
+                  "date": "01/01/2050",
+                  "amount": 400.34}
+
+
+class TestLaneScheduler(FileTestCase):
+    """Class to test lane shares, bounds and queue time metrics"""
+
+    def test_batches_follow_the_shares(self):
+        """IMMEDIATE work goes first but ORDINARY keeps its share"""
+        lanes = LaneScheduler({"IMMEDIATE": 3, "ORDINARY": 1})
+        for number in range(20):
+            lanes.put("ORDINARY", ("ordinary", number))
+        for number in range(20):
+            lanes.put("immediate", ("immediate", number))
+        taken = [lanes.get_batch(1)[0][0] for _ in range(8)]
+        self.assertEqual(taken.count("immediate"), 6)
+        self.assertEqual(taken.count("ordinary"), 2)
+        batch = lanes.get_batch(100)
+        self.assertEqual([item[1] for item in batch if item[0] == "ordinary"],
+                         list(range(2, 20)))
+        self.assertEqual(lanes.depth(), 0)
+
+    def test_bounds_and_default_lane(self):
+        """Each lane has its own bound and unknown types go to the lowest lane"""
+        lanes = LaneScheduler(max_queue=2)
+        self.assertEqual(lanes.lane_for("BOGUS"), "ORDINARY")
+        self.assertEqual(lanes.lane_for(None), "ORDINARY")
+        lanes.put("ORDINARY", 1, block=False)
+        lanes.put(None, 2, block=False)
+        with self.assertRaises(queue.Full):
+            lanes.put("ORDINARY", 3, block=False)
+        with self.assertRaises(queue.Full):
+            lanes.put("ORDINARY", 3, timeout=0.01)
+        lanes.put("IMMEDIATE", 4, block=False)
+        lanes.close()
+        self.assertEqual(lanes.get_batch(10), [4, 1, 2])
+        self.assertIsNone(lanes.get_batch(10))
+        with self.assertRaises(ValueError):
+            LaneScheduler({"ORDINARY": 0})
+        self.assertEqual(parse_shares("immediate=5, ORDINARY=2"),
+                         {"IMMEDIATE": 5, "ORDINARY": 2})
+
+    def test_queue_time_per_lane(self):
+        """Queue times are measured per lane with the scheduler clock"""
+        now = [0.0]
+        lanes = LaneScheduler(clock=lambda: now[0])
+        lanes.put("URGENT", "a")
+        now[0] = 0.5
+        lanes.put("URGENT", "b")
+        now[0] = 1.0
+        lanes.get_batch(10)
+        stats = lanes.stats()
+        self.assertEqual(stats["URGENT"]["dequeued"], 2)
+        self.assertAlmostEqual(stats["URGENT"]["avg_queue_ms"], 750.0)
+        self.assertAlmostEqual(stats["URGENT"]["max_queue_ms"], 1000.0)
+        self.assertEqual(stats["IMMEDIATE"]["queued"], 0)
+
+    def test_service_serves_immediate_first(self):
+        """An IMMEDIATE request is written in the first batch despite an ORDINARY backlog"""
+        service = TransferService(self.transfers, max_queue=50, batch_size=5)
+        for number in range(20):
+            service.submit(dict(VALID_TRANSFER, amount=10.0 + number))
+        immediate = service.submit(dict(VALID_TRANSFER, transfer_type="IMMEDIATE"))
+        service.start()
+        service.stop()
+        with open(self.transfers, "r", encoding="utf-8") as file:
+            first_batch = [json.loads(line)["transfer_code"] for line in file][:5]
+        self.assertIn(immediate.result(), first_batch)
+        stats = service.stats()
+        self.assertEqual(stats["lanes"]["IMMEDIATE"]["dequeued"], 1)
+        self.assertEqual(stats["lanes"]["ORDINARY"]["dequeued"], 20)
+        self.assertEqual(stats["accepted"], 21)
+
+
+if __name__ == '__main__':
+    unittest.main()
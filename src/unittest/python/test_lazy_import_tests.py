@@ -0,0 +1,39 @@
+"""Module to test the lazy loading of the uc3m_money package"""
+import os
+import subprocess
+import sys
+import unittest
+import uc3m_money
+from uc3m_money import account_manager
+
+
+class TestLazyImport(unittest.TestCase):
+    """Class to test the package level lazy attributes"""
+
+    def test_import_does_not_load_submodules(self):
+        """Importing the package alone loads none of the submodules, nor re or typing"""
+        # Runs in a fresh interpreter, this one already imported the submodules
+        statement = ("import sys, uc3m_money; "
+                     "print(sorted(m for m in sys.modules if m.startswith('uc3m_money.') "
+                     "or m in ('re', 'typing')))")
+        result = subprocess.run([sys.executable, "-c", statement], capture_output=True,
+                                text=True, check=True, env=dict(os.environ),
+                                cwd=os.path.dirname(os.path.dirname(uc3m_money.__file__)))
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_public_names_resolve(self):
+        """Every public name resolves to the class of its submodule"""
+        self.assertIs(uc3m_money.AccountManager, account_manager.AccountManager)
+        for name in uc3m_money.__all__:
+            with self.subTest(name=name):
+                self.assertIsNotNone(getattr(uc3m_money, name))
+                self.assertIn(name, dir(uc3m_money))
+
+    def test_unknown_name(self):
+        """Unknown names still raise AttributeError"""
+        with self.assertRaises(AttributeError):
+            uc3m_money.NotAClass  # pylint: disable=pointless-statement,no-member
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Module to test the per-IBAN ledger index"""
+import json
+import os
+import unittest
+from uc3m_money import AccountManager, AccountManagementException
+from uc3m_money.ledger_index import LedgerIndex
+try:
+    from .fixtures import FileTestCase
+except ImportError:
+    from fixtures import FileTestCase
+
+FIRST = "ES8658342044541216872704"
+SECOND = "ES3559005439021242088295"
+
+
+class TestLedgerIndex(FileTestCase):
+    """Class to test the ledger index and get_transactions"""
+
+    def setUp(self):
+        """Creates a ledger with non ASCII content in a temporary directory"""
+        super().setUp()
+        self.ledger = self.path("Transactions.json")
+        self.transactions = [
+            {"IBAN": FIRST, "amount": "-1280.06", "concept": "Pago de término"},
+            {"IBAN": SECOND, "amount": "+1258.75"},
+            {"IBAN": FIRST, "amount": "+2424.42", "concept": "Reembolso €"},
+            {"IBAN": FIRST, "amount": "-1021.97"}]
+        self.write_ledger(self.transactions)
+
+    def write_ledger(self, transactions):
+        """Writes the ledger as a pretty printed JSON array"""
+        with open(self.ledger, "w", encoding="utf-8") as file:
+            json.dump(transactions, file, indent=4, ensure_ascii=False)
+
+    def test_transactions_of_one_iban(self):
+        """Only the records of the IBAN are returned, paginated"""
+        index = LedgerIndex(self.ledger)
+        expected = [self.transactions[0], self.transactions[2], self.transactions[3]]
+        self.assertEqual(index.get_transactions(FIRST), expected)
+        self.assertEqual(index.get_transactions(FIRST, limit=1, offset=1), expected[1:2])
+        self.assertEqual(index.get_transactions(FIRST, offset=5), [])
+        self.assertEqual(index.count(SECOND), 1)
+        self.assertEqual(index.get_transactions("ES9121000418450200051332"), [])
+        with self.assertRaises(AccountManagementException):
+            index.get_transactions(FIRST, limit=-1)
+
+    def test_index_is_persisted_and_rebuilt(self):
+        """A new index reuses the saved one until the ledger changes"""
+        LedgerIndex(self.ledger).refresh()
+        self.assertTrue(os.path.exists(self.ledger + ".idx"))
+        index = LedgerIndex(self.ledger)
+        self.assertEqual(index.count(FIRST), 3)
+        self.write_ledger(self.transactions + [{"IBAN": SECOND, "amount": "+1.00"}])
+        self.assertEqual(index.get_transactions(SECOND, offset=1),
+                         [{"IBAN": SECOND, "amount": "+1.00"}])
+
+    def test_account_manager_statement(self):
+        """AccountManager.get_transactions reads the working directory ledger"""
+        # The folder is restored by tearDown
+        os.chdir(self.directory)
+        manager = AccountManager()
+        self.assertEqual(len(manager.get_transactions(FIRST, limit=2)), 2)
+        with self.assertRaises(AccountManagementException):
+            manager.get_transactions("INVALID_IBAN_FORMAT")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Module to test memory reporting and the memory budget of the bulk paths"""
+import json
+import os
+import tracemalloc
+import unittest
+from unittest import mock
+from uc3m_money import AccountManager, AccountManagementException
+from uc3m_money import serialization
+from uc3m_money.memory_budget import (MEMORY_BUDGET_ENV, MEMORY_REPORT_ENV, memory_budget,
+                                      memory_stats, parse_size, reset_memory_budget,
+                                      reset_memory_stats, set_memory_budget, should_stream)
+try:
+    from .fixtures import FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FileTestCase, transfer_request
+
+IBAN = "ES8658342044541216872704"
+
+
+class TestMemoryBudget(FileTestCase):
+    """Class to test the memory budget and memory_stats"""
+
+    CHDIR = True
+
+    def setUp(self):
+        super().setUp()
+        with open("Transactions.json", "w", encoding="utf-8") as file:
+            json.dump([{"IBAN": IBAN, "amount": "+%d.25" % number} for number in range(200)]
+                      + [{"IBAN": "ES3559005439021242088295", "amount": "-1.00"}],
+                      file, indent=4)
+
+    def tearDown(self):
+        reset_memory_budget()
+        reset_memory_stats()
+        super().tearDown()
+
+    def test_budget_setting(self):
+        """The budget comes from the environment unless it is set"""
+        self.assertEqual(parse_size("64M"), 64 * 1024 ** 2)
+        self.assertEqual(parse_size("512kb"), 512 * 1024)
+        with self.assertRaises(ValueError):
+            parse_size("lots")
+        with mock.patch.dict(os.environ, {MEMORY_BUDGET_ENV: "1K"}):
+            self.assertEqual(memory_budget(), 1024)
+            self.assertTrue(should_stream("Transactions.json"))
+            set_memory_budget(None)
+            self.assertIsNone(memory_budget())
+            self.assertFalse(should_stream("Transactions.json"))
+
+    def test_invalid_budget_is_ignored(self):
+        """An invalid budget in the environment is reported once and means no budget"""
+        with mock.patch.dict(os.environ, {MEMORY_BUDGET_ENV: "lots"}):
+            with self.assertWarns(RuntimeWarning):
+                self.assertIsNone(memory_budget())
+            with mock.patch("uc3m_money.memory_budget.parse_size") as parse:
+                self.assertFalse(should_stream("Transactions.json"))
+            parse.assert_not_called()
+
+    def test_balance_streams_over_budget(self):
+        """calculate_balance gives the same balance streaming the ledger"""
+        expected = sum(number + 0.25 for number in range(200))
+        for budget in (None, "1K"):
+            with self.subTest(budget=budget):
+                set_memory_budget(budget)
+                with mock.patch.object(serialization, "iter_array_file",
+                                       wraps=serialization.iter_array_file) as streaming:
+                    self.assertAlmostEqual(AccountManager._ledger_balance("Transactions.json",
+                                                                          IBAN), expected)
+                self.assertEqual(streaming.called, budget is not None)
+
+    def test_delete_streams_over_budget(self):
+        """delete_from_json spills the kept transfers to a temporary file"""
+        set_memory_budget(1)
+        transfers = [transfer_request(concept, to_iban=IBAN)
+                     for concept in ("First payment", "Second payment")]
+        for transfer in transfers:
+            transfer.save_to_json("transfers.json")
+        transfers[0].delete_from_json("transfers.json")
+        with open("transfers.json", "r", encoding="utf-8") as file:
+            self.assertEqual([json.loads(line) for line in file], [transfers[1].to_json()])
+        with self.assertRaises(AccountManagementException):
+            transfers[0].delete_from_json("transfers.json")
+        with mock.patch("uc3m_money.transfer_request.os.replace", side_effect=OSError("busy")):
+            with self.assertRaises(AccountManagementException):
+                transfers[1].delete_from_json("transfers.json")
+        self.assertFalse([name for name in os.listdir(".") if name.endswith(".tmp")])
+
+    def test_memory_report(self):
+        """Each tracked operation reports its peak allocation"""
+        with mock.patch.dict(os.environ, {MEMORY_REPORT_ENV: "1"}):
+            AccountManager().calculate_balance(IBAN)
+        stats = memory_stats()
+        balance = stats["AccountManager.calculate_balance"]
+        self.assertEqual(balance["runs"], 1)
+        self.assertGreater(balance["max_peak"], 0)
+        self.assertGreater(stats["peak_rss"], 0)
+        AccountManager().calculate_balance(IBAN)
+        self.assertEqual(memory_stats()["AccountManager.calculate_balance"]["runs"], 1)
+
+    def test_caller_tracemalloc_session(self):
+        """A tracemalloc session of the caller keeps running with its peak"""
+        tracemalloc.start()
+        try:
+            held = [bytes(1 << 20)]
+            del held
+            peak = tracemalloc.get_traced_memory()[1]
+            with mock.patch.dict(os.environ, {MEMORY_REPORT_ENV: "1"}):
+                AccountManager().calculate_balance(IBAN)
+            self.assertTrue(tracemalloc.is_tracing())
+            self.assertGreaterEqual(tracemalloc.get_traced_memory()[1], peak)
+        finally:
+            tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Module to test bilateral and multilateral netting"""
+import math
+import random
+import unittest
+from uc3m_money import serialization
+from uc3m_money.netting import (bilateral_net, multilateral_net, net_transfers,
+                                read_transfers)
+try:
+    from .fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+
+A = FROM_IBAN
+B = TO_IBAN
+C = "ES3559005439021242088295"
+
+
+def transfer(sender, receiver, amount):
+    """Returns a transfer record with the fields netting reads"""
+    return {"from_iban": sender, "to_iban": receiver, "transfer_amount": amount}
+
+
+def positions_of(transfers):
+    """Net position of each account, in cents, computed the slow way"""
+    positions = {}
+    for record in transfers:
+        cents = round(record["transfer_amount"] * 100)
+        positions[record["from_iban"]] = positions.get(record["from_iban"], 0) - cents
+        positions[record["to_iban"]] = positions.get(record["to_iban"], 0) + cents
+    return {iban: cents for iban, cents in positions.items() if cents}
+
+
+class TestNetting(FileTestCase):
+    """Class to test the net postings and their compression ratio"""
+
+    def test_bilateral(self):
+        """Opposite flows of a pair cancel into one posting"""
+        result = bilateral_net([transfer(A, B, 100.10), transfer(B, A, 40.05),
+                                transfer(A, B, 10.00), transfer(B, C, 20.00),
+                                transfer(C, C, 99.00)])
+        self.assertEqual(sorted(result.postings, key=lambda posting: posting["to_iban"]),
+                         [{"from_iban": B, "to_iban": C, "amount": 20.0},
+                          {"from_iban": A, "to_iban": B, "amount": 70.05}])
+        self.assertEqual(result.transfer_count, 5)
+        self.assertEqual(result.compression_ratio, 2.5)
+        self.assertEqual(result.gross_amount, 269.15)
+
+    def test_multilateral(self):
+        """A cycle nets to nothing and positions are kept"""
+        cycle = [transfer(A, B, 50.0), transfer(B, C, 50.0), transfer(C, A, 50.0)]
+        result = multilateral_net(cycle)
+        self.assertEqual(result.postings, [])
+        self.assertEqual(result.compression_ratio, math.inf)
+        self.assertIsNone(result.stats()["compression_ratio"])
+        self.assertIsNone(serialization.loads(serialization.dumps(result.stats()))
+                          ["compression_ratio"])
+        self.assertEqual(net_transfers([], multilateral=True).compression_ratio, 0.0)
+
+    def test_random_batches_keep_positions(self):
+        """Both nettings settle every account to its exact net position"""
+        generator = random.Random(7)
+        accounts = [A, B, C, "ES7620770024003102575766", "ES1920802632317171556954"]
+        transfers = [transfer(*generator.sample(accounts, 2),
+                              round(generator.uniform(10, 10000), 2)) for _ in range(2000)]
+        expected = positions_of(transfers)
+        for netting in (bilateral_net, multilateral_net):
+            with self.subTest(netting=netting.__name__):
+                result = netting(transfers)
+                self.assertEqual(positions_of([transfer(posting["from_iban"],
+                                                        posting["to_iban"], posting["amount"])
+                                               for posting in result.postings]), expected)
+                self.assertGreater(result.compression_ratio, 100)
+        self.assertLessEqual(multilateral_net(transfers).posting_count, len(accounts) - 1)
+        self.assertLessEqual(multilateral_net(transfers).net_amount,
+                             bilateral_net(transfers).net_amount)
+
+    def test_store_is_streamed(self):
+        """A transfers file is netted one line at a time"""
+        for concept, amount in (("First payment", 30.0), ("Second payment", 20.0)):
+            transfer_request(concept, amount).save_to_json(self.transfers)
+        result = bilateral_net(read_transfers(self.transfers))
+        self.assertEqual(result.postings, [{"from_iban": A, "to_iban": B, "amount": 50.0}])
+        self.assertEqual(result.positions(), {A: -50.0, B: 50.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""Module to test the double-entry posting engine"""
+import json
+import os
+import unittest
+from uc3m_money import AccountManager, TransferRequest, AccountManagementException
+from uc3m_money.posting_engine import EXTERNAL_ACCOUNT, PostingEngine
+try:
+    from .fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+
+
+class TestPostingEngine(FileTestCase):
+    """Class to test postings, the account table and its log"""
+
+    def setUp(self):
+        super().setUp()
+        self.log = self.path("postings.log")
+
+    def test_transfer_is_a_balanced_pair(self):
+        """A transfer debits the sender, credits the receiver and is posted once"""
+        engine = PostingEngine(self.log)
+        transfer = {"from_iban": FROM_IBAN, "to_iban": TO_IBAN, "transfer_amount": 400.34,
+                    "transfer_code": "a" * 32}
+        self.assertTrue(engine.post_transfer(transfer))
+        self.assertFalse(engine.post_transfer(transfer))
+        self.assertEqual(engine.balance(FROM_IBAN), -400.34)
+        self.assertEqual(engine.balance_cents(TO_IBAN), 40034)
+        self.assertTrue(engine.post_deposit(TO_IBAN, "EUR 1000.00", "b" * 64))
+        self.assertEqual(engine.balance(TO_IBAN), 1400.34)
+        self.assertEqual(sum(engine.accounts().values()), 0)
+        self.assertEqual(engine.accounts()[EXTERNAL_ACCOUNT], -1000.0)
+        with self.assertRaises(AccountManagementException):
+            engine.post_deposit(TO_IBAN, "EUR 1000.00", "")
+
+    def test_table_is_rebuilt_from_the_log(self):
+        """A new engine replays the log, snapshot and torn last line included"""
+        engine = PostingEngine(self.log, durable=False)
+        engine.post_deposit(FROM_IBAN, 10.5, "first")
+        engine.compact()
+        engine.post_deposit(FROM_IBAN, 20.0, "second")
+        with open(self.log, "a", encoding="utf-8") as file:
+            file.write('{"ref": "torn", "ki')
+        replayed = PostingEngine(self.log)
+        self.assertEqual(replayed.balance(FROM_IBAN), 30.5)
+        self.assertEqual(len(replayed), 2)
+        replayed.post_deposit(FROM_IBAN, 1.0, "third")
+        self.assertEqual(PostingEngine(self.log).balance(FROM_IBAN), 31.5)
+
+    def test_funds_check(self):
+        """With an overdraft limit, transfers beyond the running balance are refused"""
+        engine = PostingEngine(self.log, overdraft_limit=50)
+        engine.post_deposit(FROM_IBAN, "EUR 100.00", "deposit")
+        self.assertTrue(engine.has_funds(FROM_IBAN, 150.0))
+        self.assertFalse(engine.has_funds(FROM_IBAN, 150.01))
+        transfer = {"from_iban": FROM_IBAN, "to_iban": TO_IBAN, "transfer_amount": 150.01,
+                    "transfer_code": "c" * 32}
+        with self.assertRaises(AccountManagementException) as context:
+            engine.post_transfer(transfer)
+        self.assertEqual(context.exception.message, "Insufficient funds")
+        self.assertEqual(engine.balance(FROM_IBAN), 100.0)
+        self.assertTrue(PostingEngine(self.log).has_funds(FROM_IBAN, 10 ** 6))
+
+    def test_save_refuses_transfers_without_funds(self):
+        """save_to_json does not save a transfer the sender cannot pay"""
+        engine = PostingEngine(self.log, overdraft_limit=0)
+        transfer = transfer_request("Unfunded payment", 250.0)
+        with self.assertRaises(AccountManagementException):
+            transfer.save_to_json(self.transfers, postings=engine)
+        self.assertFalse(os.path.exists(self.transfers))
+        engine.post_deposit(FROM_IBAN, 250, "deposit")
+        transfer.save_to_json(self.transfers, postings=engine)
+        self.assertEqual(engine.balance(FROM_IBAN), 0.0)
+
+    def test_failed_append_is_reversed(self):
+        """A transfer that cannot be appended leaves no posting behind"""
+        engine = PostingEngine(self.log, overdraft_limit=0)
+        engine.post_deposit(FROM_IBAN, 100, "deposit")
+        os.mkdir(self.transfers)
+        transfer = transfer_request("Failed payment")
+        with self.assertRaises(AccountManagementException):
+            transfer.save_to_json(self.transfers, postings=engine)
+        self.assertFalse(engine.is_posted(transfer.transfer_code))
+        self.assertEqual((engine.balance(FROM_IBAN), engine.balance(TO_IBAN)), (100.0, 0.0))
+        replayed = PostingEngine(self.log)
+        self.assertEqual((len(replayed), replayed.balance(FROM_IBAN)), (1, 100.0))
+        self.assertFalse(engine.reverse_transfer(transfer))
+
+    def test_ledger_balances_are_opening_balances(self):
+        """The funds check follows the ledger, appends to it included"""
+        ledger = self.path("Transactions.json")
+        with open(ledger, "w", encoding="utf-8") as file:
+            json.dump([{"IBAN": FROM_IBAN, "amount": "+300.00"},
+                       {"IBAN": FROM_IBAN, "amount": "-100.50"}], file)
+        engine = PostingEngine(self.log, overdraft_limit=0, ledger=ledger)
+        self.assertEqual(engine.balance(FROM_IBAN), 199.5)
+        self.assertFalse(engine.has_funds(FROM_IBAN, 200))
+        with open(ledger, "w", encoding="utf-8") as file:
+            json.dump([{"IBAN": FROM_IBAN, "amount": "+300.00"},
+                       {"IBAN": FROM_IBAN, "amount": "-100.50"},
+                       {"IBAN": FROM_IBAN, "amount": "+0.50"}], file)
+        self.assertTrue(engine.has_funds(FROM_IBAN, 200))
+        self.assertEqual(sum(engine.accounts().values()), 0)
+
+    def test_deletions_are_reversed(self):
+        """Deleting a saved transfer, by fields or by code, reverses its posting"""
+        engine = PostingEngine(self.log)
+        first, second = (transfer_request("Reversed payment", amount) for amount in (100.0, 50.0))
+        first.save_to_json(self.transfers, postings=engine)
+        second.save_to_json(self.transfers, postings=engine)
+        first.delete_from_json(self.transfers, postings=engine)
+        self.assertEqual(engine.balance(TO_IBAN), 50.0)
+        TransferRequest.delete_by_code(second.transfer_code, self.transfers, postings=engine)
+        self.assertEqual((engine.balance(FROM_IBAN), engine.balance(TO_IBAN)), (0.0, 0.0))
+        self.assertEqual(len(PostingEngine(self.log)), 0)
+
+    def test_signed_amounts(self):
+        """String amounts keep their sign"""
+        self.assertEqual(PostingEngine.to_cents("-1280.06"), -128006)
+        self.assertEqual(PostingEngine.to_cents("+2424.42"), 242442)
+        self.assertEqual(PostingEngine.to_cents("EUR -10.00"), -1000)
+        self.assertEqual(PostingEngine.to_cents("EUR 1000.00"), 100000)
+
+    def test_operations_post_when_given_an_engine(self):
+        """save_to_json and deposit_into_account post what they accept"""
+        engine = PostingEngine(self.log)
+        # The folder is restored by tearDown
+        os.chdir(self.directory)
+        os.mkdir("json_files")
+        with open(os.path.join("json_files", "deposit.json"), "w", encoding="utf-8") as file:
+            json.dump({"IBAN": FROM_IBAN, "AMOUNT": "EUR 1000.00"}, file)
+        transfer = transfer_request("Posted payment", 250.0)
+        transfer.save_to_json("transfers.json", postings=engine)
+        signature = AccountManager(postings=engine).deposit_into_account("deposit.json")
+        self.assertTrue(engine.is_posted(transfer.transfer_code))
+        self.assertTrue(engine.is_posted(signature))
+        self.assertEqual(engine.balance(TO_IBAN), 250.0)
+        self.assertEqual(engine.balance(FROM_IBAN), 750.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Module to test the profiling switch"""
+import os
+import pstats
+import unittest
+from unittest import mock
+from uc3m_money import TransferRequest
+from uc3m_money.profiling import Profile, PROFILE_ENV, PROFILE_DIR_ENV, profile_mode
+try:
+    from .fixtures import FROM_IBAN, TO_IBAN, FileTestCase
+except ImportError:
+    from fixtures import FROM_IBAN, TO_IBAN, FileTestCase
+
+
+class TestProfiling(FileTestCase):
+    """Class to test cProfile and collapsed stack output"""
+
+    CHDIR = True
+
+    @staticmethod
+    def request():
+        """Runs one transfer_request in the temporary directory"""
+        return TransferRequest.transfer_request(FROM_IBAN, TO_IBAN, "Profiled payment",
+                                                "ORDINARY", "01/01/2050", 100.0)
+
+    def test_environment_switch(self):
+        """Each profiled run writes its own cProfile file, nested calls included"""
+        with mock.patch.dict(os.environ, {PROFILE_ENV: "cprofile", PROFILE_DIR_ENV: "out"}):
+            self.assertEqual(len(self.request()), 32)
+        files = os.listdir("out")
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].startswith("transfer_request-"))
+        self.assertTrue(files[0].endswith(".prof"))
+        functions = {function for _, _, function in
+                     pstats.Stats(os.path.join("out", files[0])).stats}
+        self.assertIn("save_to_json", functions)
+
+    def test_switch_off(self):
+        """Nothing is written when the switch is not set or not valid"""
+        with mock.patch.dict(os.environ, {PROFILE_ENV: "0", PROFILE_DIR_ENV: "out"}):
+            self.assertIsNone(profile_mode())
+            self.request()
+        self.assertFalse(os.path.exists("out"))
+        with mock.patch.dict(os.environ, {PROFILE_ENV: "sampling"}):
+            with self.assertWarns(RuntimeWarning):
+                self.assertIsNone(profile_mode())
+            self.assertIsNone(profile_mode())
+
+    def test_collapsed_stacks(self):
+        """The context manager writes collapsed stacks"""
+        with Profile("batch", "collapsed", "stacks") as profile:
+            sorted(str(number) for number in range(20000))
+        self.assertTrue(profile.path.endswith(".collapsed"))
+        with open(profile.path, "r", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, microseconds = line.rsplit(" ", 1)
+            self.assertTrue(stack)
+            self.assertGreater(int(microseconds), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Module to test the lazy query pipeline over ledgers and transfer stores"""
+import json
+import os
+import unittest
+from unittest import mock
+from uc3m_money import AccountManager, AccountManagementException
+from uc3m_money import serialization
+from uc3m_money.query import scan
+from uc3m_money.segmented_log import SegmentedLog
+try:
+    from .fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FROM_IBAN, TO_IBAN, FileTestCase, transfer_request
+
+IBAN = TO_IBAN
+OTHER_IBAN = "ES3559005439021242088295"
+SENDER = FROM_IBAN
+
+
+class TestQuery(FileTestCase):
+    """Class to test filtering, grouping and aggregation"""
+
+    def setUp(self):
+        super().setUp()
+        self.ledger = self.path("Transactions.json")
+        with open(self.ledger, "w", encoding="utf-8") as file:
+            json.dump([{"IBAN": IBAN, "amount": "+100.25"},
+                       {"IBAN": "es86 5834 2044 5412 1687 2704", "amount": "-20.00"},
+                       {"IBAN": OTHER_IBAN, "amount": "+5.00"},
+                       {"IBAN": OTHER_IBAN, "amount": "-1.50"}], file, indent=4)
+
+    def save_transfers(self, segments=None):
+        """Saves five transfers of two types to two accounts"""
+        for number in range(5):
+            transfer = transfer_request("Query payment", 10.0 + number,
+                                        to_iban=IBAN if number % 2 else OTHER_IBAN,
+                                        transfer_type="URGENT" if number < 2 else "ORDINARY")
+            transfer.save_to_json(self.transfers, segments=segments)
+
+    def test_ledger_queries(self):
+        """IBANs match in any spelling and amounts are summed by sign"""
+        query = scan(self.ledger)
+        self.assertEqual(query.count(), 4)
+        self.assertAlmostEqual(query.where(IBAN=IBAN).sum("amount"), 80.25)
+        self.assertAlmostEqual(
+            query.where(lambda record: float(record["amount"]) < 0).sum("amount"), -21.5)
+        totals = query.group_by("IBAN").sum("amount")
+        self.assertAlmostEqual(totals[OTHER_IBAN], 3.5)
+        signs = query.group_by(lambda record: record["amount"][0]).count()
+        self.assertEqual(signs, {"+": 2, "-": 2})
+
+    def test_ledger_pushdown_and_streaming(self):
+        """An IBAN filter reads through the ledger index unless over the memory budget"""
+        with mock.patch("uc3m_money.serialization.iter_array_file") as streamed:
+            self.assertEqual(scan(self.ledger).where(IBAN=OTHER_IBAN).count(), 2)
+        streamed.assert_not_called()
+        with mock.patch("uc3m_money.query.should_stream", return_value=True), \
+                mock.patch("uc3m_money.query.ledger_index") as index:
+            self.assertAlmostEqual(scan(self.ledger).where(IBAN=OTHER_IBAN).sum("amount"), 3.5)
+        index.assert_not_called()
+
+    def test_transfer_store_queries(self):
+        """Equality filters skip the decoding of lines without the value"""
+        self.save_transfers()
+        query = scan(self.transfers).where(from_iban=SENDER)
+        self.assertEqual(query.where(transfer_type="URGENT").count(), 2)
+        self.assertEqual(query.group_by("to_iban").count(), {OTHER_IBAN: 3, IBAN: 2})
+        self.assertAlmostEqual(query.group_by("transfer_type").sum("transfer_amount")["ORDINARY"],
+                               39.0)
+        with mock.patch("uc3m_money.serialization.loads", wraps=serialization.loads) as loads:
+            self.assertEqual(scan(self.transfers).where(transfer_type="URGENT").count(), 2)
+        self.assertEqual(loads.call_count, 2)
+
+    def test_iban_spellings_in_a_transfer_store(self):
+        """A stored IBAN spelled with spaces or in lower case still matches"""
+        self.save_transfers()
+        with open(self.transfers, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"from_iban": "es91 2100 0418 4502 0005 1332",
+                                   "to_iban": IBAN, "transfer_amount": 0.1}) + "\n")
+            file.write(json.dumps({"from_iban": SENDER, "to_iban": IBAN,
+                                   "transfer_amount": 0.2}) + "\n")
+        self.assertEqual(scan(self.transfers).where(from_iban=SENDER).count(), 7)
+        # Added up in cents, 0.1 + 0.2 is exactly 0.3
+        self.assertEqual(scan(self.transfers).where(lambda record: record["transfer_amount"] < 1)
+                         .sum("transfer_amount"), 0.3)
+
+    def test_lazy_and_segmented(self):
+        """Queries read nothing until asked and cover archived segments"""
+        query = scan(self.path("missing.json")).where(IBAN=IBAN)
+        with self.assertRaises(AccountManagementException):
+            query.count()
+        self.save_transfers(SegmentedLog(self.transfers, max_bytes=400))
+        self.assertEqual(scan(self.transfers).count(), 5)
+        with self.assertRaises(AccountManagementException):
+            scan(self.transfers).sum("transfer_concept")
+
+    def test_matches_calculate_balance(self):
+        """The ledger sum is the balance calculate_balance stores"""
+        # The folder is restored by tearDown
+        os.chdir(self.directory)
+        AccountManager(balance_cache=None).calculate_balance(IBAN)
+        with open("test_balances.json", "r", encoding="utf-8") as file:
+            balance = json.loads(file.readline())["balance"]
+        self.assertEqual(scan("Transactions.json").where(IBAN=IBAN).sum("amount"), balance)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Module to test the streaming JSONL request processor"""
+import json
+import os
+import unittest
+from unittest import mock
+from uc3m_money.request_processor import RequestProcessor
+from uc3m_money.transfer_store import TransferStore
+try:
+    from .fixtures import FROM_IBAN, FileTestCase
+except ImportError:
+    from fixtures import FROM_IBAN, FileTestCase
+
+REQUEST = {"from_iban": FROM_IBAN,
+           "to_iban": "ES7620770024003102575766",
+           "concept": "Payment for services",
+           "transfer_type": "ORDINARY",
+           "date": "01/01/2050",
+           "amount": 400.34}
+
+
+class TestRequestProcessor(FileTestCase):
+    """Class to test the request processor"""
+
+    def setUp(self):
+        """Creates the feed, output and transfers files in a temporary directory"""
+        super().setUp()
+        self.feed = self.path("feed.jsonl")
+        self.output = self.path("results.jsonl")
+
+    def write_feed(self, lines, mode="w"):
+        """Writes requests, or raw strings, to the feed"""
+        with open(self.feed, mode, encoding="utf-8") as file:
+            for line in lines:
+                file.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+
+    def read_output(self):
+        """Returns the results written so far"""
+        with open(self.output, "r", encoding="utf-8") as file:
+            return [json.loads(line) for line in file]
+
+    def test_results_per_line(self):
+        """Every request gets its code or its error, in order"""
+        self.write_feed([REQUEST, dict(REQUEST, amount=9.99), REQUEST, "not json", "",
+                         dict(REQUEST, amount=500.00)])
+        summary = RequestProcessor(self.transfers, batch_size=2).process(self.feed,
+                                                                        self.output)
+        self.assertEqual((summary["processed"], summary["accepted"], summary["rejected"]),
+                         (5, 2, 3))
+        results = self.read_output()
+        self.assertEqual([result["line"] for result in results], [1, 2, 3, 4, 6])
+        self.assertEqual(len(results[0]["transfer_code"]), 32)
+        self.assertEqual(results[1]["codes"], {"transfer_amount": "OUT_OF_RANGE"})
+        self.assertEqual(results[2]["error"], "Duplicate transfer detected")
+        self.assertEqual(results[3]["error"], "Request is not in JSON format")
+        with open(self.transfers, "r", encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 2)
+
+    def test_resume_from_offset(self):
+        """A resumed run skips the lines already processed and drops unsaved results"""
+        self.write_feed([REQUEST, dict(REQUEST, amount=10.00)])
+        RequestProcessor(self.transfers).process(self.feed, self.output)
+        # Result of an interrupted batch, written after the offsets were saved
+        with open(self.output, "a", encoding="utf-8") as file:
+            file.write('{"line": 3, "transfer_co')
+        self.write_feed([dict(REQUEST, amount=20.00)], mode="a")
+        summary = RequestProcessor(self.transfers).process(self.feed, self.output,
+                                                           resume=True)
+        self.assertEqual(summary["processed"], 1)
+        self.assertEqual(summary["offset"], os.path.getsize(self.feed))
+        results = self.read_output()
+        self.assertEqual([result["line"] for result in results], [1, 2, 3])
+        self.assertTrue(all("transfer_code" in result for result in results))
+
+    def test_resume_after_the_store_was_written(self):
+        """Transfers saved by an interrupted batch are reported with their codes"""
+        self.write_feed([REQUEST, dict(REQUEST, amount=10.00), REQUEST])
+        flush = TransferStore.flush
+
+        def flush_and_stop(store):
+            flush(store)
+            raise OSError("interrupted")
+
+        with mock.patch.object(TransferStore, "flush", flush_and_stop):
+            with self.assertRaises(OSError):
+                RequestProcessor(self.transfers).process(self.feed, self.output)
+        summary = RequestProcessor(self.transfers).process(self.feed, self.output,
+                                                           resume=True)
+        self.assertEqual((summary["accepted"], summary["rejected"]), (2, 1))
+        with open(self.transfers, "r", encoding="utf-8") as file:
+            saved = [json.loads(line)["transfer_code"] for line in file]
+        results = self.read_output()
+        self.assertEqual([result.get("transfer_code") for result in results[:2]], saved)
+        self.assertEqual(results[2]["error"], "Duplicate transfer detected")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""Module to test the rolling segments of the transfer and balance logs"""
+import gzip
+import json
+import os
+import unittest
+from uc3m_money import AccountManager, TransferRequest, AccountManagementException
+from uc3m_money.bloom_filter import DuplicateFilter
+from uc3m_money.netting import read_transfers
+from uc3m_money.segmented_log import SegmentedLog, iter_records, read_manifest
+from uc3m_money.transfer_store import TransferStore
+try:
+    from .fixtures import TO_IBAN, FileTestCase, transfer_request
+except ImportError:
+    from fixtures import TO_IBAN, FileTestCase, transfer_request
+
+IBAN = TO_IBAN
+
+
+def rolled_transfer(number):
+    """Returns a transfer with a distinct amount"""
+    return transfer_request("Rolled payment", 10.0 + number)
+
+
+class TestSegmentedLog(FileTestCase):
+    """Class to test rollover, archives and the readers across segments"""
+
+    def setUp(self):
+        super().setUp()
+        self.log_file = self.path("log.json")
+
+    def test_size_rollover(self):
+        """The active segment is archived once it reaches max_bytes"""
+        log = SegmentedLog(self.log_file, max_bytes=100)
+        for number in range(10):
+            log.append({"number": number, "padding": "x" * 20})
+        archives = log.segments()[:-1]
+        self.assertEqual(len(archives), 3)
+        self.assertTrue(archives[0].endswith("log.000001.json.gz"))
+        with gzip.open(archives[0], "rt", encoding="utf-8") as file:
+            self.assertEqual(json.loads(file.readline())["number"], 0)
+        self.assertLess(os.path.getsize(self.log_file), 100)
+        self.assertEqual([record["number"] for record in iter_records(self.log_file)],
+                         list(range(10)))
+        self.assertEqual(sum(archive["lines"] for archive in
+                             read_manifest(self.log_file)["archives"]), 9)
+
+    def test_age_rollover_with_xz(self):
+        """A segment open for max_age is archived even if it is small"""
+        now = [0.0]
+        log = SegmentedLog(self.log_file, max_age=60, compression="xz", clock=lambda: now[0])
+        log.append({"number": 1})
+        now[0] = 59
+        log.append({"number": 2})
+        self.assertEqual(len(log.segments()), 1)
+        now[0] = 60
+        log.append({"number": 3})
+        self.assertTrue(log.segments()[0].endswith(".json.xz"))
+        self.assertFalse(os.path.exists(self.log_file))
+        self.assertEqual(log.roll(), None)
+        self.assertEqual(len(list(iter_records(self.log_file))), 3)
+        with self.assertRaises(ValueError):
+            SegmentedLog(self.log_file, compression="zip")
+
+    def test_interrupted_roll(self):
+        """A segment renamed but not archived is archived when the log is opened"""
+        with open(self.log_file + ".rolling", "w", encoding="utf-8") as file:
+            file.write('{"number": 1}\n')
+        log = SegmentedLog(self.log_file)
+        self.assertFalse(os.path.exists(self.log_file + ".rolling"))
+        self.assertEqual(len(log.segments()), 2)
+        self.assertEqual(list(iter_records(self.log_file)), [{"number": 1}])
+
+    def test_transfers_across_segments(self):
+        """Duplicates of archived transfers are refused and readers see every segment"""
+        transfers = self.transfers
+        segments = SegmentedLog(transfers, max_bytes=500)
+        for number in range(6):
+            rolled_transfer(number).save_to_json(transfers, segments=segments)
+        self.assertGreater(len(segments.segments()), 2)
+        with self.assertRaises(AccountManagementException):
+            rolled_transfer(0).save_to_json(transfers, segments=segments)
+        self.assertEqual(len(list(read_transfers(transfers))), 6)
+        # A filter rebuilt from scratch also covers the archives
+        os.remove(transfers + ".bloom")
+        rebuilt = DuplicateFilter(transfers)
+        self.assertTrue(rebuilt.might_contain(rolled_transfer(0).to_json()))
+        self.assertEqual(rebuilt.stats()["keys"], 6)
+
+    def test_lookups_across_segments(self):
+        """Archived transfers are found by code and date, and refused for deletion"""
+        transfers = self.transfers
+        segments = SegmentedLog(transfers, max_bytes=10 ** 6)
+        requests = [rolled_transfer(number) for number in range(3)]
+        for request in requests[:2]:
+            request.save_to_json(transfers, segments=segments)
+        segments.roll()
+        requests[2].save_to_json(transfers, segments=segments)
+        self.assertTrue(TransferStore(transfers).contains(requests[0].to_json()))
+        found = TransferRequest.get_by_code(requests[0].transfer_code, transfers)
+        self.assertEqual(found["transfer_amount"], 10.0)
+        self.assertEqual([transfer["transfer_amount"] for transfer in
+                          TransferRequest.transfers_between("01/01/2050", "01/01/2050",
+                                                            filename=transfers)],
+                         [10.0, 11.0, 12.0])
+        for delete in (lambda: requests[1].delete_from_json(transfers),
+                       lambda: TransferRequest.delete_by_code(requests[0].transfer_code,
+                                                              transfers)):
+            with self.assertRaises(AccountManagementException) as context:
+                delete()
+            self.assertEqual(context.exception.message, "Archived transfers cannot be deleted")
+        TransferRequest.delete_by_code(requests[2].transfer_code, transfers)
+        self.assertEqual(len(list(iter_records(transfers))), 2)
+
+    def test_balance_log(self):
+        """Saved balances go through the rolling balance log"""
+        # The folder is restored by tearDown
+        os.chdir(self.directory)
+        with open("Transactions.json", "w", encoding="utf-8") as file:
+            json.dump([{"IBAN": IBAN, "amount": "+10.00"}], file)
+        balances = SegmentedLog("test_balances.json", max_bytes=1)
+        manager = AccountManager(balance_cache=None, balance_log=balances)
+        manager.calculate_balance(IBAN)
+        manager.calculate_balance(IBAN)
+        self.assertEqual(len(balances.segments()), 3)
+        self.assertEqual([record["balance"] for record in
+                          iter_records("test_balances.json")], [10.0, 10.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
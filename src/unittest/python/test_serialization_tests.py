@@ -0,0 +1,89 @@
+"""Module to test the JSON serialization layer"""
+import io
+import json
+import os
+import unittest
+from unittest import mock
+from uc3m_money import serialization
+
+RECORD = {"from_iban": "ES9121000418450200051332", "transfer_amount": 400.34,
+          "transfer_concept": "Pago de término", "time_stamp": 1742838900.0, "big": 10 ** 16}
+
+
+class TestSerialization(unittest.TestCase):
+    """Class to test the serialization layer on every available backend"""
+
+    def setUp(self):
+        self.backend = serialization.backend()
+
+    def tearDown(self):
+        serialization.set_backend(self.backend)
+
+    def test_encoding_is_byte_compatible(self):
+        """Encoders produce exactly the standard library output"""
+        self.assertEqual(serialization.dumps(RECORD), json.dumps(RECORD))
+        self.assertEqual(serialization.dumps_pretty(RECORD), json.dumps(RECORD, indent=4))
+        self.assertEqual(serialization.dumps_lines([RECORD, RECORD]),
+                         (json.dumps(RECORD) + "\n") * 2)
+
+    def test_backends_decode_the_same(self):
+        """Every backend decodes the package formats to the same objects"""
+        for backend in serialization.available_backends():
+            with self.subTest(backend=backend):
+                serialization.set_backend(backend)
+                self.assertEqual(serialization.backend(), backend)
+                self.assertEqual(serialization.loads(json.dumps(RECORD)), RECORD)
+                self.assertEqual(serialization.loads(json.dumps(RECORD).encode()), RECORD)
+                with self.assertRaises(serialization.JSONDecodeError):
+                    serialization.loads('{"IBAN": ')
+
+    def test_backends_agree_on_edge_numbers(self):
+        """Non-finite numbers are refused and long integers kept by every backend"""
+        long_integers = [10 ** 30, -2 ** 63 - 1, 2 ** 64]
+        for backend in serialization.available_backends():
+            with self.subTest(backend=backend):
+                serialization.set_backend(backend)
+                for document in ("NaN", "[Infinity]", '{"amount": -Infinity}', "1e400"):
+                    with self.assertRaises(serialization.JSONDecodeError):
+                        serialization.loads(document)
+                self.assertEqual(serialization.loads(json.dumps(long_integers)), long_integers)
+                self.assertEqual(serialization.loads(b'{"big": 123456789012345678901}'),
+                                 {"big": 123456789012345678901})
+        with self.assertRaises(serialization.JSONDecodeError):
+            list(serialization.iter_array_file(io.StringIO("[1.5, NaN]")))
+        with self.assertRaises(ValueError):
+            serialization.dumps({"amount": float("nan")})
+
+    def test_streamed_array(self):
+        """Arrays read in small chunks decode to the same items"""
+        items = [RECORD, 12345678, "a, ]", [], {"nested": [1.5, {"x": None}]}]
+        text = json.dumps(items, indent=4)
+        for chunk_size in (1, 3, 64):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(serialization.iter_array_file(io.StringIO(text),
+                                                                    chunk_size)), items)
+        self.assertEqual(list(serialization.iter_array_file(io.StringIO(" [ ] "))), [])
+        for invalid in ("{}", "[1 2]", "[1,"):
+            with self.assertRaises(serialization.JSONDecodeError):
+                list(serialization.iter_array_file(io.StringIO(invalid), 2))
+
+    def test_unknown_backend(self):
+        """Selecting an unknown backend is refused"""
+        with self.assertRaises(ValueError):
+            serialization.set_backend("yaml")
+
+    def test_environment_backend_fallback(self):
+        """An unknown backend in the environment falls back to the standard library"""
+        with mock.patch.dict(os.environ, {serialization.JSON_BACKEND_ENV: "bogus"}):
+            with self.assertWarns(RuntimeWarning):
+                self.assertEqual(serialization._environment_backend(), "json")
+        with mock.patch.dict(os.environ, {serialization.JSON_BACKEND_ENV: "json"}):
+            self.assertEqual(serialization._environment_backend(), "json")
+        with mock.patch.object(serialization, "_orjson_loads", None), \
+                mock.patch.dict(os.environ, {serialization.JSON_BACKEND_ENV: "orjson"}):
+            with self.assertWarns(RuntimeWarning):
+                self.assertEqual(serialization._environment_backend(), "json")
+
+
+if __name__ == '__main__':
+    unittest.main()
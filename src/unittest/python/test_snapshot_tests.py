@@ -0,0 +1,95 @@
+"""Module to test snapshot reads of the transfers file"""
+import os
+import threading
+import unittest
+from uc3m_money.segmented_log import SegmentedLog
+from uc3m_money.snapshot import Snapshot
+try:
+    from .fixtures import FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FileTestCase, transfer_request
+
+
+def snapshot_transfer(number):
+    """Returns a transfer with a distinct amount"""
+    return transfer_request("Snapshot payment", 10.0 + number)
+
+
+def amounts(snapshot):
+    """Returns the amounts of the transfers in a snapshot"""
+    return [record["transfer_amount"] for record in snapshot.records()]
+
+
+class TestSnapshot(FileTestCase):
+    """Class to test that snapshots are not affected by later writes"""
+
+    def test_writes_after_the_snapshot_are_not_seen(self):
+        """Appends and deletions after the snapshot leave its view unchanged"""
+        first = snapshot_transfer(0)
+        first.save_to_json(self.transfers)
+        snapshot_transfer(1).save_to_json(self.transfers)
+        with Snapshot(self.transfers) as snapshot:
+            snapshot_transfer(2).save_to_json(self.transfers)
+            first.delete_from_json(self.transfers)
+            self.assertEqual(amounts(snapshot), [10.0, 11.0])
+            # Read again, the view is the same
+            self.assertEqual(amounts(snapshot), [10.0, 11.0])
+        with Snapshot(self.transfers) as snapshot:
+            self.assertEqual(amounts(snapshot), [11.0, 12.0])
+
+    def test_unfinished_append(self):
+        """A line being appended when the snapshot is taken is left out"""
+        snapshot_transfer(0).save_to_json(self.transfers)
+        with open(self.transfers, "a", encoding="utf-8") as file:
+            file.write('{"transfer_amount": 99')
+        with Snapshot(self.transfers) as snapshot:
+            with open(self.transfers, "a", encoding="utf-8") as file:
+                file.write('.0}\n')
+            self.assertEqual(amounts(snapshot), [10.0])
+        with self.assertRaises(FileNotFoundError):
+            Snapshot(self.path("missing.json"))
+
+    def test_segments_rolled_during_the_snapshot(self):
+        """A roll after the snapshot, or one half done, neither hides nor repeats lines"""
+        segments = SegmentedLog(self.transfers, max_bytes=10 ** 6)
+        for number in range(3):
+            snapshot_transfer(number).save_to_json(self.transfers, segments=segments)
+        segments.roll()
+        snapshot_transfer(3).save_to_json(self.transfers)
+        with Snapshot(self.transfers) as snapshot:
+            segments.roll()
+            snapshot_transfer(4).save_to_json(self.transfers)
+            self.assertEqual(amounts(snapshot), [10.0, 11.0, 12.0, 13.0])
+        # The writer stopped right after renaming the active segment
+        os.replace(self.transfers, self.transfers + ".rolling")
+        snapshot_transfer(5).save_to_json(self.transfers)
+        with Snapshot(self.transfers) as snapshot:
+            self.assertEqual(amounts(snapshot), [10.0, 11.0, 12.0, 13.0, 14.0, 15.0])
+
+    def test_readers_concurrent_with_a_writer(self):
+        """Readers never see a half rewritten file while transfers are deleted"""
+        for number in range(50):
+            snapshot_transfer(number).save_to_json(self.transfers)
+        moving = snapshot_transfer(50)
+        stop = threading.Event()
+
+        def writer():
+            while not stop.is_set():
+                moving.save_to_json(self.transfers)
+                moving.delete_from_json(self.transfers)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            counts = set()
+            for _ in range(200):
+                with Snapshot(self.transfers) as snapshot:
+                    counts.add(len(amounts(snapshot)))
+        finally:
+            stop.set()
+            thread.join()
+        self.assertLessEqual(counts, {50, 51})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Module to test the transfer_code index of the transfers file"""
+import os
+import unittest
+from uc3m_money import TransferRequest, AccountManagementException
+from uc3m_money.transfer_index import TransferIndex
+from uc3m_money.write_ahead_log import WriteAheadLog
+try:
+    from .fixtures import FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FileTestCase, transfer_request
+
+
+class TestTransferIndex(FileTestCase):
+    """Class to test lookups and deletions by transfer_code"""
+
+    def save(self, concept, date="01/01/2050", transfer_type="ORDINARY"):
+        """Saves a transfer and returns it"""
+        transfer = transfer_request(concept, transfer_date=date, transfer_type=transfer_type)
+        transfer.save_to_json(self.transfers)
+        return transfer
+
+    def test_get_by_code(self):
+        """Transfers are found by code, also after more are appended"""
+        first = self.save("Pago de término")
+        index = TransferIndex(self.transfers)
+        self.assertEqual(index.get_by_code(first.transfer_code), first.to_json())
+        second = self.save("Second payment")
+        self.assertEqual(index.get_by_code(second.transfer_code), second.to_json())
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.get_by_code("0" * 32))
+        self.assertTrue(os.path.exists(self.transfers + ".idx"))
+        self.assertEqual(TransferRequest.get_by_code(first.transfer_code, self.transfers),
+                         first.to_json())
+
+    def test_delete_by_code(self):
+        """Deleting a transfer keeps the positions of the others right"""
+        transfers = [self.save(concept) for concept in ("First payment", "Pago de término",
+                                                        "Third payment")]
+        index = TransferIndex(self.transfers)
+        self.assertEqual(index.delete_by_code(transfers[1].transfer_code),
+                         transfers[1].to_json())
+        self.assertIsNone(index.get_by_code(transfers[1].transfer_code))
+        self.assertEqual(index.get_by_code(transfers[2].transfer_code), transfers[2].to_json())
+        fresh = TransferIndex(self.transfers)
+        self.assertEqual(fresh.get_by_code(transfers[0].transfer_code), transfers[0].to_json())
+        with self.assertRaises(AccountManagementException):
+            index.delete_by_code(transfers[1].transfer_code)
+
+    def test_delete_crlf_line(self):
+        """A line ended by "\\r\\n" is cut out whole, and later lines are still found"""
+        transfers = [self.save(concept) for concept in ("First payment", "Second payment",
+                                                        "Third payment")]
+        with open(self.transfers, "rb") as file:
+            content = file.read()
+        with open(self.transfers, "wb") as file:
+            file.write(content.replace(b"\n", b"\r\n"))
+        index = TransferIndex(self.transfers)
+        index.delete_by_code(transfers[0].transfer_code)
+        index.delete_by_code(transfers[1].transfer_code)
+        with open(self.transfers, "rb") as file:
+            self.assertEqual(file.read().count(b"\r\n"), 1)
+        self.assertEqual(index.get_by_code(transfers[2].transfer_code), transfers[2].to_json())
+        self.assertEqual(index.scan(), [transfers[2].to_json()])
+
+    def test_index_is_appended(self):
+        """New transfers and deletions are appended to the saved index, which a
+        new process reads back"""
+        transfers = [self.save(concept) for concept in ("First payment", "Second payment")]
+        index = TransferIndex(self.transfers)
+        self.assertEqual(len(index), 2)
+        with open(index.index_file, "rb") as file:
+            saved = file.read()
+        transfers.append(self.save("Third payment"))
+        index.delete_by_code(transfers[0].transfer_code)
+        with open(index.index_file, "rb") as file:
+            self.assertTrue(file.read().startswith(saved))
+        fresh = TransferIndex(self.transfers)
+        self.assertEqual(len(fresh), 2)
+        self.assertEqual(fresh.get_by_code(transfers[2].transfer_code), transfers[2].to_json())
+        self.assertEqual(fresh.scan(), [transfer.to_json() for transfer in transfers[1:]])
+
+    def test_rewritten_file_is_reindexed(self):
+        """A rewrite by delete_from_json or a write ahead log rebuilds the index"""
+        first, second = self.save("First payment"), self.save("Second payment")
+        index = TransferIndex(self.transfers)
+        self.assertEqual(len(index), 2)
+        first.delete_from_json(self.transfers)
+        self.assertIsNone(index.get_by_code(first.transfer_code))
+        wal = WriteAheadLog(self.path("money.wal"))
+        try:
+            TransferRequest.delete_by_code(second.transfer_code, self.transfers, wal)
+        finally:
+            wal.close()
+        self.assertEqual(len(index), 0)
+
+    def test_date_range_scan(self):
+        """Range scans return the transfers of the dates and type, by date"""
+        late = self.save("Late payment", "31/12/2050")
+        early = self.save("Early payment", "2/3/2050", "URGENT")
+        first = self.save("First payment", "01/01/2050")
+        middle = self.save("Middle payment", "02/03/2050")
+        index = TransferIndex(self.transfers)
+        self.assertEqual(index.scan(), [first.to_json(), early.to_json(), middle.to_json(),
+                                        late.to_json()])
+        self.assertEqual(index.scan("02/03/2050", "02/03/2050"),
+                         [early.to_json(), middle.to_json()])
+        self.assertEqual(index.scan(start_date="1/3/2050", transfer_type="urgent"),
+                         [early.to_json()])
+        index.delete_by_code(early.transfer_code)
+        self.assertEqual(TransferRequest.transfers_between("01/03/2050", "30/06/2050",
+                                                           filename=self.transfers),
+                         [middle.to_json()])
+        with self.assertRaises(AccountManagementException):
+            index.scan("2050-01-01")
+
+
+if __name__ == '__main__':
+    unittest.main()
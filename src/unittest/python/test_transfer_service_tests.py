@@ -0,0 +1,127 @@
+"""Module to test the local transfer service"""
+import json
+import os
+import threading
+import unittest
+from uc3m_money import AccountManagementException
+from uc3m_money.transfer_service import TransferService, TransferServiceClient, serve
+from uc3m_money.transfer_store import TransferStore
+try:
+    from .fixtures import FROM_IBAN, FileTestCase
+except ImportError:
+    from fixtures import FROM_IBAN, FileTestCase
+
+VALID_TRANSFER = {"from_iban": FROM_IBAN,
+                  "to_iban": "ES7620770024003102575766",
+                  "concept": "Payment for services",
+                  "transfer_type": "ORDINARY",
+                  "date": "01/01/2050",
+                  "amount": 400.34}
+
+
+class TestTransferService(FileTestCase):
+    """Class to test the transfer service and its HTTP front end"""
+
+    def setUp(self):
+        """Creates a service over an empty transfers file"""
+        super().setUp()
+        self.filename = self.transfers
+        self.service = TransferService(self.filename, max_queue=10, batch_size=5)
+
+    def tearDown(self):
+        self.service.stop()
+        super().tearDown()
+
+    def test_store_rejects_duplicates(self):
+        """The store keeps the duplicate index of the file it loads"""
+        self.service.start()
+        self.service.transfer_request(**VALID_TRANSFER)
+        self.service.stop()
+        store = TransferStore(self.filename)
+        self.assertEqual(len(store), 1)
+        with self.assertRaises(AccountManagementException):
+            store.add(store.records()[0])
+
+    def test_requests_are_written_in_batches(self):
+        """Queued requests are validated, deduplicated and written to the file"""
+        futures = [self.service.submit(dict(VALID_TRANSFER, amount=10.0 + i))
+                   for i in range(5)]
+        futures.append(self.service.submit(dict(VALID_TRANSFER, amount=10.0)))
+        futures.append(self.service.submit(dict(VALID_TRANSFER, concept="Bad")))
+        self.service.start()
+        self.service.stop()
+        codes = [future.result() for future in futures[:5]]
+        self.assertEqual(len(set(codes)), 5)
+        for future, message in ((futures[5], "Duplicate transfer detected"),
+                                (futures[6], "Concept must be 10-30 chars with "
+                                             "at least 2 words")):
+            with self.assertRaises(AccountManagementException) as context:
+                future.result()
+            self.assertEqual(context.exception.message, message)
+        with open(self.filename, "r", encoding="utf-8") as file:
+            written = [json.loads(line)["transfer_code"] for line in file]
+        self.assertEqual(written, codes)
+        stats = self.service.stats()
+        self.assertEqual((stats["accepted"], stats["rejected"], stats["batches"]), (5, 2, 2))
+        self.assertEqual(stats["queue_depth"], 0)
+
+    def test_full_queue(self):
+        """Requests beyond the queue bound are refused"""
+        for i in range(10):
+            self.service.submit(dict(VALID_TRANSFER, amount=10.0 + i))
+        with self.assertRaises(AccountManagementException) as context:
+            self.service.submit(VALID_TRANSFER)
+        self.assertEqual(context.exception.message, "Transfer queue is full")
+        self.assertEqual(self.service.stats()["queue_depth"], 10)
+
+    def test_http_client(self):
+        """Client processes reach the service over localhost HTTP"""
+        server = serve(self.service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            client = TransferServiceClient(f"http://127.0.0.1:{server.server_address[1]}")
+            code = client.transfer_request(**VALID_TRANSFER)
+            self.assertEqual(len(code), 32)
+            with self.assertRaises(AccountManagementException) as context:
+                client.transfer_request(**VALID_TRANSFER)
+            self.assertEqual(context.exception.message, "Duplicate transfer detected")
+            self.assertEqual(client.stats()["stored_transfers"], 1)
+            # Without a worker the request is never written and the POST gives up
+            self.service.stop()
+            server.RequestHandlerClass.timeout = 0.05
+            with self.assertRaises(AccountManagementException) as context:
+                client.transfer_request(**dict(VALID_TRANSFER, amount=20.0))
+            self.assertEqual(context.exception.message, "Transfer request timed out")
+            # The timed out request is never stored, so sending it again succeeds
+            self.service.start()
+            self.service.stop()
+            self.assertEqual(len(self.service.store), 1)
+            self.service.start()
+            server.RequestHandlerClass.timeout = 30
+            self.assertEqual(len(client.transfer_request(**dict(VALID_TRANSFER,
+                                                                amount=20.0))), 32)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_failed_flush_can_be_retried(self):
+        """Requests of a batch that could not be written fail and can be sent again"""
+        os.mkdir(self.filename)
+        future = self.service.submit(VALID_TRANSFER)
+        self.service.start()
+        self.service.stop()
+        with self.assertRaises(AccountManagementException):
+            future.result()
+        self.assertEqual(len(self.service.store), 0)
+        self.assertEqual(self.service.stats()["rejected"], 1)
+        os.rmdir(self.filename)
+        future = self.service.submit(VALID_TRANSFER)
+        self.service.start()
+        self.service.stop()
+        self.assertEqual(len(future.result()), 32)
+        self.assertEqual(len(TransferStore(self.filename)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""Module to test the non-raising transfer validator"""
+import unittest
+from datetime import date
+from uc3m_money import transfer_validator
+from uc3m_money.transfer_validator import check_transfer, check_transfers
+
+TODAY = date(2025, 3, 24)
+
+
+class TestTransferValidator(unittest.TestCase):
+    """Class to test check_transfer and check_transfers"""
+
+    def test_valid_request_has_no_errors(self):
+        """A valid request returns an empty dict"""
+        errors = check_transfer("ES9121000418450200051332", "ES7620770024003102575766",
+                                "Valid concept text", "ordinary", "2/4/2025", 100.00, TODAY)
+        self.assertEqual(errors, {})
+
+    def test_all_fields_reported_at_once(self):
+        """Every invalid field gets its own error code"""
+        errors = check_transfer(None, "ES91", "A", "UNKNOWN", "32/01/2025", "100.00", TODAY)
+        self.assertEqual(errors, {
+            "from_iban": transfer_validator.NOT_STRING,
+            "to_iban": transfer_validator.INVALID,
+            "transfer_type": transfer_validator.INVALID,
+            "transfer_concept": transfer_validator.INVALID,
+            "transfer_date": transfer_validator.BAD_FORMAT,
+            "transfer_amount": transfer_validator.NOT_NUMBER})
+        self.assertEqual(transfer_validator.error_message(errors), "IBAN must be a string")
+
+    def test_date_rules(self):
+        """Dates follow the same rules as TransferRequest.validate_date"""
+        cases = {"31/02/2025": transfer_validator.BAD_FORMAT,
+                 "2025-04-02": transfer_validator.BAD_FORMAT,
+                 "01/01/2030\n": transfer_validator.BAD_FORMAT,
+                 "01/01/2051": transfer_validator.INVALID,
+                 "23/03/2025": transfer_validator.INVALID,
+                 "24/03/2025": None,
+                 "29/02/2028": None}
+        for value, code in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(transfer_validator.date_error(value, TODAY), code)
+
+    def test_amount_rules(self):
+        """Amounts are checked for type, range and decimals"""
+        self.assertEqual(transfer_validator.amount_error(9.99), transfer_validator.OUT_OF_RANGE)
+        self.assertEqual(transfer_validator.amount_error(100.001),
+                         transfer_validator.BAD_DECIMALS)
+        self.assertIsNone(transfer_validator.amount_error(10000))
+
+    def test_check_transfers_batch(self):
+        """Rows are checked lazily, one result per row"""
+        rows = [{"from_iban": "ES9121000418450200051332",
+                 "to_iban": "ES7620770024003102575766",
+                 "transfer_concept": "Valid concept text",
+                 "transfer_type": "URGENT",
+                 "transfer_date": "01/01/2050",
+                 "transfer_amount": 100.00},
+                {"transfer_amount": 5}]
+        results = list(check_transfers(rows))
+        self.assertEqual(results[0], {})
+        self.assertEqual(len(results[1]), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
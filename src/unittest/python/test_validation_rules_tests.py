@@ -0,0 +1,27 @@
+"""Module to test the precompiled validation rules"""
+import unittest
+from uc3m_money.validation_rules import iban_checksum_ok, deposit_amount_ok
+
+
+class TestValidationRules(unittest.TestCase):
+    """Class to test the shared validation rules"""
+
+    def test_iban_checksum(self):
+        """The translated MOD-97 check accepts and rejects the same IBANs"""
+        self.assertTrue(iban_checksum_ok("ES9121000418450200051332"))
+        self.assertTrue(iban_checksum_ok("ES7620770024003102575766"))
+        self.assertFalse(iban_checksum_ok("ES9121000418450200051333"))
+        self.assertFalse(iban_checksum_ok("ES91@1000418450200051332"))
+        self.assertFalse(iban_checksum_ok("FR7630006000011234567890189"))
+
+    def test_deposit_amount(self):
+        """Deposit amounts need two decimals and 10-1000 range"""
+        self.assertTrue(deposit_amount_ok("EUR 1000.00"))
+        self.assertTrue(deposit_amount_ok("10.00"))
+        self.assertFalse(deposit_amount_ok("EUR 1000.01"))
+        self.assertFalse(deposit_amount_ok("EUR 100.0"))
+        self.assertFalse(deposit_amount_ok("EUR 9.99"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Module to test the write-ahead log and its crash recovery"""
+import json
+import os
+import unittest
+from unittest import mock
+from uc3m_money.account_management_exception import AccountManagementException
+from uc3m_money.transfer_store import TransferStore
+from uc3m_money.write_ahead_log import WriteAheadLog, APPEND, DELETE, REPLACE
+try:
+    from .fixtures import FROM_IBAN, FileTestCase, transfer_request
+except ImportError:
+    from fixtures import FROM_IBAN, FileTestCase, transfer_request
+
+
+def transfer(amount):
+    """Returns a valid transfer request for the given amount"""
+    return transfer_request(amount=amount, to_iban="ES7620770024003102575766")
+
+
+def read_lines(filename):
+    """Returns the records of a JSONL file"""
+    with open(filename, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+class TestWriteAheadLog(FileTestCase):
+    """Class to test the write-ahead log"""
+
+    def setUp(self):
+        """Creates the log and the stores in a temporary directory"""
+        super().setUp()
+        self.log_path = self.path("stores.wal")
+
+    def test_group_commit_applies_writes(self):
+        """Logged writes reach the stores only when committed, with sequence numbers"""
+        wal = WriteAheadLog(self.log_path)
+        store = TransferStore(self.transfers, wal)
+        for amount in (10.0, 20.0, 30.0):
+            store.add(transfer(amount).to_json())
+        self.assertFalse(os.path.exists(self.transfers))
+        self.assertEqual(store.flush(), 3)
+        self.assertEqual(wal.last_seq, 3)
+        self.assertEqual([line["transfer_amount"] for line in read_lines(self.transfers)],
+                         [10.0, 20.0, 30.0])
+        wal.close()
+        self.assertEqual(wal.checkpoint_seq, 3)
+
+    def test_save_and_delete_through_log(self):
+        """save_to_json and delete_from_json can go through the log"""
+        wal = WriteAheadLog(self.log_path)
+        request = transfer(400.34)
+        request.save_to_json(self.transfers, wal)
+        transfer(500.00).save_to_json(self.transfers, wal)
+        request.delete_from_json(self.transfers, wal)
+        self.assertEqual([line["transfer_amount"] for line in read_lines(self.transfers)],
+                         [500.0])
+        wal.close()
+
+    def test_recovery_after_crash(self):
+        """Committed writes missing from a store, or torn, are replayed on open"""
+        first, second = transfer(10.0).to_json(), transfer(20.0).to_json()
+        entries = [{"checkpoint": 0},
+                   {"seq": 1, "op": APPEND, "file": self.transfers, "data": first},
+                   {"seq": 2, "op": APPEND, "file": self.transfers, "data": second},
+                   {"seq": 3, "op": DELETE, "file": self.transfers,
+                    "data": {"transfer_amount": 10.0}}]
+        with open(self.log_path, "w", encoding="utf-8") as file:
+            file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            # Torn entry that never finished its commit
+            file.write('{"seq": 4, "op": "append", "fi')
+        # The first append reached the store, the second one was torn
+        with open(self.transfers, "w", encoding="utf-8") as file:
+            file.write(json.dumps(first) + "\n" + json.dumps(second)[:20])
+
+        wal = WriteAheadLog(self.log_path)
+        self.assertEqual(read_lines(self.transfers), [second])
+        self.assertEqual((wal.last_seq, wal.checkpoint_seq), (3, 3))
+        # A second recovery finds nothing to replay
+        wal.close()
+        reopened = WriteAheadLog(self.log_path)
+        self.assertEqual(reopened.recover(), 0)
+        self.assertEqual(read_lines(self.transfers), [second])
+        reopened.close()
+
+    def test_replace_document(self):
+        """REPLACE writes the whole document as deposit_into_account does"""
+        deposits = self.path("deposits.json")
+        wal = WriteAheadLog(self.log_path)
+        wal.log(REPLACE, deposits, {"to_iban": FROM_IBAN})
+        wal.commit()
+        with open(deposits, "r", encoding="utf-8") as file:
+            self.assertEqual(file.read(), '{\n    "to_iban": "ES9121000418450200051332"\n}')
+        wal.close()
+
+    def test_failed_log_write_is_discarded(self):
+        """A group that cannot reach the log is dropped and reported to each caller"""
+        wal = WriteAheadLog(self.log_path)
+        first = wal.log(APPEND, self.transfers, transfer(10.0).to_json())
+        other = wal.log(APPEND, self.transfers, transfer(20.0).to_json())
+        with mock.patch("uc3m_money.write_ahead_log.os.fsync", side_effect=OSError("disk full")):
+            with self.assertRaises(AccountManagementException):
+                wal.commit(first)
+        self.assertEqual(wal.pending_count, 0)
+        with self.assertRaises(AccountManagementException):
+            wal.commit(other)
+        self.assertEqual(wal.commit(), 0)
+        self.assertFalse(os.path.exists(self.transfers))
+        self.assertEqual(read_lines(self.log_path), [{"checkpoint": 0}])
+        wal.close()
+
+    def test_unapplied_writes_are_retried(self):
+        """A committed write whose store fails stays in the log until it is applied"""
+        record = transfer(10.0).to_json()
+        os.mkdir(self.transfers)
+        wal = WriteAheadLog(self.log_path, checkpoint_interval=1)
+        self.assertEqual(wal.commit(wal.log(APPEND, self.transfers, record)), 1)
+        self.assertEqual((wal.unapplied_count, wal.checkpoint_seq), (1, 0))
+        os.rmdir(self.transfers)
+        self.assertEqual(wal.commit(), 0)
+        self.assertEqual(wal.unapplied_count, 0)
+        self.assertEqual(read_lines(self.transfers), [record])
+        os.remove(self.transfers)
+        os.mkdir(self.transfers)
+        wal.commit(wal.log(APPEND, self.transfers, record))
+        with self.assertRaises(AccountManagementException):
+            wal.close()
+        os.rmdir(self.transfers)
+        reopened = WriteAheadLog(self.log_path)
+        self.assertEqual(read_lines(self.transfers), [record])
+        self.assertEqual(reopened.checkpoint_seq, 2)
+        reopened.close()
+
+
+if __name__ == '__main__':
+    unittest.main()